@@ -0,0 +1,35 @@
+"""Compare the binary format with JRD for a typical WebFinger document.
+
+    python benchmarks/bench_binary.py
+"""
+import gzip
+import timeit
+
+from xrd import from_binary, parse_json, to_binary
+
+from webfinger import WEBFINGER
+
+
+def main(number=20000):
+    jrd = WEBFINGER.as_json()
+    binary = to_binary(parse_json(jrd))
+    compressed = to_binary(parse_json(jrd), compress=True)
+    assert from_binary(binary) == from_binary(compressed) == parse_json(jrd)
+
+    print(f"JRD size:                  {len(jrd.encode())} bytes")
+    print(f"gzip'd JRD size:           {len(gzip.compress(jrd.encode()))} bytes")
+    print(f"binary size:               {len(binary)} bytes")
+    print(f"binary size (compressed):  {len(compressed)} bytes")
+
+    json_time = timeit.timeit(lambda: parse_json(jrd), number=number)
+    print(f"parse_json:                {json_time / number * 1e6:.2f} us")
+    for label, data in (("", binary), (" (compressed)", compressed)):
+        binary_time = timeit.timeit(lambda: from_binary(data), number=number)
+        print(
+            f"from_binary{label + ':':<16}{binary_time / number * 1e6:.2f} us"
+            f" ({json_time / binary_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""Compare generating and serving a document with XRDBuilder and with XRD.
+
+    python benchmarks/bench_builder.py
+"""
+import timeit
+
+from xrd import XRD, XRDBuilder, render_json, render_xml
+
+from webfinger import WEBFINGER
+
+
+def build():
+    builder = XRDBuilder(WEBFINGER.subject)
+    for alias in WEBFINGER.aliases:
+        builder.alias(alias)
+    for link in WEBFINGER.links:
+        builder.link(
+            link.rel, link.type, link.href, link.template, link.titles, link.properties
+        )
+    builder.build()
+    prerendered = builder.prerendered()
+    return prerendered.jrd.full.decode("utf-8"), prerendered.xml
+
+
+def construct():
+    xrd = XRD(subject=WEBFINGER.subject, aliases=list(WEBFINGER.aliases))
+    for link in WEBFINGER.links:
+        xrd.links.append(link)
+    return render_json(xrd), render_xml(xrd).toxml()
+
+
+def main(number=5000):
+    assert build() == construct()
+
+    baseline_time = timeit.timeit(construct, number=number) / number
+    builder_time = timeit.timeit(build, number=number) / number
+    print(
+        f"JRD and XML:  XRD {baseline_time * 1e6:7.2f} us"
+        f"   XRDBuilder {builder_time * 1e6:7.2f} us"
+        f" ({baseline_time / builder_time:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Compare filtering links with columns and with per-object attribute access.
+
+    python benchmarks/bench_columns.py
+"""
+import re
+import timeit
+
+from xrd import XRD, Link, Title, from_columns, to_columns
+
+PATTERN = re.compile(r"^https://[^/]+/\.well-known/webfinger")
+
+
+def corpus(count=20000):
+    return [
+        XRD(
+            subject=f"https://host{i % 500}.example.com/",
+            links=[
+                Link(
+                    rel="lrdd",
+                    template=(
+                        f"https://host{i % 500}.example.com"
+                        "/.well-known/webfinger?resource={uri}"
+                        if i % 3
+                        else f"https://host{i % 500}.example.com/lrdd?uri={{uri}}"
+                    ),
+                ),
+                Link(
+                    rel="author",
+                    href=f"https://host{i % 500}.example.com/author",
+                    titles=[Title("Author")],
+                ),
+                Link(
+                    rel="self",
+                    type="application/activity+json",
+                    href=f"https://host{i % 500}.example.com/",
+                ),
+            ],
+        )
+        for i in range(count)
+    ]
+
+
+def objects(xrds):
+    return [
+        xrd.subject
+        for xrd in xrds
+        for link in xrd.links
+        if link.rel == "lrdd" and PATTERN.match(link.template)
+    ]
+
+
+def columns_filter(columns):
+    rows = columns.rows_where(
+        rel=lambda rel: rel == "lrdd",
+        template=lambda template: template is not None and PATTERN.match(template),
+    )
+    return columns["subject"].decode(rows)
+
+
+def main(number=10):
+    xrds = corpus()
+    columns = to_columns(xrds)
+    assert objects(xrds) == columns_filter(columns)
+    assert from_columns(columns) == xrds
+
+    for label, func in (
+        ("to_columns", lambda: to_columns(xrds)),
+        ("from_columns", lambda: from_columns(columns)),
+        ("filter objects", lambda: objects(xrds)),
+        ("filter columns", lambda: columns_filter(columns)),
+    ):
+        seconds = timeit.timeit(func, number=number) / number
+        print(f"{label:<16}{seconds * 1000:8.2f} ms")
+    print(f"{len(xrds)} XRDs, {len(columns)} rows")
+
+
+if __name__ == "__main__":
+    main()
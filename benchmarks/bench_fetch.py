@@ -0,0 +1,74 @@
+"""Compare fetch_many() with fetching documents with urllib, one by one and
+from 8 threads, against a local server that takes 5 ms to respond.
+
+    python benchmarks/bench_fetch.py
+"""
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from xrd import XRDFetcher, parse_response
+
+from webfinger import WEBFINGER
+
+BODY = WEBFINGER.as_json().encode()
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # send headers and body together; separate writes stall keep-alive
+    # connections on Nagle's algorithm and delayed ACKs
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        time.sleep(0.005)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/jrd+json")
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+def fetch(url):
+    with urllib.request.urlopen(url) as response:
+        return parse_response(response.headers.get("Content-Type"), response.read())
+
+
+def main(count=200):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    urls = [f"http://127.0.0.1:{server.server_address[1]}/{i}" for i in range(count)]
+    try:
+        start = time.perf_counter()
+        for url in urls:
+            fetch(url)
+        sequential_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(fetch, urls))
+        threaded_time = time.perf_counter() - start
+
+        with XRDFetcher(per_host=8) as fetcher:
+            start = time.perf_counter()
+            results = fetcher.fetch_many(urls, max_workers=8)
+            pooled_time = time.perf_counter() - start
+        assert all(xrd.links == WEBFINGER.links for xrd in results.values())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    print(f"{count} documents")
+    print(f"urllib, sequential:  {sequential_time * 1e3:7.1f} ms")
+    print(f"urllib, 8 threads:   {threaded_time * 1e3:7.1f} ms")
+    print(f"fetch_many:          {pooled_time * 1e3:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Measure the cold start cost of importing xrd and of the first use of each format.
+
+    python benchmarks/bench_import.py
+
+Every measurement runs in a fresh interpreter with `python -X importtime`.
+Bytecode is written to a temporary cache first so that compiling xrd.py is
+not counted.
+"""
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+JRD = (
+    '{"subject": "acct:someone@example.com", '
+    '"links": [{"rel": "self", "href": "https://example.com/someone"}]}'
+)
+XML = (
+    '<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">'
+    "<Subject>acct:someone@example.com</Subject>"
+    '<Link rel="self" href="https://example.com/someone"/></XRD>'
+)
+
+SCENARIOS = [
+    ("import xrd", "import xrd"),
+    (
+        "+ parse_json/render_json",
+        f"import xrd; xrd.render_json(xrd.parse_json({JRD!r}))",
+    ),
+    (
+        "+ parse_xml/render_xml",
+        f"import xrd; xrd.render_xml(xrd.parse_xml({XML!r})).toxml()",
+    ),
+]
+
+
+def import_times(code, env):
+    """Return the cumulative import time in microseconds of every top level
+    module imported while running code, keyed by module name.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not name.startswith("  ") and cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def main(runs=10):
+    with tempfile.TemporaryDirectory() as cache:
+        env = dict(os.environ, PYTHONPYCACHEPREFIX=cache)
+        env.pop("PYTHONDONTWRITEBYTECODE", None)
+        import_times(SCENARIOS[-1][1], env)  # warm the bytecode cache
+
+        for label, code in SCENARIOS:
+            samples = [import_times(code, env) for _ in range(runs)]
+            xrd_times = [sample["xrd"] for sample in samples]
+            totals = [sum(sample.values()) for sample in samples]
+            modules = sorted(samples[0], key=samples[0].get, reverse=True)
+            print(
+                f"{label:<28}xrd {statistics.median(xrd_times) / 1000:6.2f} ms"
+                f"   all imports {statistics.median(totals) / 1000:6.2f} ms"
+            )
+            print(f"{'':<28}{', '.join(name for name in modules[:8])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Measure the cost of tracing, with tracing off and with a SpanCollector.
+
+    python benchmarks/bench_tracing.py
+"""
+import timeit
+
+from xrd import SpanCollector, XRDIndex, disable_tracing, enable_tracing, parse_json
+
+from webfinger import WEBFINGER
+
+
+def main(number=20000):
+    jrd = WEBFINGER.as_json()
+    xrd = parse_json(jrd)
+    index = XRDIndex([xrd])
+    operations = (
+        ("parse_json", lambda: parse_json(jrd)),
+        ("validate", xrd.validate),
+        ("index.get", lambda: index.get(WEBFINGER.subject)),
+        ("find_link", lambda: xrd.find_link("http://webfinger.net/rel/avatar")),
+    )
+    for label, operation in operations:
+        disable_tracing()
+        off = min(timeit.repeat(operation, number=number, repeat=5)) / number
+        enable_tracing(SpanCollector(max_spans=1000))
+        on = min(timeit.repeat(operation, number=number, repeat=5)) / number
+        disable_tracing()
+        print(f"{label:<11} off {off * 1e6:7.2f} us   on {on * 1e6:7.2f} us")
+
+
+if __name__ == "__main__":
+    main()
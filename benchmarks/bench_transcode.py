@@ -0,0 +1,36 @@
+"""Compare the transcoders with converting through an XRD.
+
+    python benchmarks/bench_transcode.py
+"""
+import timeit
+
+from xrd import jrd_to_xml, parse_json, parse_xml, render_xml, xml_to_jrd
+
+from webfinger import WEBFINGER
+
+
+def main(number=5000):
+    xml = render_xml(WEBFINGER).toxml()
+    jrd = WEBFINGER.as_json()
+    assert xml_to_jrd(xml) == parse_xml(xml).as_json()
+    assert parse_xml(jrd_to_xml(jrd)) == parse_xml(render_xml(parse_json(jrd)).toxml())
+
+    for label, baseline, transcoder in (
+        ("XML -> JRD", lambda: parse_xml(xml).as_json(), lambda: xml_to_jrd(xml)),
+        (
+            "JRD -> XML",
+            lambda: render_xml(parse_json(jrd)).toxml(),
+            lambda: jrd_to_xml(jrd),
+        ),
+    ):
+        baseline_time = timeit.timeit(baseline, number=number) / number
+        transcoder_time = timeit.timeit(transcoder, number=number) / number
+        print(
+            f"{label}:  via XRD {baseline_time * 1e6:7.2f} us"
+            f"   transcoder {transcoder_time * 1e6:7.2f} us"
+            f" ({baseline_time / transcoder_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Load test XRDApp served by a local threaded WSGI server.
+
+    python benchmarks/loadtest_app.py [requests] [concurrency]
+"""
+import http.client
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from xrd import XRD, Link, XRDApp
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def build_app(users=1000):
+    host_meta = XRD(
+        links=[
+            Link(
+                rel="lrdd",
+                template="http://localhost/.well-known/webfinger?resource={uri}",
+            )
+        ]
+    )
+    xrds = [
+        XRD(
+            subject=f"acct:user{i}@example.com",
+            aliases=[f"https://example.com/@user{i}"],
+            links=[
+                Link(
+                    rel="self",
+                    type="application/activity+json",
+                    href=f"https://example.com/users/{i}",
+                ),
+                Link(
+                    rel="http://webfinger.net/rel/profile-page",
+                    href=f"https://example.com/@user{i}",
+                ),
+            ],
+        )
+        for i in range(users)
+    ]
+    return XRDApp(host_meta, xrds)
+
+
+def worker(port, paths):
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    latencies = []
+    for path in paths:
+        start = time.perf_counter()
+        conn.request("GET", path)
+        response = conn.getresponse()
+        response.read()
+        # wsgiref closes the connection after each response
+        conn.close()
+        assert response.status == 200, response.status
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main(total=5000, concurrency=8):
+    server = make_server(
+        "127.0.0.1", 0, build_app().wsgi, ThreadingWSGIServer, QuietHandler
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+
+    paths = [
+        "/.well-known/host-meta",
+        "/.well-known/webfinger?resource=acct:user{}@example.com",
+        "/.well-known/webfinger?resource=acct:user{}@example.com&rel=self",
+    ]
+    requests = [paths[i % 3].format(i % 1000) for i in range(total)]
+    chunks = [requests[i::concurrency] for i in range(concurrency)]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        results = list(executor.map(lambda chunk: worker(port, chunk), chunks))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latencies = sorted(latency for result in results for latency in result)
+    print(f"requests:     {total}")
+    print(f"concurrency:  {concurrency}")
+    print(f"throughput:   {total / elapsed:.0f} req/s")
+    print(f"latency p50:  {latencies[len(latencies) // 2] * 1000:.2f} ms")
+    print(f"latency p99:  {latencies[int(len(latencies) * 0.99)] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,33 @@
+"""A typical WebFinger document, shared by the benchmarks."""
+from xrd import XRD, Link, Title
+
+WEBFINGER = XRD(
+    subject="acct:someone@social.example.com",
+    aliases=[
+        "https://social.example.com/@someone",
+        "https://social.example.com/users/someone",
+    ],
+    links=[
+        Link(
+            rel="http://webfinger.net/rel/profile-page",
+            type="text/html",
+            href="https://social.example.com/@someone",
+        ),
+        Link(
+            rel="self",
+            type="application/activity+json",
+            href="https://social.example.com/users/someone",
+        ),
+        Link(
+            rel="http://ostatus.org/schema/1.0/subscribe",
+            template="https://social.example.com/authorize_interaction?uri={uri}",
+        ),
+        Link(
+            rel="http://webfinger.net/rel/avatar",
+            type="image/png",
+            href="https://files.social.example.com/accounts/avatars/someone.png",
+            titles=[Title("Avatar", lang="en")],
+            properties={"http://social.example.com/ns/avatar-size": "400"},
+        ),
+    ],
+)
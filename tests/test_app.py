@@ -0,0 +1,186 @@
+import asyncio
+import datetime
+import json
+from wsgiref.util import setup_testing_defaults
+
+from xrd import XRD, Link, XRDApp, negotiate, parse_xml
+
+HOST_META = XRD(
+    links=[
+        Link(
+            rel="lrdd",
+            template="https://example.com/.well-known/webfinger?resource={uri}",
+        )
+    ]
+)
+
+ALICE = XRD(
+    subject="acct:alice@example.com",
+    aliases=["https://example.com/@alice"],
+    links=[
+        Link(
+            rel="self",
+            type="application/activity+json",
+            href="https://example.com/users/alice",
+        ),
+        Link(
+            rel="http://webfinger.net/rel/profile-page",
+            href="https://example.com/@alice",
+        ),
+    ],
+)
+
+
+def asgi_request(app, path, query_string=b"", headers=(), method="GET"):
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "headers": [(name.encode(), value.encode()) for name, value in headers],
+    }
+    asyncio.run(app(scope, receive, send))
+    start, body = messages
+    headers = {name.decode(): value.decode() for name, value in start["headers"]}
+    return start["status"], headers, body["body"]
+
+
+def wsgi_request(app, path, query_string="", headers=()):
+    environ = {"PATH_INFO": path, "QUERY_STRING": query_string}
+    for name, value in headers:
+        environ["HTTP_" + name.upper().replace("-", "_")] = value
+    setup_testing_defaults(environ)
+    response = {}
+
+    def start_response(status, headers):
+        response["status"] = status
+        response["headers"] = dict(headers)
+
+    body = b"".join(app.wsgi(environ, start_response))
+    return response["status"], response["headers"], body
+
+
+def test_negotiate():
+    types = ["application/xrd+xml", "application/json"]
+    assert negotiate("", types) == "application/xrd+xml"
+    assert negotiate("application/json", types) == "application/json"
+    assert (
+        negotiate("application/*;q=0.5, application/json", types) == "application/json"
+    )
+    assert negotiate("*/*", types) == "application/xrd+xml"
+    assert negotiate("text/html", types) is None
+
+
+def test_host_meta():
+    app = XRDApp(HOST_META)
+    status, headers, body = asgi_request(app, "/.well-known/host-meta")
+    assert status == 200
+    assert headers["content-type"] == "application/xrd+xml"
+    assert headers["etag"] == f'"{HOST_META.digest("xml")}"'
+    assert headers["cache-control"] == "max-age=3600"
+    assert parse_xml(body).links == HOST_META.links
+
+
+def test_host_meta_json():
+    app = XRDApp(HOST_META)
+    status, headers, body = asgi_request(
+        app, "/.well-known/host-meta", headers=[("Accept", "application/json")]
+    )
+    assert status == 200
+    assert headers["content-type"] == "application/json"
+    assert json.loads(body)["links"][0]["rel"] == "lrdd"
+
+    status, headers, _ = asgi_request(app, "/.well-known/host-meta.json")
+    assert headers["content-type"] == "application/json"
+
+    status, _, _ = asgi_request(
+        app, "/.well-known/host-meta", headers=[("Accept", "text/html")]
+    )
+    assert status == 406
+
+
+def test_not_modified():
+    app = XRDApp(HOST_META)
+    _, headers, _ = asgi_request(app, "/.well-known/host-meta")
+    status, _, body = asgi_request(
+        app, "/.well-known/host-meta", headers=[("If-None-Match", headers["etag"])]
+    )
+    assert status == 304
+    assert body == b""
+
+
+def test_cache_control_expires():
+    expires = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+        seconds=120
+    )
+    app = XRDApp(XRD(expires=expires))
+    _, headers, _ = asgi_request(app, "/.well-known/host-meta")
+    assert 100 < int(headers["cache-control"].split("=")[1]) <= 120
+
+
+def test_webfinger():
+    app = XRDApp(xrds=[ALICE])
+    status, headers, body = asgi_request(
+        app, "/.well-known/webfinger", b"resource=acct%3Aalice%40example.com"
+    )
+    assert status == 200
+    assert headers["content-type"] == "application/jrd+json"
+    assert headers["access-control-allow-origin"] == "*"
+    assert body == ALICE.as_json().encode()
+
+
+def test_webfinger_rel():
+    app = XRDApp(xrds=[ALICE])
+    status, headers, body = asgi_request(
+        app, "/.well-known/webfinger", b"resource=https://example.com/@alice&rel=self"
+    )
+    assert status == 200
+    assert [link["rel"] for link in json.loads(body)["links"]] == ["self"]
+    assert headers["etag"] != f'"{ALICE.digest()}"'
+
+
+def test_webfinger_errors():
+    app = XRDApp(xrds=[ALICE])
+    assert asgi_request(app, "/.well-known/webfinger")[0] == 400
+    assert (
+        asgi_request(app, "/.well-known/webfinger", b"resource=acct:bob@example.com")[0]
+        == 404
+    )
+    assert asgi_request(app, "/.well-known/host-meta")[0] == 404
+    assert asgi_request(app, "/nope")[0] == 404
+    assert asgi_request(app, "/.well-known/webfinger", method="POST")[0] == 405
+
+
+def test_replace():
+    app = XRDApp(xrds=[ALICE])
+    asgi_request(app, "/.well-known/webfinger", b"resource=acct:alice@example.com")
+    updated = XRD(subject="acct:alice@example.com")
+    app.replace(updated)
+    _, _, body = asgi_request(
+        app, "/.well-known/webfinger", b"resource=acct:alice@example.com"
+    )
+    assert body == updated.as_json().encode()
+
+
+def test_wsgi():
+    app = XRDApp(HOST_META, [ALICE])
+    status, headers, body = wsgi_request(
+        app, "/.well-known/webfinger", "resource=acct:alice@example.com"
+    )
+    assert status == "200 OK"
+    assert body == ALICE.as_json().encode()
+
+    status, headers, body = wsgi_request(
+        app,
+        "/.well-known/host-meta",
+        headers=[("If-None-Match", f'"{HOST_META.digest("xml")}"')],
+    )
+    assert status == "304 Not Modified"
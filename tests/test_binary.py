@@ -0,0 +1,64 @@
+import datetime
+
+import pytest
+
+from xrd import XRD, Link, Title, from_binary, parse_xml, to_binary
+
+XML_DOC = """<?xml version="1.0" ?>
+<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0" xml:id="1234">
+    <Subject>acct:someone@example.com</Subject>
+    <Expires>2023-01-01T00:00:00Z</Expires>
+    <Alias>https://example.com/someone</Alias>
+    <Property type="http://spec.example.net/version">1.0</Property>
+    <Property type="http://spec.example.net/version">2.0</Property>
+    <Link rel="self" type="application/activity+json" href="https://example.com/someone">
+        <Title>Someone</Title>
+        <Title xml:lang="de">Jemand</Title>
+        <Property type="http://spec.example.net/created/1.0">1970-01-01</Property>
+    </Link>
+    <Link rel="lrdd" template="https://example.com/lrdd?uri={uri}" />
+</XRD>
+"""
+
+
+def test_roundtrip():
+    xrd = parse_xml(XML_DOC)
+    assert from_binary(to_binary(xrd)) == xrd
+    assert from_binary(to_binary(xrd, compress=True)) == xrd
+
+
+def test_roundtrip_values():
+    xrd = XRD(
+        expires=datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc),
+        properties={"nil": None, "empty": "", "one": ["a"], "none": []},
+        links=[Link(rel="self", titles=[Title("x")], properties={"nil": None})],
+    )
+    assert from_binary(to_binary(xrd)) == xrd
+
+
+def test_empty():
+    assert from_binary(to_binary(XRD())) == XRD()
+
+
+def test_string_table():
+    rel = "http://webfinger.net/rel/profile-page"
+    xrd = XRD(links=[Link(rel=rel, href=f"https://example.com/{i}") for i in range(20)])
+    data = to_binary(xrd)
+    assert data.count(rel.encode()) == 1
+    assert from_binary(data) == xrd
+
+
+def test_wide_references():
+    xrd = XRD(aliases=[f"https://example.com/{i}" for i in range(70000)])
+    data = to_binary(xrd)
+    assert chr(data[6]) == "I"
+    assert from_binary(data) == xrd
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        from_binary(b"JRD!")
+    with pytest.raises(ValueError):
+        from_binary(b"XRDB\x02" + to_binary(XRD())[5:])
+    with pytest.raises(ValueError):
+        to_binary(XRD(subject="nul\x00"))
@@ -0,0 +1,161 @@
+import datetime
+
+import pytest
+
+from xrd import (
+    XRD,
+    XRD_NAMESPACE,
+    Link,
+    Title,
+    XRDApp,
+    XRDBuilder,
+    parse_json,
+    parse_xml,
+    render_json,
+    render_xml,
+)
+
+from .test_app import asgi_request
+
+EXPIRES = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+BOB = XRD(
+    xml_id="bob",
+    expires=EXPIRES,
+    subject="acct:bob@example.com",
+    aliases=["https://example.com/bob"],
+    properties={
+        "http://example.com/ns/a": ["1", "2"],
+        "http://example.com/ns/nil": None,
+    },
+    links=[
+        Link(
+            rel="self", type="application/activity+json", href="https://example.com/bob"
+        ),
+        Link(
+            rel="http://webfinger.net/rel/profile-page",
+            href="https://example.com/@bob",
+            titles=[Title("Bob"), Title("Bob", lang="de")],
+            properties={"http://example.com/ns/b": "3"},
+        ),
+        Link(rel="lrdd", template="https://example.com/lrdd?uri={uri}"),
+    ],
+    attributes={"foo": "bar"},
+)
+
+
+def bob_builder() -> XRDBuilder:
+    return (
+        XRDBuilder("acct:bob@example.com", xml_id="bob")
+        .expires(EXPIRES)
+        .alias("https://example.com/bob")
+        .property("http://example.com/ns/a", "1")
+        .property("http://example.com/ns/a", "2")
+        .property("http://example.com/ns/nil")
+        .attribute("foo", "bar")
+        .link("self", type="application/activity+json", href="https://example.com/bob")
+        .link(
+            "http://webfinger.net/rel/profile-page",
+            href="https://example.com/@bob",
+            titles=[Title("Bob"), Title("Bob", lang="de")],
+            properties={"http://example.com/ns/b": "3"},
+        )
+        .add_link(Link(rel="lrdd", template="https://example.com/lrdd?uri={uri}"))
+    )
+
+
+def test_build():
+    builder = bob_builder()
+    xrd = builder.build()
+    assert xrd == BOB
+
+    prerendered = builder.prerendered()
+    assert prerendered.jrd.full == render_json(BOB).encode("utf-8")
+    assert prerendered.xml == BOB.as_xml().toxml()
+
+
+def test_build_empty():
+    prerendered = XRDBuilder().prerendered()
+    assert prerendered.jrd.full.decode("utf-8") == XRD().as_json()
+    assert prerendered.xml == XRD().as_xml().toxml()
+
+
+def test_escaping():
+    builder = XRDBuilder('acct:"bob"@example.com').link(
+        "self",
+        href='https://example.com/?a="1"\t&b=<2>',
+        titles=[Title('"Bob"', "en\t")],
+    )
+    assert builder.prerendered().xml == builder.build().as_xml().toxml()
+
+
+def test_nil_link_property():
+    builder = XRDBuilder("acct:a@b").link("x", href="h", properties={"p": None})
+    xml = builder.prerendered().xml
+    assert xml == render_xml(builder.build()).toxml()
+    assert parse_xml(xml).links[0].properties.is_nil("p")
+
+
+def test_root_attributes_replace_defaults():
+    builder = (
+        XRDBuilder("acct:a@b", xml_id="d1")
+        .attribute("xmlns", XRD_NAMESPACE)
+        .attribute("xmlns:xsi", "http://example.com/other")
+        .property("p", None)
+    )
+    xml = builder.prerendered().xml
+    assert xml == render_xml(builder.build()).toxml()
+    assert parse_xml(xml).xml_id == "d1"
+
+
+def test_link_checked_when_added():
+    builder = XRDBuilder("acct:bob@example.com")
+    with pytest.raises(ValueError):
+        builder.link(
+            "lrdd", href="https://example.com/", template="https://example.com/{uri}"
+        )
+    with pytest.raises(TypeError):
+        builder.link("self", titles=[Title(None)])
+    assert builder.build().links == []
+
+
+def test_built_xrds_are_independent():
+    builder = XRDBuilder("acct:bob@example.com").link(
+        "self", href="https://example.com/bob"
+    )
+    first = builder.build()
+    second = builder.link("lrdd", template="https://example.com/{uri}").build()
+    assert len(first.links) == 1 and len(second.links) == 2
+    assert len(parse_json(builder.prerendered().jrd.full).links) == 2
+
+    first.links[0].href = "https://example.com/alice"
+    first.subject = "acct:alice@example.com"
+    xrd = parse_json(first.as_json())
+    assert xrd.subject == "acct:alice@example.com"
+    assert xrd.links[0].href == "https://example.com/alice"
+
+
+def test_app_serves_rendered_forms():
+    builder = bob_builder()
+    xrd = builder.build()
+    app = XRDApp()
+    app.set_host_meta(xrd, builder.prerendered())
+    app.replace(xrd, builder.prerendered())
+    status, headers, body = asgi_request(app, "/.well-known/host-meta")
+    assert status == 200
+    assert parse_xml(body).links == BOB.links
+    assert body.startswith(b'<?xml version="1.0" encoding="UTF-8"?>')
+
+    status, headers, body = asgi_request(
+        app, "/.well-known/webfinger", b"resource=acct:bob@example.com&rel=lrdd"
+    )
+    assert status == 200
+    assert parse_json(body).links == BOB.links[2:]
+    etag = headers["etag"]
+    status, headers, body = asgi_request(
+        app,
+        "/.well-known/webfinger",
+        b"resource=acct:bob@example.com&rel=lrdd",
+        headers=[("if-none-match", etag)],
+    )
+    assert status == 304
@@ -0,0 +1,112 @@
+import datetime
+import json
+
+import pytest
+
+from xrd import XRD, Link, Title, parse_json, parse_xml, render_json, render_xml_c14n
+
+
+def build(reverse=False):
+    props = [("http://example.com/a", "1"), ("http://example.com/b", None)]
+    link_props = [("http://example.com/c", "2"), ("http://example.com/d", "3")]
+    attrs = [("xmlns:foo", "http://example.com/foo"), ("foo:bar", "baz")]
+    if reverse:
+        props.reverse()
+        link_props.reverse()
+        attrs.reverse()
+    return XRD(
+        subject="acct:someone@example.com",
+        expires=datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc),
+        aliases=["https://example.com/someone"],
+        properties=dict(props),
+        attributes=dict(attrs),
+        links=[
+            Link(
+                rel="self",
+                href="https://example.com/someone",
+                titles=[Title("Someone", lang="en")],
+                properties=dict(link_props),
+            )
+        ],
+    )
+
+
+def test_canonical_json_is_order_independent():
+    assert render_json(build(), canonical=True) == render_json(
+        build(reverse=True), canonical=True
+    )
+
+
+def test_canonical_json_format():
+    content = render_json(XRD(subject="acct:someone@example.com"), canonical=True)
+    assert content == '{"subject":"acct:someone@example.com"}'
+
+
+def test_canonical_json_roundtrip():
+    xrd = build()
+    assert json.loads(render_json(xrd, canonical=True)) == json.loads(xrd.as_json())
+    assert parse_json(render_json(xrd, canonical=True)).links == xrd.links
+
+
+def test_canonical_xml_is_order_independent():
+    assert render_xml_c14n(build()) == render_xml_c14n(build(reverse=True))
+
+
+def test_canonical_xml_roundtrip():
+    xrd = build()
+    parsed = parse_xml(render_xml_c14n(xrd))
+    assert parsed.subject == xrd.subject
+    assert parsed.properties == xrd.properties
+    assert parsed.links == xrd.links
+
+
+def test_digest():
+    assert build().digest() == build(reverse=True).digest()
+    assert build().digest("xml") == build(reverse=True).digest("xml")
+    assert build().digest() != build().digest("xml")
+    assert build().digest() != XRD(subject="acct:other@example.com").digest()
+
+
+def test_digest_algorithm():
+    assert len(build().digest(algorithm="sha1")) == 40
+    with pytest.raises(ValueError):
+        build().digest(format="yaml")
+
+
+def test_canonical_xml_matches_elementtree():
+    from xml.etree.ElementTree import canonicalize
+
+    from xrd import render_xml
+
+    xrds = [
+        build(),
+        XRD(),
+        XRD(
+            xml_id="d1",
+            subject='a&b<c>"d',
+            attributes={
+                "xmlns:p": "urn:p",
+                "p:b": "1",
+                "xmlns:unused": "urn:u",
+                "a": "x&y",
+            },
+            properties={"t": None, "u": ["x", None]},
+        ),
+        XRD(
+            attributes={"xmlns": "urn:other"},
+            links=[
+                Link(
+                    rel="a",
+                    template="t{uri}",
+                    titles=[Title('x&"y'), Title("z", lang="fr")],
+                ),
+                Link(
+                    rel="b", type="text/html", href="h?a=1&b=2", properties={"q": None}
+                ),
+            ],
+        ),
+    ]
+    for xrd in xrds:
+        assert render_xml_c14n(xrd) == canonicalize(
+            render_xml(xrd, canonical=True).toxml()
+        )
@@ -0,0 +1,118 @@
+import io
+import json
+import tarfile
+import zipfile
+
+from xrd import iter_sources, main
+
+XML_DOC = """<?xml version="1.0" ?>
+<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+    <Subject>acct:someone@example.com</Subject>
+    <Link rel="self" href="https://example.com/someone" />
+</XRD>
+"""
+
+JRD_DOC = '{"subject": "acct:other@example.com", "links": [{"rel": "self"}]}'
+
+INVALID_DOC = '{"subject": "not a uri", "links": [{"href": "a", "template": "b"}]}'
+
+
+def write_corpus(root):
+    (root / "docs").mkdir()
+    (root / "docs" / "a.xml").write_text(XML_DOC)
+    (root / "docs" / "b.json").write_text(JRD_DOC)
+    (root / "corpus.ndjson").write_text(JRD_DOC + "\n\n" + JRD_DOC + "\n")
+    with zipfile.ZipFile(root / "corpus.zip", "w") as archive:
+        archive.writestr("a.xml", XML_DOC)
+    with tarfile.open(root / "corpus.tar.gz", "w:gz") as archive:
+        data = JRD_DOC.encode()
+        info = tarfile.TarInfo("b.json")
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+
+
+def test_iter_sources(tmp_path):
+    write_corpus(tmp_path)
+    names = [name for name, _ in iter_sources([str(tmp_path)])]
+    assert names == [
+        f"{tmp_path}/corpus.ndjson:1",
+        f"{tmp_path}/corpus.ndjson:3",
+        f"{tmp_path}/corpus.tar.gz:b.json",
+        f"{tmp_path}/corpus.zip:a.xml",
+        f"{tmp_path}/docs/a.xml",
+        f"{tmp_path}/docs/b.json",
+    ]
+
+
+def test_convert(tmp_path, capsys):
+    write_corpus(tmp_path)
+    assert main(["convert", "-j", "1", str(tmp_path)]) == 0
+    out, err = capsys.readouterr()
+    subjects = [json.loads(line)["subject"] for line in out.splitlines()]
+    assert subjects == ["acct:other@example.com"] * 3 + [
+        "acct:someone@example.com"
+    ] * 2 + ["acct:other@example.com"]
+    assert "documents:   6" in err
+
+
+def test_convert_xml_output_file(tmp_path, capsys):
+    write_corpus(tmp_path)
+    output = tmp_path / "out.xml"
+    assert (
+        main(
+            [
+                "convert",
+                "--to",
+                "xml",
+                "-j",
+                "2",
+                "-o",
+                str(output),
+                str(tmp_path / "docs"),
+            ]
+        )
+        == 0
+    )
+    lines = output.read_text().splitlines()
+    assert len(lines) == 2
+    assert all(line.startswith("<?xml") for line in lines)
+    assert "throughput:" in capsys.readouterr().out
+
+
+def test_validate(tmp_path, capsys):
+    write_corpus(tmp_path)
+    (tmp_path / "docs" / "c.json").write_text(INVALID_DOC)
+    (tmp_path / "docs" / "d.json").write_text("{not json")
+    assert main(["validate", "-j", "1", "--slowest", "2", str(tmp_path / "docs")]) == 1
+    out, err = capsys.readouterr()
+    assert "c.json: ValueError" in err
+    assert "d.json: JSONDecodeError" in err
+    assert "errors:      2" in out
+    assert len(out.split("slowest:")[1].strip().splitlines()) == 2
+
+
+def test_stats_stdin(monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", io.StringIO(JRD_DOC + "\n" + JRD_DOC + "\n"))
+    assert main(["stats", "--ndjson", "-j", "1"]) == 0
+    out, _ = capsys.readouterr()
+    assert "documents:   2" in out
+    assert "links:       2" in out
+
+
+def test_undecodable_documents(tmp_path, capsys):
+    with zipfile.ZipFile(tmp_path / "corpus.zip", "w") as archive:
+        archive.writestr("bad.json", b"\xff" + JRD_DOC.encode())
+        archive.writestr("good.json", JRD_DOC)
+    with tarfile.open(tmp_path / "corpus.tar", "w") as archive:
+        data = b"\xfe" + JRD_DOC.encode()
+        info = tarfile.TarInfo("bad.json")
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    (tmp_path / "bad.json").write_bytes(b"\xff")
+    assert main(["validate", "-j", "1", str(tmp_path)]) == 1
+    out, err = capsys.readouterr()
+    assert "corpus.zip:bad.json: UnicodeDecodeError" in err
+    assert "corpus.tar:bad.json: UnicodeDecodeError" in err
+    assert "bad.json: UnicodeDecodeError" in err
+    assert "documents:   4" in out
+    assert "errors:      3" in out
@@ -0,0 +1,81 @@
+import pytest
+
+from xrd import XRD, Link, Title, from_columns, parse_xml, to_columns
+
+XRDS = [
+    XRD(
+        subject="http://example.com/",
+        links=[
+            Link(rel="lrdd", template="http://example.com/lrdd?uri={uri}"),
+            Link(
+                rel="author",
+                href="http://example.com/author",
+                titles=[Title("Author"), Title("Autor", lang="de")],
+            ),
+        ],
+    ),
+    XRD(subject="http://example.org/"),
+    XRD(
+        subject="http://example.net/",
+        links=[
+            Link(rel="lrdd", template="http://example.net/webfinger?resource={uri}")
+        ],
+    ),
+]
+
+
+def test_to_columns():
+    columns = to_columns(XRDS)
+    assert len(columns) == 4
+    assert list(columns.xrd) == [0, 0, 0, 2]
+    assert list(columns.link) == [0, 1, 1, 0]
+    assert list(columns.titled) == [0, 1, 1, 0]
+    assert columns["rel"].decode() == ["lrdd", "author", "author", "lrdd"]
+    assert columns["title"].decode() == [None, "Author", "Autor", None]
+    assert columns["lang"].decode() == [None, "", "de", None]
+    assert columns["subject"][3] == "http://example.net/"
+    # values are stored once per column
+    assert columns["rel"].values == [None, "lrdd", "author"]
+
+
+def test_from_columns():
+    assert from_columns(to_columns(XRDS)) == XRDS
+
+
+def test_from_columns_keeps_empty_titles():
+    xrd = parse_xml(
+        """<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+        <Link rel="author"><Title xml:lang="en"/><Title/></Link></XRD>"""
+    )
+    assert xrd.links[0].titles == [Title(None, "en"), Title(None)]
+    xrds = [xrd, XRD(links=[Link(rel="author", titles=[Title("")])])]
+    # columns keep subjects and links only
+    assert [x.links for x in from_columns(to_columns(xrds))] == [x.links for x in xrds]
+
+
+def test_rows_where():
+    columns = to_columns(XRDS)
+    rows = columns.rows_where(
+        rel=lambda rel: rel == "lrdd",
+        template=lambda template: "webfinger" in (template or ""),
+    )
+    assert list(rows) == [3]
+    assert columns["subject"].decode(rows) == ["http://example.net/"]
+    assert list(columns.rows_where(rel=lambda rel: rel == "lrdd")) == [0, 3]
+    assert list(columns.rows_where()) == [0, 1, 2, 3]
+
+
+def test_to_numpy():
+    numpy = pytest.importorskip("numpy")
+    arrays = to_columns(XRDS).to_numpy()
+    assert numpy.array_equal(arrays["xrd"], [0, 0, 0, 2])
+    assert numpy.array_equal(arrays["rel"], [1, 2, 2, 1])
+    assert numpy.array_equal(arrays["titled"], [0, 1, 1, 0])
+
+
+def test_to_arrow():
+    pytest.importorskip("pyarrow")
+    table = to_columns(XRDS).to_arrow()
+    assert table.num_rows == 4
+    assert table.column("rel").to_pylist() == ["lrdd", "author", "author", "lrdd"]
+    assert table.column("titled").to_pylist() == [0, 1, 1, 0]
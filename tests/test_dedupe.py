@@ -0,0 +1,62 @@
+import pytest
+
+from xrd import XRD, Link, Title, dedupe, parse_json
+
+JRD_DOC = """{
+    "subject": "acct:bob@example.com",
+    "aliases": ["https://example.com/bob"],
+    "properties": {"http://example.com/ns/a": "1", "http://example.com/ns/b": "2"},
+    "links": [
+        {"rel": "self", "href": "https://example.com/bob", "titles": {"en": "Bob"}},
+        {"rel": "lrdd", "template": "https://example.com/lrdd?uri={uri}"}
+    ]
+}"""
+
+
+def test_structural_key():
+    assert parse_json(JRD_DOC).structural_key() == parse_json(JRD_DOC).structural_key()
+    assert hash(parse_json(JRD_DOC).structural_key()) == hash(
+        parse_json(JRD_DOC).structural_key()
+    )
+
+
+def test_property_order():
+    a = XRD(properties={"a": "1", "b": "2"})
+    b = XRD(properties={"b": "2", "a": "1"})
+    assert a == b
+    assert a.structural_key() == b.structural_key()
+
+
+def test_link_order():
+    links = [Link(rel="a"), Link(rel="b", titles=[Title("B")])]
+    a = XRD(links=links)
+    b = XRD(links=list(reversed(links)))
+    assert a != b
+    assert a.structural_key() != b.structural_key()
+
+
+def test_changes_in_place():
+    xrd = parse_json(JRD_DOC)
+    before = xrd.structural_key()
+    xrd.links[0].titles.append(Title("Robert", "de"))
+    assert xrd.structural_key() != before
+    assert xrd != parse_json(JRD_DOC)
+
+
+def test_mutable_types_are_not_hashable():
+    for value in (XRD(), Link(), Title("Bob")):
+        with pytest.raises(TypeError):
+            hash(value)
+
+
+def test_dedupe():
+    bob = parse_json(JRD_DOC)
+    renamed = parse_json(JRD_DOC)
+    renamed.subject, renamed.aliases = "https://example.com/bob", ["bob@Example.com"]
+    other = parse_json(JRD_DOC)
+    other.links = other.links[:1]
+
+    result = dedupe([bob, parse_json(JRD_DOC), renamed, other, renamed])
+    assert result.unique == [bob, other]
+    assert result.exact == {1: 0, 4: 0}
+    assert result.equivalent == {2: 0}
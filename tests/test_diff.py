@@ -0,0 +1,111 @@
+import copy
+import datetime
+import json
+
+from xrd import XRD, Link, Title, apply_patch, diff
+
+
+def build():
+    return XRD(
+        subject="acct:someone@example.com",
+        aliases=["https://example.com/someone", "https://example.com/~someone"],
+        properties={"http://example.com/a": "1", "http://example.com/b": None},
+        links=[
+            Link(rel="self", type="application/activity+json", href="https://a/1"),
+            Link(
+                rel="http://webfinger.net/rel/profile-page",
+                href="https://example.com/someone",
+                titles=[Title("Profile", lang="en")],
+            ),
+            Link(rel="lrdd", template="https://example.com/lrdd?uri={uri}"),
+        ],
+    )
+
+
+def roundtrip(old, new):
+    patch = json.loads(json.dumps(diff(old, new)))
+    return apply_patch(copy.deepcopy(old), patch)
+
+
+def test_diff_equal():
+    assert diff(build(), build()) == {}
+
+
+def test_diff_scalars():
+    old = build()
+    new = build()
+    new.subject = "acct:other@example.com"
+    new.expires = datetime.datetime(2023, 1, 1, tzinfo=datetime.timezone.utc)
+    patch = diff(old, new)
+    assert patch == {
+        "subject": "acct:other@example.com",
+        "expires": "2023-01-01T00:00:00Z",
+    }
+    assert roundtrip(old, new) == new
+    assert roundtrip(new, old) == old
+
+
+def test_diff_aliases():
+    old = build()
+    new = build()
+    new.aliases.remove("https://example.com/~someone")
+    new.aliases.append("https://example.org/someone")
+    patch = diff(old, new)
+    assert patch["aliases"] == {
+        "add": ["https://example.org/someone"],
+        "remove": ["https://example.com/~someone"],
+    }
+    assert roundtrip(old, new) == new
+
+    new.aliases.reverse()
+    assert "replace" in diff(old, new)["aliases"]
+    assert roundtrip(old, new) == new
+
+
+def test_diff_properties():
+    old = build()
+    new = build()
+    new.properties["http://example.com/a"] = ["1", "2"]
+    new.properties["http://example.com/c"] = None
+    del new.properties["http://example.com/b"]
+    patch = diff(old, new)
+    assert patch["properties"] == {
+        "set": {"http://example.com/a": ["1", "2"], "http://example.com/c": None},
+        "remove": ["http://example.com/b"],
+    }
+    assert roundtrip(old, new) == new
+
+
+def test_diff_links():
+    old = build()
+    new = build()
+    new.links[1].titles.append(Title("Profil", lang="de"))
+    del new.links[0]
+    new.links.insert(1, Link(rel="avatar", href="https://example.com/a.png"))
+    new.links.append(Link(rel="avatar", href="https://example.com/a.png"))
+    patch = diff(old, new)
+    assert patch["links"]["remove"] == [
+        ["self", "application/activity+json", "https://a/1", ""]
+    ]
+    assert len(patch["links"]["change"]) == 1
+    assert [index for index, _ in patch["links"]["add"]] == [1, 3]
+    assert roundtrip(old, new) == new
+    assert roundtrip(new, old) == old
+
+
+def test_diff_links_duplicates():
+    link = Link(rel="alternate", href="https://example.com/")
+    old = XRD(links=[link, copy.deepcopy(link), copy.deepcopy(link)])
+    new = XRD(links=[copy.deepcopy(link)])
+    new.links[0].properties["x"] = "y"
+    assert len(diff(old, new)["links"]["remove"]) == 2
+    assert roundtrip(old, new) == new
+    assert roundtrip(new, old) == old
+
+
+def test_diff_links_reordered():
+    old = build()
+    new = build()
+    new.links.reverse()
+    assert "replace" in diff(old, new)["links"]
+    assert roundtrip(old, new) == new
@@ -0,0 +1,135 @@
+import threading
+import time
+import urllib.error
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from xrd import XRD, XRDFetcher, fetch_many
+
+from .test_refresh import JRD_DOC, XML_DOC
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.connections.add(self.client_address)
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.05)
+            if self.path == "/missing":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if self.path == "/moved":
+                self.send_response(301)
+                self.send_header("Location", "/jrd")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if self.path.startswith("/jrd"):
+                body, content_type = JRD_DOC, "application/jrd+json"
+            else:
+                body, content_type = XML_DOC, "application/xrd+xml; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if self.path == "/no-store":
+                self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            self.wfile.write(body)
+            if self.path == "/close":
+                # close without announcing it, as servers do with idle connections
+                self.close_connection = True
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.connections = set()
+    server.active = server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch_many(server):
+    urls = [f"{server.url}/xml", f"{server.url}/jrd", f"{server.url}/missing"]
+    with XRDFetcher() as fetcher:
+        results = fetch_many(urls, fetcher=fetcher)
+    assert list(results) == urls
+    assert results[urls[0]].subject == "http://example.com/"
+    assert results[urls[0]].links[0].rel == "lrdd"
+    assert results[urls[1]].expires is not None
+    assert isinstance(results[urls[2]], urllib.error.HTTPError)
+    assert results[urls[2]].code == 404
+
+
+def test_keep_alive(server):
+    urls = [f"{server.url}/slow/{i}" for i in range(8)]
+    with XRDFetcher(per_host=2) as fetcher:
+        results = fetcher.fetch_many(urls, max_workers=8)
+        assert all(isinstance(xrd, XRD) for xrd in results.values())
+        assert server.max_active <= 2
+        assert len(server.connections) <= 2
+
+
+def test_reconnect(server):
+    with XRDFetcher() as fetcher:
+        fetcher.fetch(f"{server.url}/close")
+        time.sleep(0.05)
+        assert isinstance(fetcher.fetch(f"{server.url}/jrd"), XRD)
+    assert server.requests == ["/close", "/jrd"]
+    assert len(server.connections) == 2
+
+
+def test_cache(server):
+    now = [0.0]
+    fetcher = XRDFetcher(cache_ttl=60, clock=lambda: now[0])
+    urls = [f"{server.url}/xml", f"{server.url}/jrd", f"{server.url}/no-store"]
+    first = fetcher.fetch_many(urls + urls)
+    assert len(server.requests) == 3  # duplicates are fetched once
+
+    second = fetcher.fetch_many(urls)
+    assert second[urls[0]] is first[urls[0]]
+    assert second[urls[1]] is first[urls[1]]
+    assert server.requests[3:] == ["/no-store"]
+
+    now[0] = 61.0
+    fetcher.fetch_many(urls)
+    assert sorted(server.requests[4:]) == ["/no-store", "/xml"]
+    assert fetcher.fetch(urls[1]) is first[urls[1]]
+
+    now[0] = 1200.0  # /jrd expires
+    assert fetcher.fetch(urls[1]) is not first[urls[1]]
+    fetcher.close()
+
+
+def test_redirect(server):
+    with XRDFetcher() as fetcher:
+        xrd = fetcher.fetch(f"{server.url}/moved")
+    assert xrd.expires is not None
+    assert server.requests == ["/moved", "/jrd"]
+
+
+def test_connection_error():
+    results = fetch_many(["http://127.0.0.1:9/", "ftp://example.com/"], timeout=1)
+    assert all(isinstance(error, Exception) for error in results.values())
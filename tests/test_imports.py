@@ -0,0 +1,83 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFERRED = ["json", "hashlib", "xml.dom.minidom"]
+
+# imported only by fetching, the command line, profiling, archives and stores
+HEAVY = [
+    "argparse",
+    "base64",
+    "cProfile",
+    "concurrent.futures",
+    "email",
+    "gzip",
+    "http.client",
+    "mmap",
+    "multiprocessing",
+    "pstats",
+    "ssl",
+    "subprocess",
+    "tarfile",
+    "tracemalloc",
+    "urllib.error",
+    "urllib.request",
+    "xml.parsers.expat",
+    "zipfile",
+]
+
+
+def loaded_after(code, modules=DEFERRED):
+    """Return which of modules are loaded after running code in a fresh
+    interpreter."""
+    script = (
+        f"import sys\n{code}\n"
+        f"loaded = [m for m in {modules!r} if m in sys.modules]\n"
+        "print(__import__('json').dumps(loaded))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout)
+
+
+def test_import_is_lazy():
+    assert loaded_after("import xrd") == []
+
+
+def test_import_skips_heavy_modules():
+    assert loaded_after("import xrd", HEAVY) == []
+    loaded = loaded_after("import xrd; xrd.render_json(xrd.parse_json('{}'))", HEAVY)
+    assert loaded == []
+
+
+def test_json_loads_json_only():
+    loaded = loaded_after("import xrd; xrd.render_json(xrd.parse_json('{}'))")
+    assert "json" in loaded
+    assert "xml.dom.minidom" not in loaded
+
+
+def test_xml_loads_minidom_only():
+    doc = '<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0"/>'
+    loaded = loaded_after(f"import xrd; xrd.render_xml(xrd.parse_xml({doc!r})).toxml()")
+    assert "xml.dom.minidom" in loaded
+    assert "json" not in loaded
+
+
+def test_logger():
+    import xrd
+
+    assert xrd.logger.name == "xrd"
+
+
+def test_xml_digest_does_not_load_minidom():
+    loaded = loaded_after("import xrd; xrd.XRD(subject='acct:a@b').digest('xml')")
+    assert "hashlib" in loaded
+    assert "xml.dom.minidom" not in loaded
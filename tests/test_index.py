@@ -0,0 +1,100 @@
+import pytest
+
+from xrd import XRD, Link, XRDIndex, normalize_resource
+
+
+def test_normalize_resource():
+    assert normalize_resource("acct:Bob@Example.COM") == "acct:Bob@example.com"
+    assert normalize_resource("bob@example.com") == "acct:bob@example.com"
+    assert normalize_resource("@bob@example.com") == "acct:bob@example.com"
+    assert normalize_resource("HTTPS://Example.com:443") == "https://example.com/"
+    assert (
+        normalize_resource("http://example.com:8080/a?b#c")
+        == "http://example.com:8080/a?b"
+    )
+    assert normalize_resource("urn:example:thing") == "urn:example:thing"
+    assert normalize_resource("HTTP://[::1]:80/") == "http://[::1]/"
+    assert (
+        normalize_resource("https://[2001:DB8::1]:8443/a")
+        == "https://[2001:db8::1]:8443/a"
+    )
+    assert normalize_resource("example.com") == "example.com"
+
+
+def build(name, aliases=()):
+    return XRD(
+        subject=f"acct:{name}@example.com",
+        aliases=[f"https://example.com/{alias}" for alias in aliases],
+        links=[
+            Link(rel="self", href=f"https://example.com/users/{name}"),
+            Link(rel="http://webfinger.net/rel/avatar", href=f"https://a/{name}.png"),
+        ],
+    )
+
+
+def test_index_lookup():
+    alice = build("alice", ["@alice"])
+    bob = build("bob")
+    index = XRDIndex([alice, bob])
+    assert len(index) == 2
+    assert index.get("acct:alice@EXAMPLE.com") is alice
+    assert index.get("alice@example.com") is alice
+    assert index["https://EXAMPLE.com:443/@alice"] is alice
+    assert "acct:bob@example.com" in index
+    assert index.get("acct:carol@example.com") is None
+    with pytest.raises(KeyError):
+        index["acct:carol@example.com"]
+    assert list(index) == [alice, bob]
+
+
+def test_index_remove():
+    alice = build("alice", ["@alice"])
+    index = XRDIndex([alice])
+    index.remove(alice)
+    assert len(index) == 0
+    assert index.get("acct:alice@example.com") is None
+    assert index.get("https://example.com/@alice") is None
+
+
+def test_index_replace():
+    old = build("alice", ["@alice", "~alice"])
+    new = build("alice", ["@alice"])
+    index = XRDIndex([old])
+    assert index.replace(new) is old
+    assert len(index) == 1
+    assert index.get("acct:alice@example.com") is new
+    assert index.get("https://example.com/~alice") is None
+
+
+def test_index_shared_alias():
+    alice = build("alice", ["shared"])
+    bob = build("bob", ["shared"])
+    index = XRDIndex([alice, bob])
+    assert index.get("https://example.com/shared") is bob
+    index.remove(alice)
+    assert index.get("https://example.com/shared") is bob
+
+
+def test_index_remove_restores_previous_owner():
+    alice = build("alice", ["shared"])
+    bob = build("bob", ["shared"])
+    carol = build("carol", ["shared"])
+    index = XRDIndex([alice, bob, carol])
+    index.remove(carol)
+    assert index.get("https://example.com/shared") is bob
+    index.remove(alice)
+    assert index.get("https://example.com/shared") is bob
+    index.remove(bob)
+    assert index.get("https://example.com/shared") is None
+    assert not index.owners
+
+
+def test_index_links():
+    alice = build("alice")
+    index = XRDIndex([alice])
+    assert index.links("acct:alice@example.com") == alice.links
+    links = index.links("acct:alice@example.com", "self")
+    assert links == [alice.links[0]]
+    assert links[0] is alice.links[0]
+    assert index.links("acct:alice@example.com", ["self", "nope"]) == [alice.links[0]]
+    assert index.links("acct:carol@example.com", "self") == []
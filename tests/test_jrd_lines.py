@@ -0,0 +1,76 @@
+import gzip
+import io
+
+import pytest
+
+from xrd import XRD, Link, iter_jrd_lines, open_jrd_lines, write_jrd_lines
+
+
+def corpus(size=25):
+    return [
+        XRD(
+            subject=f"acct:user{i}@example.com",
+            links=[Link(rel="self", href=f"https://example.com/users/{i}")],
+        )
+        for i in range(size)
+    ]
+
+
+def normalized(xrds):
+    return [(xrd.subject, xrd.links) for xrd in xrds]
+
+
+def test_text_roundtrip():
+    fp = io.StringIO()
+    assert write_jrd_lines(fp, corpus()) == 25
+    assert len(fp.getvalue().splitlines()) == 25
+    fp.seek(0)
+    assert normalized(iter_jrd_lines(fp)) == normalized(corpus())
+
+
+def test_binary_roundtrip():
+    fp = io.BytesIO()
+    write_jrd_lines(fp, corpus())
+    fp.seek(0)
+    assert normalized(iter_jrd_lines(fp)) == normalized(corpus())
+
+
+def test_blank_lines():
+    fp = io.StringIO(
+        '{"subject": "acct:a@example.com"}\n\n  \n{"subject": "acct:b@example.com"}\n'
+    )
+    assert [xrd.subject for xrd in iter_jrd_lines(fp)] == [
+        "acct:a@example.com",
+        "acct:b@example.com",
+    ]
+
+
+def test_gzip_roundtrip(tmp_path):
+    path = str(tmp_path / "corpus.jsonl.gz")
+    with open_jrd_lines(path, "wt") as fp:
+        write_jrd_lines(fp, corpus())
+    with gzip.open(path, "rb") as fp:
+        assert normalized(iter_jrd_lines(fp)) == normalized(corpus())
+
+
+def test_parallel():
+    fp = io.StringIO()
+    write_jrd_lines(fp, corpus(100))
+    fp.seek(0)
+    assert normalized(iter_jrd_lines(fp, jobs=2, batch_size=7)) == normalized(
+        corpus(100)
+    )
+
+
+def test_lazy():
+    fp = io.StringIO()
+    write_jrd_lines(fp, corpus())
+    fp.seek(0)
+    xrds = iter_jrd_lines(fp)
+    next(xrds)
+    assert fp.tell() < len(fp.getvalue())
+
+
+def test_invalid_line():
+    with pytest.raises(ValueError):
+        list(iter_jrd_lines(io.StringIO("{nope\n")))
@@ -0,0 +1,59 @@
+from xrd import collapsed_stacks, format_collapsed, main, profile_stages
+
+XML_DOC = """<?xml version="1.0" ?>
+<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+    <Subject>acct:someone@example.com</Subject>
+    <Link rel="self" href="https://example.com/someone"><Title>Me</Title></Link>
+</XRD>
+"""
+
+JRD_DOC = '{"subject": "acct:someone@example.com", "links": [{"rel": "self"}]}'
+
+
+def test_profile_stages_xml():
+    results = profile_stages(XML_DOC, iterations=2)
+    assert [result.name for result in results] == [
+        "parseString",
+        "xrd_from_dom",
+        "validate",
+        "validation_errors",
+        "jrd_dict",
+        "json.dumps",
+        "render_xml",
+        "toxml",
+    ]
+    assert all(result.seconds > 0 for result in results)
+    assert results[0].allocated > 0
+    assert results[0].stats.total_calls > 0
+
+
+def test_profile_stages_json():
+    results = profile_stages(JRD_DOC, iterations=2)
+    assert [result.name for result in results][:2] == ["json.loads", "xrd_from_jrd"]
+
+
+def test_collapsed_stacks():
+    stacks = collapsed_stacks(XML_DOC, iterations=2)
+    assert any(
+        stack.startswith("xrd_from_dom;") and "node_text" in stack for stack in stacks
+    )
+    for line in format_collapsed(stacks).splitlines():
+        stack, count = line.rsplit(" ", 1)
+        assert stack.split(";")[0] in dict.fromkeys(s.split(";")[0] for s in stacks)
+        assert int(count) > 0
+
+
+def test_profile_cli(tmp_path, capsys):
+    path = tmp_path / "doc.xml"
+    path.write_text(XML_DOC)
+    folded = tmp_path / "out.folded"
+    assert (
+        main(
+            ["profile", str(path), "-n", "2", "--top", "2", "--collapsed", str(folded)]
+        )
+        == 0
+    )
+    out, _ = capsys.readouterr()
+    assert "render_xml" in out
+    assert "Ordered by: internal time" in out
+    assert folded.read_text()
@@ -0,0 +1,128 @@
+import copy
+import json
+import pickle
+
+from xrd import XRD, Link, Properties, parse_xml, property_items
+
+
+def test_dict_compatibility():
+    props = Properties({"a": "1", "b": ["2", "3"], "c": None})
+    assert props["a"] == "1"
+    assert props["b"] == ["2", "3"]
+    assert props["c"] is None
+    assert props == {"a": "1", "b": ["2", "3"], "c": None}
+    assert {"a": "1", "b": ["2", "3"], "c": None} == props
+    assert list(props) == ["a", "b", "c"]
+    assert len(props) == 3
+    assert "b" in props
+    del props["b"]
+    assert dict(props) == {"a": "1", "c": None}
+
+
+def test_values_are_stored_as_given():
+    props = Properties({"a": ["1"], "b": "2"})
+    assert props["a"] == ["1"]
+    props["a"].append("3")
+    assert props.all("a") == ["1", "3"]
+    assert json.dumps(props) == '{"a": ["1", "3"], "b": "2"}'
+    assert isinstance(props, dict)
+
+
+def test_all_returns_a_copy():
+    props = Properties({"a": ["1", "2"]})
+    props.all("a").append("3")
+    assert props["a"] == ["1", "2"]
+
+
+def test_add():
+    props = Properties()
+    props.add("a", "1")
+    assert props["a"] == "1"
+    props.add("a", None)
+    props.add("a", "2")
+    assert props["a"] == ["1", None, "2"]
+    assert props.all("a") == ["1", None, "2"]
+    assert props.all("b") == []
+
+
+def test_add_appends_to_the_stored_list():
+    values = ["1"]
+    props = Properties({"a": values, "b": "1"})
+    props.add("a", "2")
+    assert props["a"] is values
+    assert values == ["1", "2"]
+    props.add("b", "2")
+    values = props["b"]
+    props.add("b", "3")
+    assert props["b"] is values
+    assert values == ["1", "2", "3"]
+    assert dict(property_items(props)) == {"a": ["1", "2"], "b": ["1", "2", "3"]}
+
+
+def test_dict_methods_keep_values():
+    props = Properties(a="1")
+    props.update({"b": ("2", "3")}, c="4")
+    props |= {"d": None}
+    assert props.setdefault("e", "5") == "5"
+    assert props.setdefault("a", "6") == "1"
+    assert props.all("b") == ["2", "3"]
+    assert props.is_nil("d")
+    assert props.pop("c") == "4"
+    assert props.pop("c", None) is None
+    del props["e"]
+    props.add("c", "7")
+    assert props.popitem() == ("c", "7")
+    assert dict(property_items(props)) == {"a": ["1"], "b": ["2", "3"], "d": [None]}
+    assert (props | {"a": "8"}).last("a") == "8"
+    props.clear()
+    assert props.all("a") == []
+    assert list(property_items(props)) == []
+
+
+def test_last_and_nil():
+    props = Properties({"a": ["1", "2"], "n": None, "m": ["1", None]})
+    assert props.last("a") == "2"
+    assert props.last("b") is None
+    assert props.last("b", "x") == "x"
+    assert props.is_nil("n")
+    assert props.is_nil("m")
+    assert not props.is_nil("a")
+    assert not props.is_nil("b")
+
+
+def test_models_convert_dicts():
+    xrd = XRD(properties={"a": "1"}, links=[Link(properties={"b": ["1", "2"]})])
+    assert isinstance(xrd.properties, Properties)
+    assert isinstance(xrd.links[0].properties, Properties)
+    assert xrd.links[0].properties.last("b") == "2"
+    assert xrd == XRD(
+        properties=Properties({"a": "1"}), links=[Link(properties={"b": ["1", "2"]})]
+    )
+
+
+def test_parse_xml_multiple():
+    xrd = parse_xml(
+        """<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+        <Property type="v">1</Property><Property type="v">2</Property></XRD>"""
+    )
+    assert xrd.properties.all("v") == ["1", "2"]
+    assert json.loads(xrd.as_json())["properties"] == {"v": "2"}
+
+
+def test_renderers_accept_plain_dicts():
+    xrd = XRD()
+    xrd.properties = {"v": ["1", "2"]}
+    assert json.loads(xrd.as_json())["properties"] == {"v": "2"}
+    assert len(xrd.as_xml().getElementsByTagName("Property")) == 2
+
+
+def test_copy_and_pickle():
+    props = Properties({"a": ["1", "2"]})
+    assert copy.deepcopy(props) == props
+    assert pickle.loads(pickle.dumps(props)) == props
+    props.add("a", "3")
+    assert props.all("a") == ["1", "2", "3"]
+    for other in (copy.deepcopy(props), pickle.loads(pickle.dumps(props))):
+        other.add("a", "4")
+        assert other.all("a") == ["1", "2", "3", "4"]
+        assert props.all("a") == ["1", "2", "3"]
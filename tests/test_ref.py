@@ -0,0 +1,83 @@
+import threading
+
+from xrd import XRD, Link, XRDRef, diff
+
+
+def build(version):
+    return XRD(
+        subject="acct:someone@example.com",
+        properties={"version": str(version)},
+        links=[
+            Link(rel=f"rel-{i}", href=f"https://example.com/{version}")
+            for i in range(version % 7)
+        ],
+    )
+
+
+def test_ref_get_set():
+    xrd = build(1)
+    ref = XRDRef(xrd)
+    assert ref.get() is xrd
+    other = build(2)
+    ref.set(other)
+    assert ref.get() is other
+
+
+def test_ref_update_copies():
+    xrd = build(1)
+    ref = XRDRef(xrd)
+    updated = ref.update(lambda x: x.links.append(Link(rel="new")))
+    assert ref.get() is updated
+    assert updated is not xrd
+    assert len(xrd.links) == 1
+    assert updated.links[-1].rel == "new"
+
+
+def test_ref_update_returning_new():
+    ref = XRDRef(build(1))
+    assert ref.update(lambda x: build(3)) == build(3)
+    assert ref.get() == build(3)
+
+
+def test_ref_apply_patch():
+    ref = XRDRef(build(1))
+    ref.apply_patch(diff(build(1), build(5)))
+    assert ref.get() == build(5)
+    assert ref.find_link("rel-4", attr="href") == "https://example.com/5"
+
+
+def test_ref_stress():
+    """Readers must always see a consistent snapshot while a writer updates."""
+    ref = XRDRef(build(0))
+    done = threading.Event()
+    errors = []
+
+    def reader():
+        while not done.is_set():
+            xrd = ref.get()
+            version = int(xrd.properties["version"])
+            hrefs = {link.href for link in xrd.links}
+            if len(xrd.links) != version % 7 or hrefs - {
+                f"https://example.com/{version}"
+            }:
+                errors.append(version)
+
+    def writer():
+        for version in range(1, 500):
+
+            def update(xrd, version=version):
+                xrd.properties["version"] = str(version)
+                xrd.links[:] = build(version).links
+
+            ref.update(update)
+        done.set()
+
+    readers = [threading.Thread(target=reader) for _ in range(8)]
+    for thread in readers:
+        thread.start()
+    writer()
+    for thread in readers:
+        thread.join()
+
+    assert errors == []
+    assert ref.get() == build(499)
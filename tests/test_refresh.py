@@ -0,0 +1,194 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from xrd import XRD, XRDFetcher, XRDRefresher, parse_response
+
+XML_DOC = b"""<?xml version="1.0" ?>
+<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+    <Subject>http://example.com/</Subject>
+    <Link rel="lrdd" template="http://example.com/lrdd?uri={uri}" />
+</XRD>
+"""
+
+JRD_DOC = b'{"subject": "http://example.com/", "expires": "1970-01-01T00:20:00Z"}'
+
+
+class Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append((self.path, dict(self.headers)))
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.05)
+            if self.path == "/missing":
+                self.send_response(404)
+                self.end_headers()
+                return
+            if self.path == "/etag" and self.headers.get("If-None-Match") == '"v1"':
+                self.send_response(304)
+                self.end_headers()
+                return
+            if self.path == "/modified" and self.headers.get("If-Modified-Since"):
+                self.send_response(304)
+                self.end_headers()
+                return
+            if self.path == "/jrd":
+                body, content_type = JRD_DOC, "application/jrd+json"
+            else:
+                body, content_type = XML_DOC, "application/xrd+xml; charset=utf-8"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            if self.path == "/etag":
+                self.send_header("ETag", '"v1"')
+            if self.path == "/modified":
+                self.send_header("Last-Modified", "Sat, 01 Jan 2000 00:00:00 GMT")
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.active = server.max_active = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_response():
+    assert (
+        parse_response("application/jrd+json", JRD_DOC).subject == "http://example.com/"
+    )
+    assert (
+        parse_response("application/xrd+xml", XML_DOC).subject == "http://example.com/"
+    )
+    assert parse_response(None, XML_DOC).subject == "http://example.com/"
+
+
+def test_etag(server):
+    url = f"{server.url}/etag"
+    refresher = XRDRefresher([url])
+    xrd = refresher.refresh(url)
+    assert isinstance(xrd, XRD)
+    assert refresher.entries[url].etag == '"v1"'
+
+    assert refresher.refresh(url) is xrd
+    assert server.requests[-1][1]["If-None-Match"] == '"v1"'
+    assert refresher.entries[url].parsed == 1
+    assert refresher.entries[url].reused == 1
+
+
+def test_last_modified(server):
+    url = f"{server.url}/modified"
+    refresher = XRDRefresher([url])
+    xrd = refresher.refresh(url)
+    assert refresher.refresh(url) is xrd
+    assert (
+        server.requests[-1][1]["If-Modified-Since"] == "Sat, 01 Jan 2000 00:00:00 GMT"
+    )
+
+
+def test_unchanged_body(server):
+    url = f"{server.url}/plain"
+    refresher = XRDRefresher([url])
+    xrd = refresher.refresh(url)
+    assert refresher.refresh(url) is xrd
+    assert "If-None-Match" not in server.requests[-1][1]
+    assert refresher.entries[url].parsed == 1
+
+
+def test_schedule(server):
+    now = [1000.0]
+    refresher = XRDRefresher(
+        default_interval=300, min_interval=10, max_interval=600, clock=lambda: now[0]
+    )
+    xml_url, jrd_url = f"{server.url}/etag", f"{server.url}/jrd"
+    refresher.add(xml_url)
+    refresher.add(jrd_url, when=1005.0)
+    assert refresher.due() == [xml_url]
+    assert refresher.due() == []
+
+    refresher.refresh(xml_url)  # does not expire
+    assert refresher.entries[xml_url].next_refresh == 1300.0
+    now[0] = 1005.0
+    assert refresher.refresh_due() == {jrd_url: refresher.get(jrd_url)}
+    assert refresher.entries[jrd_url].next_refresh == 1200.0  # expires
+    assert refresher.next_refresh() == 1200.0
+
+    refresher.remove(jrd_url)
+    assert refresher.next_refresh() == 1300.0
+
+
+def test_errors(server):
+    url = f"{server.url}/missing"
+    now = [0.0]
+    refresher = XRDRefresher([url], min_interval=10, clock=lambda: now[0])
+    results = refresher.refresh_due()
+    assert isinstance(results[url], Exception)
+    assert refresher.entries[url].error is results[url]
+    assert refresher.next_refresh() == 10.0
+
+
+def test_removed_while_refreshing(server):
+    url = f"{server.url}/xml"
+
+    class RemovingFetcher(XRDFetcher):
+        def request(self, url, timeout=None, headers=None):
+            refresher.remove(url)
+            return super().request(url, timeout, headers)
+
+    refresher = XRDRefresher([url], fetcher=RemovingFetcher())
+    assert isinstance(refresher.refresh(url), XRD)
+    assert url not in refresher
+    assert refresher.next_refresh() is None
+
+
+def test_shared_fetcher(server):
+    url = f"{server.url}/etag"
+    with XRDFetcher() as fetcher:
+        refresher = XRDRefresher([url], fetcher=fetcher)
+        xrd = refresher.refresh(url)
+        assert refresher.refresh(url) is xrd
+        assert fetcher.request(url, headers={"If-None-Match": '"v1"'})[1] == 304
+
+
+def test_per_host_limit(server):
+    urls = [f"{server.url}/slow/{i}" for i in range(6)]
+    refresher = XRDRefresher(urls, per_host=2, max_workers=6)
+    results = refresher.refresh_due()
+    assert all(isinstance(xrd, XRD) for xrd in results.values())
+    assert len(results) == 6
+    assert server.max_active <= 2
+
+
+def test_run(server):
+    url = f"{server.url}/etag"
+    refresher = XRDRefresher([url], min_interval=0.01, default_interval=0.01)
+    stop = threading.Event()
+    thread = threading.Thread(target=refresher.run, args=(stop,))
+    thread.start()
+    deadline = time.monotonic() + 5
+    while refresher.entries[url].reused < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    thread.join()
+    assert refresher.entries[url].parsed == 1
+    assert refresher.entries[url].reused >= 2
@@ -0,0 +1,69 @@
+import json
+
+from xrd import XRD, Link, PrerenderedJRD, Title, render_json, render_xml
+
+REL_AVATAR = "http://webfinger.net/rel/avatar"
+REL_PROFILE = "http://webfinger.net/rel/profile-page"
+
+
+def build():
+    return XRD(
+        subject="acct:someone@example.com",
+        aliases=["https://example.com/someone"],
+        properties={"http://example.com/ns/role": "admin"},
+        links=[
+            Link(rel="self", href="https://example.com/users/someone"),
+            Link(rel=REL_AVATAR, href="https://example.com/a.png"),
+            Link(
+                rel=REL_PROFILE,
+                href="https://example.com/@someone",
+                titles=[Title("Profile")],
+            ),
+        ],
+    )
+
+
+def test_render_json_rels():
+    data = json.loads(render_json(build(), rels=[REL_AVATAR, REL_PROFILE]))
+    assert [link["rel"] for link in data["links"]] == [REL_AVATAR, REL_PROFILE]
+    assert data["subject"] == "acct:someone@example.com"
+
+    data = json.loads(render_json(build(), rels="self"))
+    assert [link["rel"] for link in data["links"]] == ["self"]
+
+    data = json.loads(render_json(build(), rels=["nope"]))
+    assert "links" not in data
+
+
+def test_empty_rels_match_every_link():
+    xrd = build()
+    assert render_json(xrd, rels=[]) == render_json(xrd)
+    assert render_xml(xrd, rels=()).toxml() == render_xml(xrd).toxml()
+    assert PrerenderedJRD(xrd).render([]) == render_json(xrd).encode()
+
+
+def test_render_json_rels_does_not_modify():
+    xrd = build()
+    render_json(xrd, rels="self")
+    assert len(xrd.links) == 3
+
+
+def test_render_xml_rels():
+    doc = render_xml(build(), rels=[REL_AVATAR]).documentElement
+    links = doc.getElementsByTagName("Link")
+    assert [link.getAttribute("rel") for link in links] == [REL_AVATAR]
+
+
+def test_prerendered_jrd():
+    xrd = build()
+    prerendered = PrerenderedJRD(xrd)
+    assert prerendered.render() == render_json(xrd).encode()
+    for rels in ("self", [REL_AVATAR, REL_PROFILE], [], ["nope"]):
+        assert prerendered.render(rels) == render_json(xrd, rels=rels).encode()
+
+
+def test_prerendered_jrd_sparse():
+    for xrd in (XRD(), XRD(links=[Link(rel="self")]), XRD(aliases=["a"])):
+        prerendered = PrerenderedJRD(xrd)
+        assert prerendered.render() == render_json(xrd).encode()
+        assert prerendered.render("self") == render_json(xrd, rels="self").encode()
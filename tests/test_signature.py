@@ -0,0 +1,329 @@
+import base64
+import hashlib
+from xml.dom.minidom import parseString
+
+import pytest
+
+from xrd import (
+    DIGEST_INFO_PREFIXES,
+    RSAPublicKey,
+    SignatureError,
+    exc_c14n,
+    load_certificate_key,
+    parse_xml,
+    rsa_verify,
+    verify,
+    verify_many,
+)
+
+"""
+Documents are signed with a locally generated 1024 bit RSA test key.
+The XMLSEC_* documents were signed by xmlsec 1.3 with throwaway keys and
+carry the self-signed certificates of those keys.
+"""
+
+N = int(
+    "b9fd49e903b4f22659b90e3a6345b7fbc592b60e82dec3f6ce27352eed79249795784c704e9ff8"
+    "38534c4d807b1119a3c9012ec8af15f2469e4da7497b078e894ba58ffd7475538afddaeac31a70"
+    "47a59b9675cadd44efe4f57997116e5e51a6fa49867532ed666a4165b4a238879b0d8e7a9d75fd"
+    "182b877383805d93ecfd2d",
+    16,
+)
+E = 65537
+D = int(
+    "4d49c647007557133cc1bbf9e37afb63b2ccaebf04ff516be46b429c87ae89d83c12cba0f7eb5e"
+    "18f9f481585ccbd45dcd8fa2435f0ebda93eeb8212f4ff44e96f8a078128c7583c8cff4afd42bd"
+    "f9363c64f500a83b9fb7aabd3856d9ccf15c0fe5e7ce14b81742000ed965bc0314bff79d874885"
+    "d04d1a40714664bd03c9c1",
+    16,
+)
+
+DS = "http://www.w3.org/2000/09/xmldsig#"
+KEY = RSAPublicKey(N, E)
+
+XMLSEC_RSA = """<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+  <Subject>acct:bob@example.com</Subject>
+  <ds:Signature xmlns:ds="http://www.w3.org/2000/09/xmldsig#">
+<ds:SignedInfo>
+<ds:CanonicalizationMethod Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"/>
+<ds:SignatureMethod Algorithm="http://www.w3.org/2001/04/xmldsig-more#rsa-sha256"/>
+<ds:Reference URI="">
+<ds:Transforms>
+<ds:Transform Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature"/>
+<ds:Transform Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"/>
+</ds:Transforms>
+<ds:DigestMethod Algorithm="http://www.w3.org/2001/04/xmlenc#sha256"/>
+<ds:DigestValue>lyCMH2ythhV9yr/qQbh8SKL+S8fU6CGurqjKTVi/1pk=</ds:DigestValue>
+</ds:Reference>
+</ds:SignedInfo>
+<ds:SignatureValue>J3MkDKvaEdMuH1SLVJkKQIUG3zI9NQml6RZTL6vxc69gptBtafbPTcR0dxBpV+eY
+/r0zyW7d0kLPK4QgvXh3qz18VBniNZQM75ks5a8lWxWrICWM7XR8W1P/qJqV07pK
+Tb8xkS0KhNLdGjsreWXLwF9VeszMPy6ovKDZ4BMgqbvWm3NexMoRgZIKTWfDC1BX
+hKRplt2q4yRylj+34I4RCjTSLeFK1K/7mqUFg2n05ykflc/rwQKvBbvKxQUFWuN7
+7dYDS+hrzoSMIczfNybYxS+N20WwMYf2kRAEDo8wN6G87d/U4MsSHrN1kvWAIIO/
+9O8fp8rrc8l9MfGuW6tkWw==</ds:SignatureValue>
+<ds:KeyInfo>
+<ds:X509Data>
+<ds:X509Certificate>MIICrTCCAZWgAwIBAgIBATANBgkqhkiG9w0BAQsFADAaMRgwFgYDVQQDDA9yc2Eu
+ZXhhbXBsZS5jb20wHhcNMjQwMTAxMDAwMDAwWhcNNDQwMTAxMDAwMDAwWjAaMRgw
+FgYDVQQDDA9yc2EuZXhhbXBsZS5jb20wggEiMA0GCSqGSIb3DQEBAQUAA4IBDwAw
+ggEKAoIBAQCqVAEepXXdN8QxOiWKIBnpMuiKbhu0ISsFXk01RGlkIMZ/3vkb0g12
+VSRUEO2D5SbxAajDtXXCtDGye8f3c6FBv6QxB3WRs5zIG47Ofi4+qT0TI/nyaH9u
+EmxZaQbxIffxC5ihwr568sNaOpxz67SGEOFPlU6V9+bckpV9VCv7QJCgxzXX6F6E
+dSLIhDmCor7lkezdjnehm71aRch7uwMzW6rj5uMgrLjrXZEvwaTHA6P6Wb1vLuPI
+n5F1epyG6CQbUCHmTAQ8HgWA00jcsf3VHqQ0ZiDCTT4vfPp7Gqmr+LieXmRFYfIC
+OloVbWxehtgtIcOIj6xjgL1tv0zdoOyNAgMBAAEwDQYJKoZIhvcNAQELBQADggEB
+AIEjKuTr/9v287gPcqYIGvZxj291OBBzvFLPLBoCjdWIbJ6RQyHTKZL/gGopIuLJ
+NWqqjfis6sYw6RnhAs3C2JMDg2KMnB6MShjBNrjk88ZEAnNKi5FcfKgOyYQy1S0/
+ci0VtPGwYSqvYRcJc+ZcxpA8CHk3q2oq7HhO2/0bAiJDEfQDswb1GiW22xsM4kLs
+Ar9Z2oVheYr8IFlpaQ7dsMCVvmoCLX1FF6t1Ll3sXKxmmZ3gNXKPPtOrTWXxxPcz
+MSlpB/OfHlDHwJbeHDZRUNiJL35rZHmzabigcTpSNMExZaG2F1sIZ98pSFVMRTNU
+DFxw8Dy8RsQ7ypRfiZhZy8Y=
+</ds:X509Certificate>
+</ds:X509Data>
+</ds:KeyInfo>
+</ds:Signature><Property type="http://example.com/p">v</Property>
+  <Link rel="http://webfinger.net/rel/profile-page" href="https://example.com/bob"><Title xml:lang="en">Bob</Title></Link>
+</XRD>"""
+
+XMLSEC_ECDSA = """<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+  <Subject>acct:bob@example.com</Subject>
+  <ds:Signature xmlns:ds="http://www.w3.org/2000/09/xmldsig#">
+<ds:SignedInfo>
+<ds:CanonicalizationMethod Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"/>
+<ds:SignatureMethod Algorithm="http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256"/>
+<ds:Reference URI="">
+<ds:Transforms>
+<ds:Transform Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature"/>
+<ds:Transform Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#"/>
+</ds:Transforms>
+<ds:DigestMethod Algorithm="http://www.w3.org/2001/04/xmlenc#sha256"/>
+<ds:DigestValue>lyCMH2ythhV9yr/qQbh8SKL+S8fU6CGurqjKTVi/1pk=</ds:DigestValue>
+</ds:Reference>
+</ds:SignedInfo>
+<ds:SignatureValue>mlmTRqy8mE77ouQAXASVq1JKlxtGRrc1XnI34lEUltdY0of6sY+jYlyl3kupAPZ8
+guMD486RpzNDuz1SI5EEzQ==</ds:SignatureValue>
+<ds:KeyInfo>
+<ds:X509Data>
+<ds:X509Certificate>MIIBHjCBxaADAgECAgEBMAoGCCqGSM49BAMCMBkxFzAVBgNVBAMMDmVjLmV4YW1w
+bGUuY29tMB4XDTI0MDEwMTAwMDAwMFoXDTQ0MDEwMTAwMDAwMFowGTEXMBUGA1UE
+AwwOZWMuZXhhbXBsZS5jb20wWTATBgcqhkjOPQIBBggqhkjOPQMBBwNCAARI88A0
+Xq7OhC6TieUG2vcYd08IyTe06HEikJ98gEz7pknJYsc9EfH0wt4S0d7O5JOIoovJ
+Euh2pVSv5q0TYGA1MAoGCCqGSM49BAMCA0gAMEUCIQCCTehIRNKOlBidX1VBOWxz
+yu8tL7eLOjc2Qd4wQvpcsgIgMmrH1vMXYle03qQrwMTXPDshkxfTCd2zK+I3hH1+
+O/M=
+</ds:X509Certificate>
+</ds:X509Data>
+</ds:KeyInfo>
+</ds:Signature><Property type="http://example.com/p">v</Property>
+  <Link rel="http://webfinger.net/rel/profile-page" href="https://example.com/bob"><Title xml:lang="en">Bob</Title></Link>
+</XRD>"""
+
+BODY = """<?xml version="1.0" ?>
+<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0" xmlns:ds="{ds}">
+    <Subject>http://example.com/</Subject>{signature}
+    <Link rel="lrdd" template="http://example.com/lrdd?uri={{uri}}" />
+</XRD>
+"""
+
+SIGNED_INFO = """<ds:SignedInfo xmlns:ds="{ds}">
+    <ds:CanonicalizationMethod Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#" />
+    <ds:SignatureMethod Algorithm="http://www.w3.org/2001/04/xmldsig-more#rsa-sha256" />
+    <ds:Reference URI="">
+        <ds:Transforms>
+            <ds:Transform Algorithm="http://www.w3.org/2000/09/xmldsig#enveloped-signature" />
+            <ds:Transform Algorithm="http://www.w3.org/2001/10/xml-exc-c14n#" />
+        </ds:Transforms>
+        <ds:DigestMethod Algorithm="http://www.w3.org/2001/04/xmlenc#sha256" />
+        <ds:DigestValue>{digest}</ds:DigestValue>
+    </ds:Reference>
+</ds:SignedInfo>"""
+
+
+def b64(value):
+    return base64.b64encode(value).decode("ascii")
+
+
+def int_bytes(value):
+    return value.to_bytes((value.bit_length() + 7) // 8, "big")
+
+
+def der(tag, content):
+    if len(content) < 0x80:
+        return bytes([tag, len(content)]) + content
+    size = int_bytes(len(content))
+    return bytes([tag, 0x80 | len(size)]) + size + content
+
+
+def der_int(value):
+    return der(0x02, value.to_bytes(value.bit_length() // 8 + 1, "big"))
+
+
+def make_certificate(n=N, e=E):
+    """Build a minimal DER certificate around the test key."""
+    rsa_oid = der(0x30, der(0x06, bytes.fromhex("2a864886f70d010101")) + der(0x05, b""))
+    sig_alg = der(0x30, der(0x06, bytes.fromhex("2a864886f70d01010b")) + der(0x05, b""))
+    spki = der(0x30, rsa_oid + der(0x03, b"\x00" + der(0x30, der_int(n) + der_int(e))))
+    name = der(0x30, b"")
+    validity = der(0x30, der(0x17, b"240101000000Z") + der(0x17, b"440101000000Z"))
+    tbs = der(
+        0x30,
+        der(0xA0, der_int(2)) + der_int(1) + sig_alg + name + validity + name + spki,
+    )
+    return der(0x30, tbs + sig_alg + der(0x03, b"\x00"))
+
+
+def rsa_sign(data):
+    size = (N.bit_length() + 7) // 8
+    info = DIGEST_INFO_PREFIXES["sha256"] + hashlib.sha256(data).digest()
+    encoded = b"\x00\x01" + b"\xff" * (size - len(info) - 3) + b"\x00" + info
+    return pow(int.from_bytes(encoded, "big"), D, N).to_bytes(size, "big")
+
+
+def signed_document(key_info=None, subject="http://example.com/"):
+    unsigned = BODY.format(ds=DS, signature="")
+    digest = hashlib.sha256(exc_c14n(parseString(unsigned).documentElement)).digest()
+    signed_info = SIGNED_INFO.format(ds=DS, digest=b64(digest))
+    signature_value = rsa_sign(exc_c14n(parseString(signed_info).documentElement))
+    if key_info is None:
+        key_info = (
+            "<ds:KeyValue><ds:RSAKeyValue>"
+            f"<ds:Modulus>{b64(int_bytes(N))}</ds:Modulus>"
+            f"<ds:Exponent>{b64(int_bytes(E))}</ds:Exponent>"
+            "</ds:RSAKeyValue></ds:KeyValue>"
+        )
+    signature = (
+        "<ds:Signature>"
+        + signed_info.replace(f' xmlns:ds="{DS}"', "")
+        + f"<ds:SignatureValue>{b64(signature_value)}</ds:SignatureValue>"
+        + f"<ds:KeyInfo>{key_info}</ds:KeyInfo>"
+        + "</ds:Signature>"
+    )
+    content = BODY.format(ds=DS, signature=signature)
+    return content.replace("http://example.com/</Subject>", f"{subject}</Subject>")
+
+
+def test_exc_c14n():
+    content = """<a:root xmlns:a="http://a" xmlns:b="http://b" z="1" a:y="2">
+        <child>x &amp; y</child><!-- comment --></a:root>"""
+    c14n = exc_c14n(parseString(content).documentElement)
+    assert c14n == (
+        b'<a:root xmlns:a="http://a" z="1" a:y="2">\n'
+        b"        <child>x &amp; y</child></a:root>"
+    )
+
+
+def test_parse_signature():
+    xrd = parse_xml(signed_document())
+    assert xrd.subject == "http://example.com/"
+    assert len(xrd.links) == 1
+    assert xrd.signature is not None
+    assert xrd.signature.key_value == (N, E)
+    assert b"Signature" not in xrd.signature.signed_content
+
+
+def test_unsupported_reference():
+    with pytest.raises(SignatureError):
+        parse_xml(signed_document().replace('URI=""', 'URI="#other"'))
+    # a bare fragment must not match a document without an xml:id
+    with pytest.raises(SignatureError):
+        parse_xml(signed_document().replace('URI=""', 'URI="#"'))
+
+
+def test_unsigned():
+    xrd = parse_xml(BODY.format(ds=DS, signature=""))
+    assert xrd.signature is None
+    with pytest.raises(SignatureError):
+        verify(xrd, key=KEY)
+
+
+def test_verify_key():
+    assert verify(parse_xml(signed_document()), key=KEY)
+    assert not verify(parse_xml(signed_document()), key=RSAPublicKey(N - 2, E))
+
+
+def test_embedded_key_is_not_trusted():
+    xrd = parse_xml(signed_document())
+    assert xrd.signature.key_value == KEY
+    with pytest.raises(SignatureError):
+        verify(xrd)
+
+
+def test_verify_certificate():
+    cert = make_certificate()
+    key_info = (
+        f"<ds:X509Data><ds:X509Certificate>{b64(cert)}</ds:X509Certificate>"
+        "</ds:X509Data>"
+    )
+    xrd = parse_xml(signed_document(key_info=key_info))
+    assert xrd.signature.certificates == [cert]
+    assert verify(xrd, certificate=cert)
+    assert not verify(xrd, certificate=make_certificate(n=N - 2))
+    with pytest.raises(SignatureError):
+        verify(xrd)
+    assert load_certificate_key(cert) is load_certificate_key(cert)
+
+
+def test_rsa_verify_rejects_unreduced_signature():
+    xrd = parse_xml(signed_document())
+    value = xrd.signature.signature_value
+    assert rsa_verify(KEY, value, xrd.signature.signed_info, "sha256")
+    # s + n is congruent to s but is not a valid signature representative
+    unreduced = (int.from_bytes(value, "big") + N).to_bytes(len(value), "big")
+    assert not rsa_verify(KEY, unreduced, xrd.signature.signed_info, "sha256")
+
+
+def test_verify_tampered():
+    xrd = parse_xml(signed_document(subject="http://evil.example.com/"))
+    assert not verify(xrd, key=KEY)
+
+
+def test_verify_many():
+    xrds = [
+        parse_xml(signed_document()),
+        parse_xml(signed_document(subject="http://evil.example.com/")),
+        parse_xml(signed_document()),
+    ]
+    assert verify_many(xrds, key=KEY, max_workers=2) == [True, False, True]
+
+
+def test_xmlsec_rsa():
+    xrd = parse_xml(XMLSEC_RSA)
+    (cert,) = xrd.signature.certificates
+    assert verify(xrd, certificate=cert)
+    tampered = parse_xml(XMLSEC_RSA.replace("acct:bob@", "acct:eve@"))
+    assert not verify(tampered, certificate=cert)
+
+
+def test_xmlsec_ecdsa():
+    xrd = parse_xml(XMLSEC_ECDSA)
+    (cert,) = xrd.signature.certificates
+    try:
+        import cryptography  # noqa: F401
+    except ImportError:
+        with pytest.raises(SignatureError):
+            verify(xrd, certificate=cert)
+        return
+    assert verify(xrd, certificate=cert)
+    tampered = parse_xml(XMLSEC_ECDSA.replace("acct:bob@", "acct:eve@"))
+    assert not verify(tampered, certificate=cert)
+    with pytest.raises(SignatureError):
+        verify(xrd, key=KEY)  # an RSA key cannot check an ECDSA signature
+
+
+def test_ecdsa_key():
+    crypto = pytest.importorskip("cryptography.hazmat.primitives.asymmetric.ec")
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature
+
+    private_key = crypto.generate_private_key(crypto.SECP256R1())
+    signed = parse_xml(signed_document())
+    signature = signed.signature
+    r, s = decode_dss_signature(
+        private_key.sign(signature.signed_info, crypto.ECDSA(hashes.SHA256()))
+    )
+    signature.signature_method = "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256"
+    signature.signature_value = r.to_bytes(32, "big") + s.to_bytes(32, "big")
+    assert verify(signed, key=private_key.public_key())
+    other = crypto.generate_private_key(crypto.SECP256R1()).public_key()
+    assert not verify(signed, key=other)
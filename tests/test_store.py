@@ -0,0 +1,96 @@
+import pytest
+
+from xrd import (
+    XRD,
+    Link,
+    XRDStore,
+    to_binary,
+    write_store,
+)
+
+
+def corpus(size=100):
+    for i in range(size):
+        yield XRD(
+            subject=f"acct:user{i}@example.com",
+            aliases=[f"https://example.com/user{i}"],
+            links=[
+                Link(rel="self", href=f"https://example.com/users/{i}"),
+                Link(rel="lrdd", template=f"https://example.com/lrdd/{i}?uri={{uri}}"),
+            ],
+        )
+
+
+@pytest.fixture
+def store(tmp_path):
+    path = str(tmp_path / "corpus.xrds")
+    write_store(path, corpus())
+    with XRDStore(path) as store:
+        yield store
+
+
+def test_store_get(store):
+    assert len(store) == 100
+    assert store.get("acct:user42@example.com") == list(corpus())[42]
+    assert store["https://example.com/user7"].subject == "acct:user7@example.com"
+    assert store.get("acct:nobody@example.com") is None
+    with pytest.raises(KeyError):
+        store["acct:nobody@example.com"]
+
+
+def test_store_contains(store):
+    assert "acct:user0@example.com" in store
+    assert "https://example.com/user99" in store
+    assert "https://example.com/user100" not in store
+
+
+def test_store_iter(store):
+    assert list(store) == list(corpus())
+
+
+def test_store_record_is_a_view(store):
+    record = store.record(42)
+    assert isinstance(record, memoryview)
+    assert record.obj is store.mmap
+    assert record == to_binary(list(corpus())[42])
+    record.release()
+
+
+def test_store_find_link(store):
+    link = store.find_link("acct:user3@example.com", "self")
+    assert link == Link(rel="self", href="https://example.com/users/3")
+    assert (
+        store.find_link("acct:user3@example.com", ["lrdd"], attr="template")
+        == "https://example.com/lrdd/3?uri={uri}"
+    )
+    assert store.find_link("acct:user3@example.com", "avatar") is None
+    assert store.find_link("acct:nobody@example.com", "self") is None
+
+
+def test_store_duplicate_keys(tmp_path):
+    path = str(tmp_path / "corpus.xrds")
+    write_store(
+        path,
+        [
+            XRD(subject="acct:a@example.com", aliases=["shared"]),
+            XRD(subject="acct:b@example.com", aliases=["shared"]),
+        ],
+    )
+    with XRDStore(path) as store:
+        assert store["shared"].subject == "acct:a@example.com"
+        assert store["acct:b@example.com"].subject == "acct:b@example.com"
+
+
+def test_store_empty(tmp_path):
+    path = str(tmp_path / "empty.xrds")
+    write_store(path, [])
+    with XRDStore(path) as store:
+        assert len(store) == 0
+        assert store.get("acct:someone@example.com") is None
+
+
+def test_store_invalid(tmp_path):
+    path = tmp_path / "invalid.xrds"
+    path.write_bytes(b"\x00" * 64)
+    with pytest.raises(ValueError):
+        XRDStore(str(path))
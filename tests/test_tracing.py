@@ -0,0 +1,164 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from xrd import (
+    XRD,
+    Link,
+    SpanCollector,
+    XRDFetcher,
+    XRDIndex,
+    disable_tracing,
+    discover,
+    enable_tracing,
+    expand_template,
+    parse_json,
+)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        host = self.headers["Host"]
+        if self.path == "/.well-known/host-meta":
+            body = (
+                '<?xml version="1.0" ?>'
+                '<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">'
+                f'<Link rel="lrdd" template="http://{host}/webfinger?resource={{uri}}"/>'
+                "</XRD>"
+            ).encode()
+            content_type = "application/xrd+xml"
+        else:
+            body = b'{"subject": "acct:bob@example.com", "links": [{"rel": "self"}]}'
+            content_type = "application/jrd+json"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.host = f"127.0.0.1:{server.server_address[1]}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def collector():
+    collector = enable_tracing(SpanCollector())
+    yield collector
+    disable_tracing()
+
+
+def test_enable_tracing():
+    try:
+        import opentelemetry  # noqa: F401
+    except ImportError:
+        assert isinstance(enable_tracing(), SpanCollector)
+    disable_tracing()
+
+
+def test_discover(server, collector):
+    with XRDFetcher() as fetcher:
+        xrd = discover(f"acct:bob@{server.host}", fetcher=fetcher, scheme="http")
+        assert xrd.find_link("self") is not None
+
+    (root, find_link) = collector.children(None)
+    assert root.name == "xrd.discover"
+    assert find_link.name == "xrd.find_link"
+    assert [span.name for span in collector.children(root)] == [
+        "xrd.fetch",
+        "xrd.find_link",
+        "xrd.template.expand",
+        "xrd.fetch",
+    ]
+    host_meta, _, expand, webfinger = collector.children(root)
+    assert (
+        host_meta.attributes["xrd.url"] == f"http://{server.host}/.well-known/host-meta"
+    )
+    assert host_meta.attributes["xrd.cached"] is False
+    assert webfinger.attributes["xrd.url"].endswith(
+        f"/webfinger?resource=acct%3Abob%40127.0.0.1%3A{server.server_address[1]}"
+    )
+    assert [span.name for span in collector.children(webfinger)] == [
+        "xrd.parse",
+        "xrd.validate",
+    ]
+    parse, validate = collector.children(webfinger)
+    assert parse.attributes == {"xrd.format": "json", "xrd.size": 63, "xrd.links": 1}
+    assert validate.attributes == {"xrd.links": 1}
+    assert all(span.duration >= 0 for span in collector.spans)
+    assert set(collector.summary()) == {
+        "xrd.discover",
+        "xrd.fetch",
+        "xrd.parse",
+        "xrd.validate",
+        "xrd.find_link",
+        "xrd.template.expand",
+    }
+    assert collector.format().splitlines()[0].startswith("xrd.discover ")
+
+
+def test_fetch_many_spans(server, collector):
+    tracer_span = collector.start_as_current_span("request")
+    with tracer_span, XRDFetcher() as fetcher:
+        fetcher.fetch_many([f"http://{server.host}/a", f"http://{server.host}/b"])
+    assert [span.name for span in collector.children(tracer_span)] == [
+        "xrd.fetch",
+        "xrd.fetch",
+    ]
+
+
+def test_index_and_errors(collector):
+    index = XRDIndex([XRD(subject="acct:bob@example.com", links=[Link(rel="self")])])
+    index.get("bob@Example.com")
+    index.get("acct:alice@example.com")
+    with pytest.raises(ValueError):
+        parse_json("{")
+    found, missing, error = collector.spans
+    assert found.attributes["xrd.found"] is True
+    assert missing.attributes["xrd.found"] is False
+    assert error.attributes["exception.type"] == "JSONDecodeError"
+    assert collector.summary()["xrd.index.get"][0] == 2
+
+
+def test_disabled(collector):
+    disable_tracing()
+    XRDIndex().get("acct:bob@example.com")
+    assert expand_template("https://example.com/?uri={uri}", "acct:a@b") == (
+        "https://example.com/?uri=acct%3Aa%40b"
+    )
+    assert not collector.spans
+
+
+def test_opentelemetry():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+        InMemorySpanExporter,
+    )
+
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    enable_tracing(provider.get_tracer("xrd"))
+    try:
+        parse_json('{"subject": "acct:bob@example.com"}').find_link("self")
+    finally:
+        disable_tracing()
+    assert [span.name for span in exporter.get_finished_spans()] == [
+        "xrd.parse",
+        "xrd.find_link",
+    ]
@@ -0,0 +1,85 @@
+import pytest
+
+from xrd import (
+    XRD,
+    Link,
+    Title,
+    render_json,
+    render_xml,
+    to_binary,
+    validate_many,
+    validation_errors,
+)
+
+
+def paths(xrd):
+    return [error.path for error in validation_errors(xrd)]
+
+
+def test_valid():
+    xrd = XRD(
+        xml_id="doc1",
+        subject="acct:someone@example.com",
+        aliases=["https://example.com/someone"],
+        properties={
+            "http://example.com/ns/nil": None,
+            "http://example.com/ns/m": ["a", "b"],
+        },
+        links=[
+            Link(rel="author", type="text/html", href="https://example.com/"),
+            Link(
+                rel="http://webfinger.net/rel/avatar",
+                template="https://example.com/avatar?uri={uri}",
+                titles=[Title("Avatar"), Title("Avatar", lang="en-US")],
+            ),
+        ],
+    )
+    assert validation_errors(xrd) == []
+
+
+def test_all_errors_reported():
+    xrd = XRD(
+        xml_id="1 2",
+        subject="not a uri",
+        aliases=[""],
+        properties={"mimetype": 1},
+        links=[
+            Link(
+                rel="Not A Rel", type="html", href="https://example.com/", template="x"
+            ),
+            Link(
+                titles=[Title(None, lang="en_US")], properties={"http://x/y": [None, 2]}
+            ),
+        ],
+    )
+    assert paths(xrd) == [
+        "xml_id",
+        "subject",
+        "aliases[0]",
+        "properties['mimetype']",
+        "properties['mimetype']",
+        "links[0].rel",
+        "links[0].type",
+        "links[0].template",
+        "links[0]",
+        "links[1].titles[0].value",
+        "links[1].titles[0].lang",
+        "links[1].properties['http://x/y']",
+    ]
+    assert str(validation_errors(xrd)[1]) == "subject: must be a URI"
+
+
+def test_validate_many():
+    xrds = [XRD(), XRD(subject="bad uri"), XRD(subject="acct:a@example.com")]
+    results = validate_many(xrds)
+    assert list(results) == [1]
+    assert results[1][0].path == "subject"
+
+
+def test_renderers_check_validated_xrds():
+    xrd = XRD(links=[Link(href="https://example.com/")])
+    xrd.validate()
+    xrd.links[0].template = "https://example.com/{uri}"
+    for render in (render_json, render_xml, to_binary):
+        with pytest.raises(ValueError):
+            render(xrd)
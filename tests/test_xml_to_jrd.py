@@ -1,6 +1,8 @@
 import json
 
-from xrd import XRD, parse_xml
+import pytest
+
+from xrd import XRD, jrd_to_xml, parse_json, parse_xml, xml_to_jrd
 
 """
 Taken from examples in RFC 6415 https://datatracker.ietf.org/doc/rfc6415/
@@ -81,3 +83,84 @@ def test_xml_to_jrd_conversion():
     parsed_data = json.loads(xrd.as_json())
     example_data = json.loads(JRD_DOC)
     assert parsed_data == example_data
+
+
+def test_xml_to_jrd_transcoder():
+    assert xml_to_jrd(XML_DOC) == parse_xml(XML_DOC).as_json()
+    assert json.loads(xml_to_jrd(XML_DOC)) == json.loads(JRD_DOC)
+
+
+def test_xml_to_jrd_node_text():
+    doc = """<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+        <Subject> a<b> b </b><![CDATA[ignored]]> </Subject>
+        <Unknown><Alias>not an alias</Alias></Unknown>
+        <Alias />
+    </XRD>"""
+    assert xml_to_jrd(doc) == parse_xml(doc).as_json()
+    assert json.loads(xml_to_jrd(doc)) == {"aliases": [None], "subject": "ab"}
+
+
+def test_xml_to_jrd_skips_signature():
+    doc = """<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+        <Subject>http://example.com/</Subject>
+        <ds:Signature xmlns:ds="http://www.w3.org/2000/09/xmldsig#">
+            <Subject>http://example.com/signature</Subject>
+        </ds:Signature>
+    </XRD>"""
+    assert json.loads(xml_to_jrd(doc)) == {"subject": "http://example.com/"}
+
+
+def test_xml_to_jrd_validates_links():
+    doc = """<XRD xmlns="http://docs.oasis-open.org/ns/xri/xrd-1.0">
+        <Link rel="self" href="http://example.com/" template="http://example.com/{uri}" />
+    </XRD>"""
+    with pytest.raises(ValueError):
+        xml_to_jrd(doc)
+
+
+def test_jrd_to_xml_transcoder():
+    assert jrd_to_xml(JRD_DOC) == parse_json(JRD_DOC).as_xml().toxml()
+
+
+def test_jrd_to_xml_escaping():
+    doc = json.dumps(
+        {
+            "subject": "http://example.com/?a=1&b=<2>",
+            "properties": {"http://example.com/p": ["first", "last"]},
+            "links": [{"rel": "self", "href": 'http://example.com/?q="x"&y'}],
+        }
+    )
+    assert parse_xml(jrd_to_xml(doc)) == parse_json(doc)
+
+
+def test_jrd_to_xml_matches_minidom():
+    doc = json.dumps(
+        {
+            "subject": 'http://example.com/"quoted"\t> ',
+            "aliases": ["a\r\nb"],
+            "links": [
+                {
+                    "rel": "self",
+                    "href": 'http://example.com/?q="x"\t&y>z',
+                    "titles": {"en\t": 'say "hi"'},
+                }
+            ],
+        }
+    )
+    assert jrd_to_xml(doc) == parse_json(doc).as_xml().toxml()
+
+
+def test_jrd_to_xml_declares_xsi_for_link_properties():
+    doc = '{"links": [{"rel": "x", "href": "h", "properties": {"p": null}}]}'
+    content = jrd_to_xml(doc)
+    assert content == parse_json(doc).as_xml().toxml()
+    assert parse_xml(content).links[0].properties.is_nil("p")
+
+
+def test_jrd_to_xml_validates_links():
+    doc = (
+        '{"links": [{"href": "http://example.com/", '
+        '"template": "http://example.com/{uri}"}]}'
+    )
+    with pytest.raises(ValueError):
+        jrd_to_xml(doc)
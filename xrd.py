@@ -1,15 +1,44 @@
+from __future__ import annotations
+
+import functools
+import heapq
+import importlib
+import io
 import logging
-import json
-from datetime import datetime
+import os
+import re
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from datetime import datetime, timezone
 from dataclasses import dataclass, field
-from typing import Any, Iterable, List, Mapping, Optional, Union, cast
-from xml.dom.minidom import (
-    getDOMImplementation,
-    parseString,
-    Document,
-    DOMImplementation,
-    Node,
+from itertools import compress, islice
+from types import ModuleType, SimpleNamespace
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Union,
+    cast,
 )
+from urllib.parse import parse_qs, quote, urljoin, urlsplit, urlunsplit
+
+if TYPE_CHECKING:
+    import contextvars
+    import pstats
+    from xml.dom.minidom import Document, DOMImplementation, Element, Node
+else:
+    from xml.dom import Node
 
 """
 XRD: http://docs.oasis-open.org/xri/xrd/v1.0/xrd-1.0.html
@@ -19,10 +48,25 @@ JRD: https://datatracker.ietf.org/doc/rfc6415/
 __version__ = "1.0.0"
 
 XRD_NAMESPACE = "http://docs.oasis-open.org/ns/xri/xrd-1.0"
+DSIG_NAMESPACE = "http://www.w3.org/2000/09/xmldsig#"
+XSI_NAMESPACE = "http://www.w3.org/2001/XMLSchema-instance"
+
+XML_NAMESPACE = "http://www.w3.org/XML/1998/namespace"
+
 
 logger = logging.getLogger(__name__)
 
 
+@functools.lru_cache(maxsize=None)
+def lazy_import(name: str) -> ModuleType:
+    """Import a module on first use.
+    json, hashlib, the XML parsers and the modules used for fetching, the
+    command line, profiling and archives are imported by the functions that
+    need them, so that processes only pay for what they use.
+    """
+    return importlib.import_module(name)
+
+
 #
 # Utility methods
 #
@@ -64,6 +108,29 @@ def strip_dict(d: Mapping) -> dict:
     return {key: value for key, value in d.items() if not is_empty(value)}
 
 
+def sorted_items(d: Mapping, canonical: bool) -> Iterable:
+    """Return the items of a dict, sorted by key if canonical is True."""
+    return sorted(d.items()) if canonical else d.items()
+
+
+class HashWriter:
+    """File-like object that feeds written text into a hash instead of storing it.
+    Allows a digest to be computed while rendering, without building the output.
+    """
+
+    def __init__(self, algorithm: str = "sha256"):
+        hashlib = lazy_import("hashlib")
+
+        self.hash = hashlib.new(algorithm)
+
+    def write(self, text: str) -> int:
+        self.hash.update(text.encode("utf-8"))
+        return len(text)
+
+    def hexdigest(self) -> str:
+        return self.hash.hexdigest()
+
+
 def parse_isodatetime(datetime_str: str) -> datetime:
     return datetime.fromisoformat(datetime_str.replace("Z", "+00:00"))
 
@@ -77,6 +144,124 @@ def str_isodatetime(dt: datetime) -> str:
 #
 
 
+class Properties(dict):
+    """Multimap of property types to values, in the order they were added.
+    None values are nil properties.
+
+    Each type keeps a list of its values: add() appends to it in constant time,
+    and renderers iterate the lists without checking each value. As a dict, a
+    type maps to its values as given, a single value or a list of them; a list
+    given is the one add() appends to. Once a type has several values, it maps
+    to its list of values.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._lists: dict[str, List[Optional[str]]] = {}
+        if args or kwargs:
+            self.update(*args, **kwargs)
+
+    def __setitem__(self, key: str, value):
+        super().__setitem__(key, value)
+        if isinstance(value, list):
+            self._lists[key] = value
+        else:
+            self._lists[key] = list(value) if isinstance(value, tuple) else [value]
+
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        del self._lists[key]
+
+    def __or__(self, other: Any) -> "Properties":
+        result = Properties(self)
+        result.update(other)
+        return result
+
+    def __ior__(self, other: Any) -> "Properties":
+        self.update(other)
+        return self
+
+    def __reduce__(self):
+        return (Properties, (dict(self),))
+
+    def __repr__(self) -> str:
+        return f"Properties({dict.__repr__(self)})"
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key: str, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        del self._lists[key]
+        return super().pop(key)
+
+    def popitem(self) -> tuple[str, Any]:
+        key, value = super().popitem()
+        del self._lists[key]
+        return key, value
+
+    def clear(self):
+        super().clear()
+        self._lists.clear()
+
+    def copy(self) -> "Properties":
+        """Return a copy that shares no lists of values with this one."""
+        return Properties(
+            (key, list(value) if isinstance(value, list) else value)
+            for key, value in self.items()
+        )
+
+    def add(self, key: str, value: Optional[str]):
+        """Add a value, keeping any existing values of the same type."""
+        values = self._lists.get(key)
+        if values is None:
+            self[key] = value
+            return
+        values.append(value)
+        if self[key] is not values:
+            super().__setitem__(key, values)
+
+    def all(self, key: str) -> List[Optional[str]]:
+        """Return a list of every value of a property type, or an empty list."""
+        return list(self._lists.get(key, ()))
+
+    def last(self, key: str, default: Optional[str] = None) -> Optional[str]:
+        """Return the last value of a property type, as JRD does."""
+        values = self._lists.get(key)
+        return values[-1] if values else default
+
+    def is_nil(self, key: str) -> bool:
+        """Return True if the last value of a property type is nil."""
+        values = self._lists.get(key)
+        return values[-1] is None if values else False
+
+
+def property_items(properties: Mapping, canonical: bool = False) -> Iterable[tuple]:
+    """Return the (type, values) pairs of properties, with a list of values
+    for each type. Sorted by type if canonical is True.
+    """
+    if not isinstance(properties, Properties):
+        properties = Properties(properties)
+    return sorted_items(properties._lists, canonical)
+
+
+def properties_key(properties: Mapping) -> frozenset:
+    """Hashable form of properties. As in dict equality, the order of property
+    types is not significant; the order of the values of one type is.
+    """
+    return frozenset(
+        (type_, tuple(value) if isinstance(value, list) else value)
+        for type_, value in properties.items()
+    )
+
+
 @dataclass
 class Title:
     value: str
@@ -90,7 +275,48 @@ class Link:
     href: str = ""
     template: str = ""
     titles: List[Title] = field(default_factory=list)
-    properties: dict[str, Optional[Union[str, List[str]]]] = field(default_factory=dict)
+    properties: Properties = field(default_factory=Properties)
+
+    def __post_init__(self):
+        if not isinstance(self.properties, Properties):
+            self.properties = Properties(self.properties)
+
+    def structural_key(self) -> tuple:
+        """Hashable snapshot of the link's value, equal for equal links."""
+        return (
+            self.rel,
+            self.type,
+            self.href,
+            self.template,
+            tuple((title.value, title.lang) for title in self.titles),
+            properties_key(self.properties),
+        )
+
+
+def check_link(link: Link):
+    """Check the constraints required to render a link."""
+    if link.href and link.template:
+        raise ValueError(
+            f"only one of href or template attributes may be specified on a link: {link}"
+        )
+
+
+def first_link(
+    links: List[Link], rels: Iterable[str], attr: Optional[str] = None
+) -> Optional[Union[Link, str, Iterable, Mapping]]:
+    for link in links:
+        if link.rel in rels:
+            if attr:
+                return getattr(link, attr, None)
+            return link
+    return None
+
+
+class Prerendered(NamedTuple):
+    """JRD and XML of an XRD, as rendered by XRDBuilder.prerendered()."""
+
+    jrd: PrerenderedJRD
+    xml: str
 
 
 @dataclass
@@ -99,11 +325,31 @@ class XRD:
     expires: Optional[datetime] = None
     subject: str = ""
     aliases: List[str] = field(default_factory=list)
-    properties: dict[str, Optional[Union[str, Iterable[str]]]] = field(
-        default_factory=dict
-    )
+    properties: Properties = field(default_factory=Properties)
     links: List[Link] = field(default_factory=list)
     attributes: dict[str, str] = field(default_factory=dict)
+    signature: Optional["Signature"] = None
+
+    def __post_init__(self):
+        if not isinstance(self.properties, Properties):
+            self.properties = Properties(self.properties)
+
+    def structural_key(self) -> tuple:
+        """Hashable snapshot of the XRD's value, equal for equal XRDs.
+        The order of property types does not matter, link order does.
+        A signature is identified by what was signed and the signature value.
+        """
+        signature = self.signature
+        return (
+            self.xml_id,
+            self.expires,
+            self.subject,
+            tuple(self.aliases),
+            properties_key(self.properties),
+            tuple(link.structural_key() for link in self.links),
+            frozenset(self.attributes.items()),
+            signature and (signature.signed_info, signature.signature_value),
+        )
 
     @classmethod
     def parse_xrd(cls, content: str) -> "XRD":
@@ -120,12 +366,15 @@ class XRD:
         If multiple relations are given, returns the first item that matches any of the relations.
         """
         rels = ensure_iterable(rels)
-        for link in self.links:
-            if link.rel in rels:
-                if attr:
-                    return getattr(link, attr, None)
-                return link
-        return None
+        if TRACER is None:
+            return first_link(self.links, rels, attr)
+        with TRACER.start_as_current_span(
+            "xrd.find_link",
+            attributes={"xrd.rels": list(rels), "xrd.links": len(self.links)},
+        ) as span:
+            result = first_link(self.links, rels, attr)
+            span.set_attribute("xrd.found", result is not None)
+            return result
 
     def as_json(self) -> str:
         return render_json(self)
@@ -133,18 +382,424 @@ class XRD:
     def as_xml(self) -> Document:
         return render_xml(self)
 
+    def digest(self, format: str = "json", algorithm: str = "sha256") -> str:
+        """Return a hex digest of the canonical serialization of the XRD.
+        Logically identical documents have the same digest regardless of the
+        order in which attributes and properties were added.
+        """
+        writer = HashWriter(algorithm)
+        if format == "json":
+            write_json(self, writer, canonical=True)
+        elif format == "xml":
+            write_xml_c14n(self, writer)
+        else:
+            raise ValueError(f"unknown format: {format}")
+        return writer.hexdigest()
+
     def validate(self):
-        for link in self.links:
-            if link.href and link.template:
-                raise ValueError(
-                    f"only one of href or template attributes may be specified on a link: {link}"
+        """Check the constraints required to render the XRD; renderers make
+        the same check as they render.
+        Use validation_errors() for a full check of the document.
+        """
+        if TRACER is None:
+            for link in self.links:
+                check_link(link)
+        else:
+            with TRACER.start_as_current_span(
+                "xrd.validate", attributes={"xrd.links": len(self.links)}
+            ):
+                for link in self.links:
+                    check_link(link)
+
+
+# XRD Signature
+
+
+C14N_EXCLUSIVE = "http://www.w3.org/2001/10/xml-exc-c14n#"
+TRANSFORM_ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+
+DIGEST_METHODS = {
+    "http://www.w3.org/2000/09/xmldsig#sha1": "sha1",
+    "http://www.w3.org/2001/04/xmlenc#sha256": "sha256",
+    "http://www.w3.org/2001/04/xmldsig-more#sha384": "sha384",
+    "http://www.w3.org/2001/04/xmlenc#sha512": "sha512",
+}
+
+SIGNATURE_METHODS = {
+    "http://www.w3.org/2000/09/xmldsig#rsa-sha1": ("rsa", "sha1"),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha256": ("rsa", "sha256"),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha384": ("rsa", "sha384"),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha512": ("rsa", "sha512"),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256": ("ecdsa", "sha256"),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha384": ("ecdsa", "sha384"),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha512": ("ecdsa", "sha512"),
+}
+
+# ASN.1 DigestInfo prefixes for EMSA-PKCS1-v1_5 (RFC 8017, section 9.2)
+DIGEST_INFO_PREFIXES = {
+    "sha1": bytes.fromhex("3021300906052b0e03021a05000414"),
+    "sha256": bytes.fromhex("3031300d060960864801650304020105000420"),
+    "sha384": bytes.fromhex("3041300d060960864801650304020205000430"),
+    "sha512": bytes.fromhex("3051300d060960864801650304020305000440"),
+}
+
+OID_RSA_ENCRYPTION = bytes.fromhex("2a864886f70d010101")
+
+
+class SignatureError(ValueError):
+    pass
+
+
+class RSAPublicKey(NamedTuple):
+    n: int
+    e: int
+
+
+@dataclass
+class Signature:
+    """An enveloped XML Signature captured while parsing an XRD document.
+    signed_info and signed_content hold the canonicalized bytes that
+    were signed and digested.
+    """
+
+    signed_info: bytes
+    signed_content: bytes
+    canonicalization_method: str = ""
+    signature_method: str = ""
+    transforms: List[str] = field(default_factory=list)
+    digest_method: str = ""
+    digest_value: bytes = b""
+    signature_value: bytes = b""
+    certificates: List[bytes] = field(default_factory=list)
+    key_value: Optional[RSAPublicKey] = None
+
+
+def escape_c14n_text(value: str) -> str:
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace("\r", "&#xD;")
+    )
+
+
+def escape_c14n_attr(value: str) -> str:
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace('"', "&quot;")
+        .replace("\t", "&#x9;")
+        .replace("\n", "&#xA;")
+        .replace("\r", "&#xD;")
+    )
+
+
+def exc_c14n(root: Node, exclude: Optional[Node] = None) -> bytes:
+    """Exclusive XML Canonicalization 1.0, without comments, of a DOM element.
+    The exclude node and its descendants are omitted (enveloped signature transform).
+    """
+    parts: List[str] = []
+
+    def render(node, rendered):
+        if node is exclude:
+            return
+        if node.nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE):
+            parts.append(escape_c14n_text(node.data))
+        elif node.nodeType == Node.PROCESSING_INSTRUCTION_NODE:
+            data = f" {node.data}" if node.data else ""
+            parts.append(f"<?{node.target}{data}?>")
+        elif node.nodeType == Node.ELEMENT_NODE:
+            utilized = {node.prefix or "": node.namespaceURI or ""}
+            attrs = []
+            for attr in node.attributes.values():
+                if attr.name == "xmlns" or attr.name.startswith("xmlns:"):
+                    continue
+                if attr.prefix and attr.prefix != "xml":
+                    utilized[attr.prefix] = attr.namespaceURI or ""
+                attrs.append(attr)
+            scope = dict(rendered)
+            decls = []
+            for prefix, uri in sorted(utilized.items()):
+                if rendered.get(prefix, "") != uri:
+                    decls.append(f"xmlns:{prefix}" if prefix else "xmlns")
+                    decls[-1] += f'="{escape_c14n_attr(uri)}"'
+                    scope[prefix] = uri
+            attrs.sort(key=lambda a: (a.namespaceURI or "", a.localName or a.name))
+            parts.append("<" + node.tagName)
+            for decl in decls:
+                parts.append(" " + decl)
+            for attr in attrs:
+                parts.append(f' {attr.name}="{escape_c14n_attr(attr.value)}"')
+            parts.append(">")
+            for child in node.childNodes:
+                render(child, scope)
+            parts.append(f"</{node.tagName}>")
+
+    render(root, {})
+    return "".join(parts).encode("utf-8")
+
+
+def dsig_children(node: Node, name: str) -> List[Element]:
+    return [
+        cast("Element", child)
+        for child in node.childNodes
+        if child.nodeType == Node.ELEMENT_NODE
+        and child.namespaceURI == DSIG_NAMESPACE
+        and child.localName == name
+    ]
+
+
+def dsig_child(node: Node, name: str) -> Element:
+    children = dsig_children(node, name)
+    if not children:
+        raise SignatureError(f"missing ds:{name} in ds:{node.localName}")
+    return children[0]
+
+
+def decode_base64_text(node: Node) -> bytes:
+    base64 = lazy_import("base64")
+
+    return base64.b64decode("".join((node_text(node) or "").split()))
+
+
+def parse_signature(node: Element, root: Element) -> Signature:
+    """Capture the canonicalized bytes and values of an enveloped ds:Signature."""
+    signed_info = dsig_child(node, "SignedInfo")
+    reference = dsig_child(signed_info, "Reference")
+
+    uri = reference.getAttribute("URI")
+    xml_id = root.getAttribute("xml:id")
+    if uri != "" and not (xml_id and uri == "#" + xml_id):
+        raise SignatureError(f"unsupported signature reference: {uri}")
+
+    signature = Signature(
+        signed_info=exc_c14n(signed_info),
+        signed_content=exc_c14n(root, exclude=node),
+        canonicalization_method=dsig_child(
+            signed_info, "CanonicalizationMethod"
+        ).getAttribute("Algorithm"),
+        signature_method=dsig_child(signed_info, "SignatureMethod").getAttribute(
+            "Algorithm"
+        ),
+        digest_method=dsig_child(reference, "DigestMethod").getAttribute("Algorithm"),
+        digest_value=decode_base64_text(dsig_child(reference, "DigestValue")),
+        signature_value=decode_base64_text(dsig_child(node, "SignatureValue")),
+    )
+
+    for transforms in dsig_children(reference, "Transforms"):
+        for transform in dsig_children(transforms, "Transform"):
+            signature.transforms.append(transform.getAttribute("Algorithm"))
+
+    for key_info in dsig_children(node, "KeyInfo"):
+        for x509_data in dsig_children(key_info, "X509Data"):
+            for cert in dsig_children(x509_data, "X509Certificate"):
+                signature.certificates.append(decode_base64_text(cert))
+        for key_value in dsig_children(key_info, "KeyValue"):
+            for rsa in dsig_children(key_value, "RSAKeyValue"):
+                signature.key_value = RSAPublicKey(
+                    int.from_bytes(
+                        decode_base64_text(dsig_child(rsa, "Modulus")), "big"
+                    ),
+                    int.from_bytes(
+                        decode_base64_text(dsig_child(rsa, "Exponent")), "big"
+                    ),
                 )
 
+    return signature
+
+
+def der_items(
+    data: bytes, start: int = 0, end: Optional[int] = None
+) -> List[tuple[int, bytes]]:
+    """Split a DER byte range into a list of (tag, content) tuples."""
+    end = len(data) if end is None else end
+    items = []
+    pos = start
+    while pos < end:
+        tag = data[pos]
+        length = data[pos + 1]
+        pos += 2
+        if length & 0x80:
+            size = length & 0x7F
+            length = int.from_bytes(data[pos : pos + size], "big")
+            pos += size
+        items.append((tag, data[pos : pos + length]))
+        pos += length
+    return items
+
+
+def rsa_key_from_certificate(der: bytes) -> RSAPublicKey:
+    """Extract the RSA public key from a DER encoded X.509 certificate."""
+    try:
+        ((_, cert),) = der_items(der)
+        tbs = der_items(der_items(cert)[0][1])
+        if tbs[0][0] == 0xA0:  # explicit version
+            tbs = tbs[1:]
+        algorithm, public_key = der_items(tbs[5][1])
+        oid = der_items(algorithm[1])[0][1]
+    except (IndexError, ValueError) as exc:
+        raise SignatureError("malformed X.509 certificate") from exc
+    if oid != OID_RSA_ENCRYPTION:
+        raise SignatureError(
+            "only RSA certificates are supported without the cryptography package"
+        )
+    ((_, sequence),) = der_items(public_key[1][1:])
+    (_, n), (_, e) = der_items(sequence)
+    return RSAPublicKey(int.from_bytes(n, "big"), int.from_bytes(e, "big"))
+
+
+@functools.lru_cache(maxsize=None)
+def cryptography_modules() -> Optional[SimpleNamespace]:
+    """Import the parts of the cryptography package used to verify signatures,
+    or return None if it is not installed. Imported on first use only.
+    """
+    try:
+        from cryptography import x509
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa, utils
+    except ImportError:  # pragma: no cover
+        return None
+    return SimpleNamespace(
+        x509=x509,
+        InvalidSignature=InvalidSignature,
+        hashes=hashes,
+        ec=ec,
+        padding=padding,
+        rsa=rsa,
+        utils=utils,
+    )
+
+
+@functools.lru_cache(maxsize=128)
+def load_certificate_key(der: bytes) -> Any:
+    """Load the public key of a DER encoded certificate.
+    The most recently used keys are cached by certificate.
+    """
+    crypto = cryptography_modules()
+    if crypto is not None:
+        return crypto.x509.load_der_x509_certificate(der).public_key()
+    return rsa_key_from_certificate(der)
+
+
+def rsa_verify(
+    key: RSAPublicKey, signature: bytes, data: bytes, hash_name: str
+) -> bool:
+    """Verify an RSASSA-PKCS1-v1_5 signature (RFC 8017, section 8.2.2)."""
+    hashlib = lazy_import("hashlib")
+    hmac = lazy_import("hmac")
+
+    size = (key.n.bit_length() + 7) // 8
+    value = int.from_bytes(signature, "big")
+    if len(signature) != size or value >= key.n:
+        return False
+    encoded = pow(value, key.e, key.n).to_bytes(size, "big")
+    info = DIGEST_INFO_PREFIXES[hash_name] + hashlib.new(hash_name, data).digest()
+    expected = b"\x00\x01" + b"\xff" * (size - len(info) - 3) + b"\x00" + info
+    return hmac.compare_digest(encoded, expected)
+
+
+def verify_with_key(key: Any, kind: str, hash_name: str, signature: bytes, data: bytes):
+    crypto = cryptography_modules()
+    if isinstance(key, RSAPublicKey):
+        if kind != "rsa":
+            raise SignatureError(f"{kind} signature requires an {kind} key")
+        if crypto is None:
+            return rsa_verify(key, signature, data, hash_name)
+        key = crypto.rsa.RSAPublicNumbers(key.e, key.n).public_key()
+    if crypto is None:
+        raise SignatureError(f"{kind} signatures require the cryptography package")
+    algorithm = getattr(crypto.hashes, hash_name.upper())()
+    try:
+        if kind == "rsa":
+            key.verify(signature, data, crypto.padding.PKCS1v15(), algorithm)
+        else:
+            # XML-DSig ECDSA signatures are the raw concatenation of r and s
+            half = len(signature) // 2
+            der = crypto.utils.encode_dss_signature(
+                int.from_bytes(signature[:half], "big"),
+                int.from_bytes(signature[half:], "big"),
+            )
+            key.verify(der, data, crypto.ec.ECDSA(algorithm))
+    except (crypto.InvalidSignature, TypeError):
+        return False
+    return True
+
+
+def verify(xrd: "XRD", certificate: Optional[bytes] = None, key: Any = None) -> bool:
+    """Verify the signature of a parsed XRD against a trusted DER encoded
+    certificate or public key (an RSAPublicKey or a cryptography public key).
+    Keys and certificates embedded in the document's KeyInfo are never used,
+    since anyone can sign a document with a key of their own.
+    """
+    signature = xrd.signature
+    if signature is None:
+        raise SignatureError("XRD is not signed")
+    if certificate is None and key is None:
+        raise SignatureError("a trusted certificate or key is required")
+
+    if signature.canonicalization_method != C14N_EXCLUSIVE:
+        raise SignatureError(
+            f"unsupported canonicalization: {signature.canonicalization_method}"
+        )
+    for transform in signature.transforms:
+        if transform not in (TRANSFORM_ENVELOPED, C14N_EXCLUSIVE):
+            raise SignatureError(f"unsupported transform: {transform}")
+    if signature.digest_method not in DIGEST_METHODS:
+        raise SignatureError(f"unsupported digest method: {signature.digest_method}")
+    if signature.signature_method not in SIGNATURE_METHODS:
+        raise SignatureError(
+            f"unsupported signature method: {signature.signature_method}"
+        )
+
+    hashlib = lazy_import("hashlib")
+    hmac = lazy_import("hmac")
+
+    digest = hashlib.new(
+        DIGEST_METHODS[signature.digest_method], signature.signed_content
+    ).digest()
+    if not hmac.compare_digest(digest, signature.digest_value):
+        return False
+
+    if certificate is not None:
+        key = load_certificate_key(certificate)
+
+    kind, hash_name = SIGNATURE_METHODS[signature.signature_method]
+    return verify_with_key(
+        key, kind, hash_name, signature.signature_value, signature.signed_info
+    )
+
+
+def verify_many(
+    xrds: Iterable["XRD"],
+    certificate: Optional[bytes] = None,
+    key: Any = None,
+    max_workers: Optional[int] = None,
+) -> List[bool]:
+    """Verify the signatures of many XRDs against one trusted certificate
+    or key using a thread pool.
+    Results are returned in the same order as the given XRDs.
+    """
+    futures = lazy_import("concurrent.futures")
+
+    with futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda xrd: verify(xrd, certificate, key), xrds))
+
 
 # json parser/renderer
 
 
-def parse_json(content: str) -> XRD:
+def parse_json(content: Union[str, bytes]) -> XRD:
+    json = lazy_import("json")
+
+    if TRACER is not None:
+        return traced_parse("json", content, lambda: xrd_from_jrd(json.loads(content)))
+    return xrd_from_jrd(json.loads(content))
+
+
+def xrd_from_jrd(doc: Mapping) -> XRD:
+    """Build an XRD from a decoded JRD document."""
+
     def expires_handler(key, val, obj):
         obj.expires = parse_isodatetime(val)
 
@@ -190,8 +845,6 @@ def parse_json(content: str) -> XRD:
     def unknown_handler(key, val, obj):
         logger.info(f"Unknown property: {key} = {val}")
 
-    doc = json.loads(content)
-
     xrd = XRD()
     xrd.attributes["xmlns"] = XRD_NAMESPACE
 
@@ -204,9 +857,57 @@ def parse_json(content: str) -> XRD:
     return xrd
 
 
-def render_json(xrd: XRD) -> str:
+def rel_filter(rels: Optional[Union[str, Iterable[str]]]) -> Optional[frozenset]:
+    """Normalize a rels argument. None, or no relations at all, matches every
+    link, as a WebFinger request without rel parameters does.
+    """
+    if rels is None:
+        return None
+    return frozenset(ensure_iterable(rels)) or None
 
-    xrd.validate()
+
+def jrd_link_dict(link: Link, canonical: bool = False) -> dict:
+    """Build the JRD structure of a link as a dict, ready for json encoding."""
+
+    link_doc: dict = {
+        "titles": {},
+        "properties": {},
+    }
+
+    if link.rel:
+        link_doc["rel"] = link.rel
+
+    if link.type:
+        link_doc["type"] = link.type
+
+    if link.href:
+        link_doc["href"] = link.href
+
+    if link.template:
+        link_doc["template"] = link.template
+
+    for type_, values in property_items(link.properties, canonical):
+        if values:
+            link_doc["properties"][type_] = values[-1]
+
+    for title in link.titles:
+        lang = title.lang or "default"
+        link_doc["titles"][lang] = title.value
+
+    return strip_dict(link_doc)
+
+
+def jrd_dict(
+    xrd: XRD,
+    canonical: bool = False,
+    rels: Optional[Union[str, Iterable[str]]] = None,
+) -> dict:
+    """Build the JRD structure of an XRD as a dict, ready for json encoding.
+    If rels is given, only links with one of those relations are included.
+    """
+
+    for link in xrd.links:
+        check_link(link)
 
     doc: dict = {
         "aliases": [],
@@ -225,48 +926,128 @@ def render_json(xrd: XRD) -> str:
     for alias in xrd.aliases:
         doc["aliases"].append(alias)
 
-    for type_, val in xrd.properties.items():
-        if isinstance(val, (list, tuple)):
-            val = val[-1]
-        doc["properties"][type_] = val
+    for type_, values in property_items(xrd.properties, canonical):
+        if values:
+            doc["properties"][type_] = values[-1]
 
+    selected = rel_filter(rels)
     for link in xrd.links:
+        if selected is None or link.rel in selected:
+            doc["links"].append(jrd_link_dict(link, canonical))
 
-        link_doc: dict = {
-            "titles": {},
-            "properties": {},
-        }
+    return strip_dict(doc)
 
-        if link.rel:
-            link_doc["rel"] = link.rel
 
-        if link.type:
-            link_doc["type"] = link.type
+def render_json(
+    xrd: XRD,
+    canonical: bool = False,
+    rels: Optional[Union[str, Iterable[str]]] = None,
+) -> str:
+    """Render an XRD as JRD.
+    When canonical is True, keys are sorted and separators are fixed so that
+    logically identical documents render to identical strings.
+    If rels is given, only links with one of those relations are rendered.
+    """
+    json = lazy_import("json")
 
-        if link.href:
-            link_doc["href"] = link.href
+    doc = jrd_dict(xrd, canonical=canonical, rels=rels)
+    if canonical:
+        return jrd_encoder(canonical).encode(doc)
+    return json.dumps(doc)
 
-        if link.template:
-            link_doc["template"] = link.template
 
-        for type_, val in link.properties.items():
-            if isinstance(val, (list, tuple)):
-                val = val[-1]
-            link_doc["properties"][type_] = val
+def jrd_encoder(canonical: bool = False):
+    """Return a JSON encoder for JRD. Canonical JRD has sorted keys,
+    no whitespace between tokens and non-ASCII characters unescaped.
+    """
+    json = lazy_import("json")
+
+    if canonical:
+        return json.JSONEncoder(
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False
+        )
+    return json.JSONEncoder()
 
-        for title in link.titles:
-            lang = title.lang or "default"
-            link_doc["titles"][lang] = title.value
 
-        doc["links"].append(strip_dict(link_doc))
+def write_json(xrd: XRD, out, canonical: bool = False):
+    """Render an XRD as JRD to a file-like object, chunk by chunk."""
+    for chunk in jrd_encoder(canonical).iterencode(jrd_dict(xrd, canonical=canonical)):
+        out.write(chunk)
 
-    return json.dumps(strip_dict(doc))
+
+class PrerenderedJRD:
+    """JRD of an XRD rendered once, in pieces, so that responses filtered by
+    link relation can be assembled by concatenating stored bytes.
+    render() returns the same bytes as render_json() encoded as UTF-8.
+    """
+
+    def __init__(self, xrd: XRD):
+        json = lazy_import("json")
+
+        self.load(
+            jrd_dict(xrd),
+            [
+                (link.rel, json.dumps(jrd_link_dict(link)).encode("utf-8"))
+                for link in xrd.links
+            ],
+        )
+
+    @classmethod
+    def from_parts(cls, doc: Mapping, links: List[tuple]) -> "PrerenderedJRD":
+        """Create from the JRD dict of an XRD and its (rel, rendered link) pairs.
+        Links in doc are ignored.
+        """
+        prerendered = cls.__new__(cls)
+        prerendered.load(doc, links)
+        return prerendered
+
+    def load(self, doc: Mapping, links: List[tuple]):
+        json = lazy_import("json")
+
+        # render_json() places links after aliases and before everything else
+        head = {key: value for key, value in doc.items() if key == "aliases"}
+        tail = {
+            key: value for key, value in doc.items() if key not in ("aliases", "links")
+        }
+        self.head = json.dumps(head)[1:-1].encode("utf-8")
+        self.tail = json.dumps(tail)[1:-1].encode("utf-8")
+        self.links = links
+        self.full = self.render_links([data for _, data in self.links])
+
+    def render_links(self, links: List[bytes]) -> bytes:
+        parts = []
+        if self.head:
+            parts.append(self.head)
+        if links:
+            parts.append(b'"links": [' + b", ".join(links) + b"]")
+        if self.tail:
+            parts.append(self.tail)
+        return b"{" + b", ".join(parts) + b"}"
+
+    def render(self, rels: Optional[Union[str, Iterable[str]]] = None) -> bytes:
+        """Return the JRD, including only links with one of rels if given."""
+        selected = rel_filter(rels)
+        if selected is None:
+            return self.full
+        return self.render_links([data for rel, data in self.links if rel in selected])
 
 
 # xml parser/renderer
 
 
-def parse_xml(content: str) -> XRD:
+def parse_xml(content: Union[str, bytes]) -> XRD:
+    minidom = lazy_import("xml.dom.minidom")
+
+    if TRACER is not None:
+        return traced_parse(
+            "xml", content, lambda: xrd_from_dom(minidom.parseString(content))
+        )
+    return xrd_from_dom(minidom.parseString(content))
+
+
+def xrd_from_dom(doc: Document) -> XRD:
+    """Build an XRD from a parsed XML document."""
+
     def expires_handler(node, obj):
         obj.expires = parse_isodatetime(node_text(node))
 
@@ -277,13 +1058,7 @@ def parse_xml(content: str) -> XRD:
         obj.aliases.append(node_text(node))
 
     def property_handler(node, obj):
-        key = node.getAttribute("type")
-        if key in obj.properties:
-            if not isinstance(obj.properties[key], list):
-                obj.properties[key] = [obj.properties[key]]
-            obj.properties[key].append(node_text(node))
-        else:
-            obj.properties[key] = node_text(node)
+        obj.properties.add(node.getAttribute("type"), node_text(node))
 
     def title_handler(node, obj):
         obj.titles.append(Title(node_text(node), node.getAttribute("xml:lang")))
@@ -310,10 +1085,9 @@ def parse_xml(content: str) -> XRD:
 
     def handle_node(node, obj):
         handler = handlers.get(node.nodeName, unknown_handler)
-        if handler and node.nodeType == node.ELEMENT_NODE:
+        if handler and node.nodeType == Node.ELEMENT_NODE:
             handler(node, obj)
 
-    doc = parseString(content)
     root = doc.documentElement
 
     xrd = XRD(root.getAttribute("xml:id"))
@@ -323,6 +1097,9 @@ def parse_xml(content: str) -> XRD:
             xrd.attributes[name] = value
 
     for node in root.childNodes:
+        if node.namespaceURI == DSIG_NAMESPACE and node.localName == "Signature":
+            xrd.signature = parse_signature(node, root)
+            continue
         handle_node(node, xrd)
         if node.nodeName == "Link":
             link = xrd.links[-1]
@@ -334,11 +1111,22 @@ def parse_xml(content: str) -> XRD:
     return xrd
 
 
-def render_xml(xrd: XRD) -> Document:
+def render_xml(
+    xrd: XRD,
+    canonical: bool = False,
+    rels: Optional[Union[str, Iterable[str]]] = None,
+) -> Document:
+    """Render an XRD as an XML document.
+    When canonical is True, attributes and properties are added in sorted order.
+    If rels is given, only links with one of those relations are rendered.
+    """
+
+    minidom = lazy_import("xml.dom.minidom")
 
-    xrd.validate()
+    for link in xrd.links:
+        check_link(link)
 
-    dom = cast(DOMImplementation, getDOMImplementation())
+    dom = cast("DOMImplementation", minidom.getDOMImplementation())
     doc = dom.createDocument(XRD_NAMESPACE, "XRD", None)
     root = doc.documentElement
     root.setAttribute("xmlns", XRD_NAMESPACE)
@@ -346,7 +1134,7 @@ def render_xml(xrd: XRD) -> Document:
     if xrd.xml_id:
         root.setAttribute("xml:id", xrd.xml_id)
 
-    for name, value in xrd.attributes.items():
+    for name, value in sorted_items(xrd.attributes, canonical):
         root.setAttribute(name, value)
 
     if xrd.expires:
@@ -365,8 +1153,7 @@ def render_xml(xrd: XRD) -> Document:
         root.appendChild(node)
 
     uses_nil = False
-    for type_, vals in xrd.properties.items():
-        vals = ensure_iterable(vals)
+    for type_, vals in property_items(xrd.properties, canonical):
         for val in vals:
             node = doc.createElement("Property")
             node.setAttribute("type", type_)
@@ -377,11 +1164,12 @@ def render_xml(xrd: XRD) -> Document:
                 node.appendChild(doc.createTextNode(str(val)))
             root.appendChild(node)
 
-    if uses_nil:
-        root.setAttribute("xmlns:xsi", "http://www.w3.org/2001/XMLSchema-instance")
-
+    selected = rel_filter(rels)
     for link in xrd.links:
 
+        if selected is not None and link.rel not in selected:
+            continue
+
         link_node = doc.createElement("Link")
 
         if link.rel:
@@ -403,17 +1191,3156 @@ def render_xml(xrd: XRD) -> Document:
                 node.setAttribute("xml:lang", title.lang)
             link_node.appendChild(node)
 
-        for type_, vals in link.properties.items():
-            vals = ensure_iterable(vals)
+        for type_, vals in property_items(link.properties, canonical):
             for val in vals:
                 node = doc.createElement("Property")
                 node.setAttribute("type", type_)
                 if val is None:
                     node.setAttribute("xsi:nil", "true")
+                    uses_nil = True
                 else:
                     node.appendChild(doc.createTextNode(str(val)))
                 link_node.appendChild(node)
 
         root.appendChild(link_node)
 
+    if uses_nil:
+        root.setAttribute("xmlns:xsi", XSI_NAMESPACE)
+
     return doc
+
+
+def render_xml_c14n(xrd: XRD) -> str:
+    """Render an XRD as Canonical XML (C14N 2.0).
+    Logically identical documents render to identical strings.
+    """
+    out = io.StringIO()
+    write_xml_c14n(xrd, out)
+    return out.getvalue()
+
+
+def c14n_start_tag(tag: str, declarations: Mapping, attributes: Iterable[tuple]) -> str:
+    """Render a start tag in canonical form: namespace declarations sorted by
+    prefix, then attributes sorted by namespace and local name. attributes
+    are (sort key, name, value) tuples.
+    """
+    parts = [f"<{tag}"]
+    for prefix, uri in sorted(declarations.items()):
+        name = f"xmlns:{prefix}" if prefix else "xmlns"
+        parts.append(f' {name}="{escape_c14n_attr(uri)}"')
+    for _, name, value in sorted(attributes):
+        parts.append(f' {name}="{escape_c14n_attr(value)}"')
+    parts.append(">")
+    return "".join(parts)
+
+
+def c14n_properties(properties: Mapping, declared: Mapping) -> str:
+    parts = []
+    for type_, values in property_items(properties, canonical=True):
+        for value in values:
+            if value is None:
+                nil = (f"{{{XSI_NAMESPACE}}}nil", "xsi:nil", "true")
+                # xsi is declared where it is used, unless the root uses it
+                declarations = {} if "xsi" in declared else {"xsi": XSI_NAMESPACE}
+                tag = c14n_start_tag(
+                    "Property", declarations, [("type", "type", type_), nil]
+                )
+                parts.append(f"{tag}</Property>")
+            else:
+                parts.append(
+                    f'<Property type="{escape_c14n_attr(type_)}">'
+                    f"{escape_c14n_text(str(value))}</Property>"
+                )
+    return "".join(parts)
+
+
+def write_xml_c14n(xrd: XRD, out):
+    """Render an XRD as Canonical XML (C14N 2.0) to a file-like object,
+    element by element, without building a document. The output is that of
+    ElementTree.canonicalize() for render_xml(xrd, canonical=True).toxml():
+    namespaces are declared on the elements that use them, attributes are
+    sorted and empty elements are written with end tags.
+    """
+    for link in xrd.links:
+        check_link(link)
+
+    # prefixes declared by the XRD element, as render_xml() declares them
+    namespaces = {"": XRD_NAMESPACE, "xml": XML_NAMESPACE}
+    attributes = []
+    for name, value in xrd.attributes.items():
+        if name == "xmlns":
+            namespaces[""] = value
+        elif name.startswith("xmlns:"):
+            namespaces[name[6:]] = value
+        else:
+            attributes.append((name, value))
+    if any(
+        None in values
+        for properties in [xrd.properties, *(link.properties for link in xrd.links)]
+        for _, values in property_items(properties)
+    ):
+        namespaces["xsi"] = XSI_NAMESPACE
+    if xrd.xml_id:
+        attributes.append(("xml:id", xrd.xml_id))
+
+    # only the prefixes used by the XRD element are declared on it
+    declared = {"": namespaces[""]}
+    keyed = []
+    for name, value in attributes:
+        prefix, _, local = name.rpartition(":")
+        uri = namespaces.get(prefix) if prefix else None
+        if uri is None:
+            keyed.append((name, name, value))
+        else:
+            keyed.append((f"{{{uri}}}{local}", name, value))
+            if prefix != "xml":
+                declared[prefix] = uri
+    out.write(c14n_start_tag("XRD", declared, keyed))
+
+    if xrd.expires:
+        out.write(f"<Expires>{str_isodatetime(xrd.expires)}</Expires>")
+    if xrd.subject:
+        out.write(f"<Subject>{escape_c14n_text(xrd.subject)}</Subject>")
+    for alias in xrd.aliases:
+        out.write(f"<Alias>{escape_c14n_text(alias)}</Alias>")
+    out.write(c14n_properties(xrd.properties, declared))
+
+    for link in xrd.links:
+        parts = [
+            c14n_start_tag(
+                "Link",
+                {},
+                [
+                    (name, name, value)
+                    for name, value in (
+                        ("rel", link.rel),
+                        ("type", link.type),
+                        ("href", link.href),
+                        ("template", link.template),
+                    )
+                    if value
+                ],
+            )
+        ]
+        for title in link.titles:
+            if title.lang:
+                lang = escape_c14n_attr(title.lang)
+                parts.append(f'<Title xml:lang="{lang}">')
+            else:
+                parts.append("<Title>")
+            parts.append(f"{escape_c14n_text(title.value)}</Title>")
+        parts.append(c14n_properties(link.properties, declared))
+        parts.append("</Link>")
+        out.write("".join(parts))
+
+    out.write("</XRD>")
+
+
+# transcoding
+
+
+XML_DECLARATION = '<?xml version="1.0" ?>'
+XML_DECLARATION_UTF8 = '<?xml version="1.0" encoding="UTF-8"?>'
+XML_LANG = "http://www.w3.org/XML/1998/namespace lang xml"  # xml:lang as named by expat
+DSIG_SIGNATURE = f"{DSIG_NAMESPACE} Signature"
+
+
+def expat_qname(name: str) -> str:
+    """Return the qualified name of an expat "uri local prefix" name."""
+    parts = name.split(" ")
+    if len(parts) == 3:
+        return f"{parts[2]}:{parts[1]}"
+    return parts[-1]
+
+
+def xml_to_jrd(content: Union[str, bytes]) -> str:
+    """Convert an XRD document to JRD in a single pass over the parser events,
+    without building a DOM, an XRD or an intermediate dict.
+    Returns the same string as parse_xml(content).as_json().
+    Signatures are skipped; use parse_xml() to verify them.
+    """
+    json = lazy_import("json")
+    expat = lazy_import("xml.parsers.expat")
+    encode = json.dumps
+
+    def encode_value(value):
+        return "null" if value is None else encode(value)
+
+    aliases: List[str] = []
+    links: List[str] = []
+    properties: dict[str, str] = {}
+    expires = subject = None
+
+    depth = 0
+    skip = 0  # depth of a skipped ds:Signature
+    capture = 0  # depth of the element whose text is being collected
+    captured: tuple = ()
+    texts: List[List[str]] = []  # text of the captured element and its open descendants
+    in_cdata = False
+    link: Optional[tuple] = None  # rel, type, href, template, titles, properties
+
+    def start(name, attrs):
+        nonlocal depth, skip, capture, captured, link
+        depth += 1
+        if capture:
+            texts.append([])
+        if skip or capture or depth == 1:
+            return
+        tag = expat_qname(name)
+        if depth == 2:
+            if name == DSIG_SIGNATURE:
+                skip = depth
+            elif tag == "Link":
+                link = (
+                    attrs.get("rel", ""),
+                    attrs.get("type", ""),
+                    attrs.get("href", ""),
+                    attrs.get("template", ""),
+                    {},
+                    {},
+                )
+            elif tag in ("Expires", "Subject", "Alias", "Property"):
+                capture, captured, texts[:] = depth, (tag, attrs), [[]]
+            elif tag != "Title":
+                logger.info(f"Unknown node: {tag}")
+        elif depth == 3 and link is not None:
+            if tag in ("Title", "Property"):
+                capture, captured, texts[:] = depth, (tag, attrs), [[]]
+            elif tag not in ("Expires", "Subject", "Alias", "Link"):
+                logger.info(f"Unknown node: {tag}")
+
+    def end(name):
+        nonlocal depth, skip, capture, expires, subject, link
+        if capture and depth > capture:
+            # node_text() strips the text of each descendant element
+            child_text = "".join(texts.pop()).strip()
+            texts[-1].append(child_text)
+        elif depth == capture:
+            value = "".join(texts.pop()).strip() or None
+            tag, attrs = captured
+            if depth == 3:
+                if tag == "Title":
+                    link[4][attrs.get(XML_LANG) or "default"] = value
+                else:
+                    link[5][attrs.get("type", "")] = value
+            elif tag == "Expires":
+                expires = str_isodatetime(parse_isodatetime(value))
+            elif tag == "Subject":
+                subject = value
+            elif tag == "Alias":
+                aliases.append(value)
+            else:
+                properties[attrs.get("type", "")] = value
+            capture = 0
+        elif depth == skip:
+            skip = 0
+        elif depth == 2 and link is not None:
+            rel, type_, href, template, titles, link_properties = link
+            if href and template:
+                raise ValueError(
+                    "only one of href or template attributes may be specified "
+                    f"on a link: {Link(rel, type_, href, template)}"
+                )
+            parts = []
+            if titles:
+                parts.append(
+                    '"titles": {'
+                    + ", ".join(
+                        f"{encode(k)}: {encode_value(v)}" for k, v in titles.items()
+                    )
+                    + "}"
+                )
+            if link_properties:
+                parts.append(
+                    '"properties": {'
+                    + ", ".join(
+                        f"{encode(k)}: {encode_value(v)}"
+                        for k, v in link_properties.items()
+                    )
+                    + "}"
+                )
+            for key, value in (
+                ("rel", rel),
+                ("type", type_),
+                ("href", href),
+                ("template", template),
+            ):
+                if value:
+                    parts.append(f'"{key}": {encode(value)}')
+            links.append("{" + ", ".join(parts) + "}")
+            link = None
+        depth -= 1
+
+    def characters(data):
+        # minidom drops the content of CDATA sections from node text
+        if capture and not in_cdata:
+            texts[-1].append(data)
+
+    def start_cdata():
+        nonlocal in_cdata
+        in_cdata = True
+
+    def end_cdata():
+        nonlocal in_cdata
+        in_cdata = False
+
+    parser = expat.ParserCreate(namespace_separator=" ")
+    parser.namespace_prefixes = True
+    parser.buffer_text = True
+    parser.StartElementHandler = start
+    parser.EndElementHandler = end
+    parser.CharacterDataHandler = characters
+    parser.StartCdataSectionHandler = start_cdata
+    parser.EndCdataSectionHandler = end_cdata
+    parser.Parse(content, True)
+
+    parts = []
+    if aliases:
+        parts.append('"aliases": [' + ", ".join(map(encode_value, aliases)) + "]")
+    if links:
+        parts.append('"links": [' + ", ".join(links) + "]")
+    if properties:
+        parts.append(
+            '"properties": {'
+            + ", ".join(
+                f"{encode(k)}: {encode_value(v)}" for k, v in properties.items()
+            )
+            + "}"
+        )
+    if expires:
+        parts.append(f'"expires": {encode(expires)}')
+    if subject:
+        parts.append(f'"subject": {encode(subject)}')
+    return "{" + ", ".join(parts) + "}"
+
+
+def escape_xml(value: str) -> str:
+    """Escape text or an attribute value as minidom's toxml() does."""
+    return (
+        value.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace('"', "&quot;")
+        .replace(">", "&gt;")
+    )
+
+
+def xml_text(tag: str, value: Any, attributes: str = "") -> str:
+    if not isinstance(value, str):
+        raise TypeError("node contents must be a string")
+    return f"<{tag}{attributes}>{escape_xml(value)}</{tag}>"
+
+
+def xml_property(type_: str, value: Any) -> str:
+    attributes = f' type="{escape_xml(type_)}"'
+    if value is None:
+        return f'<Property{attributes} xsi:nil="true"/>'
+    return xml_text("Property", str(value), attributes)
+
+
+def xml_element(tag: str, attributes: Iterable[tuple], children: List[str]) -> str:
+    rendered = "".join(f' {name}="{escape_xml(value)}"' for name, value in attributes)
+    if children:
+        return f"<{tag}{rendered}>{''.join(children)}</{tag}>"
+    return f"<{tag}{rendered}/>"
+
+
+def last_values(properties: Mapping) -> dict:
+    """Property values of a JRD, taking the last of list values."""
+    return {
+        type_: value[-1] if isinstance(value, (list, tuple)) else value
+        for type_, value in properties.items()
+    }
+
+
+def jrd_to_xml(content: Union[str, bytes]) -> str:
+    """Convert a JRD document to XRD without building an XRD or a DOM.
+    Returns a document equivalent to render_xml(parse_json(content)).toxml().
+    """
+    json = lazy_import("json")
+
+    doc = json.loads(content)
+    body = []
+
+    for key in doc:
+        if key not in ("expires", "subject", "aliases", "properties", "links", "title"):
+            logger.info(f"Unknown property: {key} = {doc[key]}")
+
+    if "expires" in doc:
+        body.append(
+            xml_text("Expires", str_isodatetime(parse_isodatetime(doc["expires"])))
+        )
+
+    if doc.get("subject"):
+        body.append(xml_text("Subject", doc["subject"]))
+
+    for alias in doc.get("aliases", ()):
+        body.append(xml_text("Alias", alias))
+
+    properties = last_values(doc.get("properties", {}))
+    uses_nil = None in properties.values()
+    for type_, value in properties.items():
+        body.append(xml_property(type_, value))
+
+    for link in doc.get("links", ()):
+        rel, type_, href, template = (
+            link.get(key, "") for key in ("rel", "type", "href", "template")
+        )
+        if href and template:
+            raise ValueError(
+                "only one of href or template attributes may be specified on a link: "
+                f"{Link(rel, type_, href, template)}"
+            )
+        attributes = [
+            (name, value)
+            for name, value in (
+                ("rel", rel),
+                ("type", type_),
+                ("href", href),
+                ("template", template),
+            )
+            if value
+        ]
+        children = [
+            xml_text("Title", title, f' xml:lang="{escape_xml(lang)}"' if lang else "")
+            for lang, title in link.get("titles", {}).items()
+        ]
+        link_properties = last_values(link.get("properties", {}))
+        uses_nil = uses_nil or None in link_properties.values()
+        children.extend(
+            xml_property(type_, value) for type_, value in link_properties.items()
+        )
+        body.append(xml_element("Link", attributes, children))
+
+    attributes = [("xmlns", XRD_NAMESPACE)]
+    if uses_nil:
+        attributes.append(("xmlns:xsi", XSI_NAMESPACE))
+    return XML_DECLARATION + xml_element("XRD", attributes, body)
+
+
+# building
+
+
+def xml_link(link: Link) -> str:
+    """Render a link as render_xml() does, without a DOM."""
+    attributes = [
+        (name, value)
+        for name, value in (
+            ("rel", link.rel),
+            ("type", link.type),
+            ("href", link.href),
+            ("template", link.template),
+        )
+        if value
+    ]
+    children = [
+        xml_text(
+            "Title",
+            title.value,
+            f' xml:lang="{escape_xml(title.lang)}"' if title.lang else "",
+        )
+        for title in link.titles
+    ]
+    children.extend(
+        xml_property(type_, value)
+        for type_, values in property_items(link.properties)
+        for value in values
+    )
+    return xml_element("Link", attributes, children)
+
+
+class XRDBuilder:
+    """Build an XRD, rendering its JRD and XML along the way.
+
+    Links are checked and rendered as they are added. build() returns an
+    XRD, and prerendered() its JRD and XML, assembled from the
+    rendered links. Methods return the builder:
+
+        builder = (
+            XRDBuilder("acct:bob@example.com")
+            .alias("https://example.com/bob")
+            .link("self", href="https://example.com/bob")
+        )
+        app.replace(builder.build(), builder.prerendered())
+
+    Links passed to add_link() are adopted and must not be modified afterwards.
+    """
+
+    def __init__(
+        self, subject: str = "", expires: Optional[datetime] = None, xml_id: str = ""
+    ):
+        self._subject = subject
+        self._expires = expires
+        self._xml_id = xml_id
+        self._aliases: List[str] = []
+        self._properties = Properties()
+        self._attributes: dict[str, str] = {}
+        self._links: List[Link] = []
+        self._jrd_links: List[tuple] = []
+        self._xml_links: List[str] = []
+        self._links_use_nil = False
+
+    def subject(self, subject: str) -> "XRDBuilder":
+        self._subject = subject
+        return self
+
+    def expires(self, expires: Optional[datetime]) -> "XRDBuilder":
+        self._expires = expires
+        return self
+
+    def xml_id(self, xml_id: str) -> "XRDBuilder":
+        self._xml_id = xml_id
+        return self
+
+    def alias(self, alias: str) -> "XRDBuilder":
+        self._aliases.append(alias)
+        return self
+
+    def property(self, type_: str, value: Optional[str] = None) -> "XRDBuilder":
+        """Add a property value; None adds a nil property."""
+        self._properties.add(type_, value)
+        return self
+
+    def attribute(self, name: str, value: str) -> "XRDBuilder":
+        self._attributes[name] = value
+        return self
+
+    def link(
+        self,
+        rel: str = "",
+        type: str = "",
+        href: str = "",
+        template: str = "",
+        titles: Iterable[Title] = (),
+        properties: Optional[Mapping] = None,
+    ) -> "XRDBuilder":
+        return self.add_link(
+            Link(rel, type, href, template, list(titles), Properties(properties or {}))
+        )
+
+    def add_link(self, link: Link) -> "XRDBuilder":
+        """Check and render a link, and add it to the XRD."""
+        json = lazy_import("json")
+
+        check_link(link)
+        xml = xml_link(link)
+        jrd = json.dumps(jrd_link_dict(link)).encode("utf-8")
+        self._links.append(link)
+        self._jrd_links.append((link.rel, jrd))
+        self._xml_links.append(xml)
+        if not self._links_use_nil:
+            self._links_use_nil = any(
+                None in values for _, values in property_items(link.properties)
+            )
+        return self
+
+    def build(self) -> XRD:
+        """Return an XRD of what has been added so far.
+        The builder may be used again; XRDs already built are not affected.
+        """
+        properties = self._properties.copy()
+        return XRD(
+            xml_id=self._xml_id,
+            expires=self._expires,
+            subject=self._subject,
+            aliases=list(self._aliases),
+            properties=properties,
+            links=list(self._links),
+            attributes=dict(self._attributes),
+        )
+
+    def prerendered(self) -> Prerendered:
+        """Return the JRD and XML of the XRD build() returns, the same documents
+        render_json() and render_xml() produce for it.
+        """
+        xrd = self.build()
+        properties = xrd.properties
+        body = []
+        if xrd.expires:
+            body.append(xml_text("Expires", str_isodatetime(xrd.expires)))
+        if xrd.subject:
+            body.append(xml_text("Subject", xrd.subject))
+        body.extend(xml_text("Alias", alias) for alias in xrd.aliases)
+        body.extend(
+            xml_property(type_, value)
+            for type_, values in property_items(properties)
+            for value in values
+        )
+        body.extend(self._xml_links)
+        # attributes are set in the order render_xml() sets them; setting one
+        # again replaces its value in place, as in the DOM
+        attributes = {"xmlns": XRD_NAMESPACE}
+        if xrd.xml_id:
+            attributes["xml:id"] = xrd.xml_id
+        attributes.update(xrd.attributes)
+        if self._links_use_nil or any(
+            None in values for _, values in property_items(properties)
+        ):
+            attributes["xmlns:xsi"] = XSI_NAMESPACE
+        xml = XML_DECLARATION + xml_element("XRD", attributes.items(), body)
+
+        # links were rendered as they were added
+        doc = jrd_dict(
+            XRD(
+                expires=xrd.expires,
+                subject=xrd.subject,
+                aliases=xrd.aliases,
+                properties=properties,
+            )
+        )
+        jrd = PrerenderedJRD.from_parts(doc, list(self._jrd_links))
+        return Prerendered(jrd, xml)
+
+
+# diff/patch
+
+
+def link_key(link: Link) -> tuple:
+    """The identity of a link when comparing two versions of an XRD."""
+    return (link.rel, link.type, link.href, link.template)
+
+
+def link_to_patch(link: Link) -> dict:
+    return strip_dict(
+        {
+            "rel": link.rel,
+            "type": link.type,
+            "href": link.href,
+            "template": link.template,
+            "titles": [[title.value, title.lang] for title in link.titles],
+            "properties": dict(link.properties),
+        }
+    )
+
+
+def link_from_patch(data: Mapping) -> Link:
+    return Link(
+        rel=data.get("rel", ""),
+        type=data.get("type", ""),
+        href=data.get("href", ""),
+        template=data.get("template", ""),
+        titles=[Title(value, lang=lang) for value, lang in data.get("titles", [])],
+        properties=Properties(data.get("properties", {})),
+    )
+
+
+def diff_mapping(old: Mapping, new: Mapping) -> dict:
+    patch: dict = {}
+    changed = {
+        key: val for key, val in new.items() if key not in old or old[key] != val
+    }
+    removed = [key for key in old if key not in new]
+    if changed:
+        patch["set"] = changed
+    if removed:
+        patch["remove"] = removed
+    return patch
+
+
+def apply_mapping(target: dict, patch: Mapping):
+    for key in patch.get("remove", ()):
+        target.pop(key, None)
+    target.update(patch.get("set", {}))
+
+
+def diff_aliases(old: List[str], new: List[str]) -> dict:
+    remaining = list(old)
+    old_set = set(old)
+    new_set = set(new)
+    removed = [alias for alias in old if alias not in new_set]
+    for alias in removed:
+        remaining.remove(alias)
+    added = [alias for alias in new if alias not in old_set]
+    if remaining + added != new:
+        return {"replace": list(new)}
+    patch: dict = {}
+    if added:
+        patch["add"] = added
+    if removed:
+        patch["remove"] = removed
+    return patch
+
+
+def diff_links(old: List[Link], new: List[Link]) -> dict:
+    """Match links by link_key() using a hash table, pairing duplicate keys in order."""
+    old_by_key: dict[tuple, List[int]] = {}
+    for index, link in enumerate(old):
+        old_by_key.setdefault(link_key(link), []).append(index)
+
+    seen: dict[tuple, int] = {}
+    retained: List[int] = []
+    added: List[list] = []
+    changed: List[list] = []
+
+    for index, link in enumerate(new):
+        key = link_key(link)
+        occurrence = seen.get(key, 0)
+        seen[key] = occurrence + 1
+        candidates = old_by_key.get(key, ())
+        if occurrence < len(candidates):
+            old_index = candidates[occurrence]
+            retained.append(old_index)
+            if old[old_index] != link:
+                changed.append([list(key), occurrence, link_to_patch(link)])
+        else:
+            added.append([index, link_to_patch(link)])
+
+    # retained links must keep their relative order to be patched in place
+    if any(a > b for a, b in zip(retained, retained[1:])):
+        return {"replace": [link_to_patch(link) for link in new]}
+
+    removed = []
+    for key, indexes in old_by_key.items():
+        for _ in indexes[seen.get(key, 0) :]:
+            removed.append(list(key))
+
+    patch: dict = {}
+    if removed:
+        patch["remove"] = removed
+    if changed:
+        patch["change"] = changed
+    if added:
+        patch["add"] = added
+    return patch
+
+
+def diff(old: XRD, new: XRD) -> dict:
+    """Compute a patch that transforms old into new.
+    The patch contains only JSON compatible values and can be sent with json.dumps.
+    An empty patch means the documents are equal.
+    """
+    patch: dict = {}
+
+    for name in ("xml_id", "subject"):
+        if getattr(old, name) != getattr(new, name):
+            patch[name] = getattr(new, name)
+
+    if old.expires != new.expires:
+        patch["expires"] = str_isodatetime(new.expires) if new.expires else None
+
+    sections = {
+        "aliases": diff_aliases(old.aliases, new.aliases),
+        "properties": diff_mapping(old.properties, new.properties),
+        "attributes": diff_mapping(old.attributes, new.attributes),
+        "links": diff_links(old.links, new.links),
+    }
+    patch.update((name, section) for name, section in sections.items() if section)
+
+    return patch
+
+
+def apply_patch(xrd: XRD, patch: Mapping) -> XRD:
+    """Apply a patch created by diff() to an XRD, in place.
+    Returns the patched XRD.
+    """
+    for name in ("xml_id", "subject"):
+        if name in patch:
+            setattr(xrd, name, patch[name])
+
+    if "expires" in patch:
+        expires = patch["expires"]
+        xrd.expires = parse_isodatetime(expires) if expires else None
+
+    aliases = patch.get("aliases", {})
+    if "replace" in aliases:
+        xrd.aliases[:] = aliases["replace"]
+    for alias in aliases.get("remove", ()):
+        xrd.aliases.remove(alias)
+    xrd.aliases.extend(aliases.get("add", ()))
+
+    apply_mapping(xrd.properties, patch.get("properties", {}))
+    apply_mapping(xrd.attributes, patch.get("attributes", {}))
+
+    links = patch.get("links", {})
+    if "replace" in links:
+        xrd.links[:] = [link_from_patch(data) for data in links["replace"]]
+
+    if "change" in links or "remove" in links:
+        by_key: dict[tuple, List[int]] = {}
+        for index, link in enumerate(xrd.links):
+            by_key.setdefault(link_key(link), []).append(index)
+        for key, occurrence, data in links.get("change", ()):
+            xrd.links[by_key[tuple(key)][occurrence]] = link_from_patch(data)
+        removed = set()
+        for key in links.get("remove", ()):
+            removed.add(by_key[tuple(key)].pop())
+        xrd.links[:] = [link for i, link in enumerate(xrd.links) if i not in removed]
+
+    for index, data in links.get("add", ()):
+        xrd.links.insert(index, link_from_patch(data))
+
+    xrd.validate()
+
+    return xrd
+
+
+# binary format
+
+# Layout of an XRD encoded by to_binary(), all integers little-endian:
+#
+#     magic      4 bytes   b"XRDB"
+#     version    1 byte
+#     flags      1 byte    RECORD_DEFLATED if the string table is compressed
+#     typecode   1 byte    array typecode of the body: B, H or I
+#     strings    uint32 length + NUL separated UTF-8 strings
+#     body       uint32 length + array of integers
+#
+# Body integers are counts and string references, where 0 is None and
+# n refers to the n-1th string of the table.
+
+RECORD_MAGIC = b"XRDB"
+RECORD_VERSION = 1
+RECORD_DEFLATED = 0x01
+RECORD_TYPECODES = ("B", "H", "I")
+
+
+class RecordEncoder:
+    def __init__(self):
+        self.strings: dict[str, int] = {}
+        self.body: List[int] = []
+
+    def ref(self, value: Optional[str]):
+        if value is None:
+            self.body.append(0)
+            return
+        ref = self.strings.get(value)
+        if ref is None:
+            if "\x00" in value:
+                raise ValueError(f"NUL characters can't be encoded: {value!r}")
+            ref = self.strings[value] = len(self.strings) + 1
+        self.body.append(ref)
+
+    def properties(self, properties: Mapping):
+        self.body.append(len(properties))
+        for type_, values in properties.items():
+            self.ref(type_)
+            if isinstance(values, (list, tuple)):
+                self.body.append(len(values) + 1)
+                for value in values:
+                    self.ref(value)
+            else:
+                self.body.append(0)
+                self.ref(values)
+
+    def attributes(self, attributes: Mapping):
+        self.body.append(len(attributes))
+        for name, value in attributes.items():
+            self.ref(name)
+            self.body.append(0)
+            self.ref(value)
+
+    def xrd(self, xrd: XRD):
+        self.ref(xrd.xml_id)
+        self.ref(xrd.subject)
+        self.ref(str_isodatetime(xrd.expires) if xrd.expires else None)
+        self.body.append(len(xrd.aliases))
+        for alias in xrd.aliases:
+            self.ref(alias)
+        self.properties(xrd.properties)
+        self.attributes(xrd.attributes)
+        self.body.append(len(xrd.links))
+        for link in xrd.links:
+            self.ref(link.rel)
+            self.ref(link.type)
+            self.ref(link.href)
+            self.ref(link.template)
+            self.body.append(len(link.titles))
+            for title in link.titles:
+                self.ref(title.value)
+                self.ref(title.lang)
+            self.properties(link.properties)
+
+    def getvalue(self, compress: bool = True) -> bytes:
+        zlib = lazy_import("zlib")
+
+        strings = "\x00".join(self.strings).encode("utf-8")
+        flags = 0
+        if compress:
+            deflated = zlib.compress(strings, 9, -15)
+            if len(deflated) < len(strings):
+                strings = deflated
+                flags |= RECORD_DEFLATED
+
+        top = max(self.body, default=0)
+        for typecode in RECORD_TYPECODES:
+            if top < 1 << (8 * array(typecode).itemsize):
+                break
+        body = array(typecode, self.body)
+        if sys.byteorder == "big":
+            body.byteswap()
+        body_bytes = body.tobytes()
+
+        return b"".join(
+            (
+                RECORD_MAGIC,
+                bytes((RECORD_VERSION, flags, ord(typecode))),
+                struct.pack("<I", len(strings)),
+                strings,
+                struct.pack("<I", len(body_bytes)),
+                body_bytes,
+            )
+        )
+
+
+def to_binary(xrd: XRD, compress: bool = False) -> bytes:
+    """Encode an XRD in a compact binary format with a string table, as stored
+    in caches and store files. If compress is True, the string table is deflated
+    when that makes it smaller, trading decoding time for size.
+    Signatures are not preserved.
+    """
+    for link in xrd.links:
+        check_link(link)
+    encoder = RecordEncoder()
+    encoder.xrd(xrd)
+    return encoder.getvalue(compress)
+
+
+def decode_record_properties(ints: List[int], pos: int, table: List) -> tuple:
+    count = ints[pos]
+    pos += 1
+    data = Properties()
+    for _ in range(count):
+        size = ints[pos + 1]
+        if size:
+            end = pos + 1 + size
+            data[table[ints[pos]]] = [table[ref] for ref in ints[pos + 2 : end]]
+            pos = end
+        else:
+            data[table[ints[pos]]] = table[ints[pos + 2]]
+            pos += 3
+    return data, pos
+
+
+def decode_record_attributes(ints: List[int], pos: int, table: List) -> tuple:
+    count = ints[pos]
+    pos += 1
+    attributes: dict = {}
+    for _ in range(count):
+        attributes[table[ints[pos]]] = table[ints[pos + 2]]
+        pos += 3
+    return attributes, pos
+
+
+def decode_record_link(ints: List[int], pos: int, table: List) -> tuple:
+    rel, type_, href, template, title_count = ints[pos : pos + 5]
+    pos += 5
+    titles = []
+    for _ in range(title_count):
+        titles.append(Title(table[ints[pos]], table[ints[pos + 1]]))
+        pos += 2
+    properties, pos = decode_record_properties(ints, pos, table)
+    link = Link(
+        table[rel], table[type_], table[href], table[template], titles, properties
+    )
+    return link, pos
+
+
+def skip_record_properties(ints: List[int], pos: int) -> int:
+    count = ints[pos]
+    pos += 1
+    for _ in range(count):
+        size = ints[pos + 1]
+        pos += 1 + size if size else 3
+    return pos
+
+
+def read_record(data: bytes) -> tuple:
+    """Read the string table and body integers of a record."""
+    zlib = lazy_import("zlib")
+
+    if data[:4] != RECORD_MAGIC:
+        raise ValueError("not an XRD record")
+    version, flags, typecode = data[4], data[5], chr(data[6])
+    if version != RECORD_VERSION:
+        raise ValueError(f"unsupported XRD record version: {version}")
+
+    (size,) = struct.unpack_from("<I", data, 7)
+    offset = 11 + size
+    strings = data[11:offset]
+    if flags & RECORD_DEFLATED:
+        strings = zlib.decompress(strings, -15)
+    table: List = [None]
+    table.extend(str(strings, "utf-8").split("\x00"))
+
+    (size,) = struct.unpack_from("<I", data, offset)
+    body = array(typecode)
+    body.frombytes(data[offset + 4 : offset + 4 + size])
+    if sys.byteorder == "big":
+        body.byteswap()
+
+    return table, body.tolist()
+
+
+def from_binary(data: bytes) -> XRD:
+    """Decode an XRD encoded by to_binary()."""
+    table, ints = read_record(data)
+
+    xml_id, subject, expires, count = ints[0:4]
+    pos = 4 + count
+    xrd = XRD(
+        xml_id=table[xml_id] or "",
+        subject=table[subject] or "",
+        expires=parse_isodatetime(table[expires]) if expires else None,
+        aliases=[table[ref] for ref in ints[4:pos]],
+    )
+    xrd.properties, pos = decode_record_properties(ints, pos, table)
+    xrd.attributes, pos = decode_record_attributes(ints, pos, table)
+
+    count = ints[pos]
+    pos += 1
+    for _ in range(count):
+        link, pos = decode_record_link(ints, pos, table)
+        xrd.links.append(link)
+
+    return xrd
+
+
+def find_record_link(
+    data: bytes, rels: Union[str, Iterable[str]], attr: Optional[str] = None
+) -> Optional[Union[Link, str, Iterable, Mapping]]:
+    """Find a link by relation in a record, like XRD.find_link(),
+    decoding only the link that matches.
+    """
+    rels = ensure_iterable(rels)
+    table, ints = read_record(data)
+
+    pos = 4 + ints[3]
+    pos = skip_record_properties(ints, pos)
+    pos = skip_record_properties(ints, pos)
+
+    count = ints[pos]
+    pos += 1
+    for _ in range(count):
+        if table[ints[pos]] in rels:
+            link, _ = decode_record_link(ints, pos, table)
+            if attr:
+                return getattr(link, attr, None)
+            return link
+        pos = skip_record_properties(ints, pos + 5 + 2 * ints[pos + 4])
+    return None
+
+
+# memory mapped store
+
+# Layout of a store file, all integers little-endian:
+#
+#     header     STORE_HEADER: magic, version, record count,
+#                offset of the record table, offset and slot count of the index
+#     records    XRDs encoded by to_binary(), one after another
+#     record table   uint64 offset and uint32 length of each record
+#     index      open addressing hash table of uint64 key hash, uint32 record
+#
+# Index keys are the subject and aliases of each XRD. A key hash of 0 marks
+# an empty slot.
+
+STORE_MAGIC = b"XRDS"
+STORE_VERSION = 1
+STORE_HEADER = struct.Struct("<4sB3xQQQQ")
+STORE_RECORD = struct.Struct("<QI")
+STORE_SLOT = struct.Struct("<QI")
+
+
+def store_key_hash(key: str) -> int:
+    hashlib = lazy_import("hashlib")
+
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") or 1
+
+
+def write_store(path: str, xrds: Iterable[XRD], compress: bool = False):
+    """Write XRDs to a store file that can be opened with XRDStore.
+    Records are written as they are read from xrds; only the record
+    table and key hashes are held in memory. compress is passed to
+    to_binary().
+    """
+    records: List[tuple] = []
+    keys: List[tuple] = []
+
+    with open(path, "wb") as fp:
+        fp.write(b"\x00" * STORE_HEADER.size)
+
+        for xrd in xrds:
+            data = to_binary(xrd, compress)
+            index = len(records)
+            records.append((fp.tell(), len(data)))
+            fp.write(data)
+            for key in [xrd.subject, *xrd.aliases]:
+                if key:
+                    keys.append((store_key_hash(key), index))
+
+        record_table = fp.tell()
+        for record in records:
+            fp.write(STORE_RECORD.pack(*record))
+
+        slot_count = 1
+        while slot_count < 2 * len(keys):
+            slot_count <<= 1
+        slots: List[Optional[tuple]] = [None] * slot_count
+        for key_hash, index in keys:
+            slot = key_hash & (slot_count - 1)
+            while slots[slot] is not None:
+                slot = (slot + 1) & (slot_count - 1)
+            slots[slot] = (key_hash, index)
+
+        index_table = fp.tell()
+        empty = STORE_SLOT.pack(0, 0)
+        for entry in slots:
+            fp.write(STORE_SLOT.pack(*entry) if entry else empty)
+
+        fp.seek(0)
+        fp.write(
+            STORE_HEADER.pack(
+                STORE_MAGIC,
+                STORE_VERSION,
+                len(records),
+                record_table,
+                index_table,
+                slot_count,
+            )
+        )
+
+
+class XRDStore:
+    """Read-only, memory mapped collection of XRDs written by write_store().
+    Opening a store maps the file without reading it; records are decoded
+    only when they are looked up by subject or alias.
+    """
+
+    def __init__(self, path: str):
+        mmap = lazy_import("mmap")
+
+        with open(path, "rb") as fp:
+            self.mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buffer = memoryview(self.mmap)
+        (
+            magic,
+            version,
+            self.count,
+            self.record_table,
+            self.index_table,
+            self.slot_count,
+        ) = STORE_HEADER.unpack_from(self.mmap)
+        if magic != STORE_MAGIC:
+            self.close()
+            raise ValueError("not an XRD store")
+        if version != STORE_VERSION:
+            self.close()
+            raise ValueError(f"unsupported XRD store version: {version}")
+
+    def close(self):
+        """Unmap the file. Views returned by record() must be released first."""
+        self.buffer.release()
+        self.mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield from_binary(self.record(index))
+
+    def __contains__(self, key: str) -> bool:
+        return self.lookup(key) is not None
+
+    def __getitem__(self, key: str) -> XRD:
+        xrd = self.get(key)
+        if xrd is None:
+            raise KeyError(key)
+        return xrd
+
+    def record(self, index: int) -> memoryview:
+        """Return a view of the record stored at index, without copying it."""
+        offset, length = STORE_RECORD.unpack_from(
+            self.mmap, self.record_table + index * STORE_RECORD.size
+        )
+        return self.buffer[offset : offset + length]
+
+    def lookup(self, key: str) -> Optional[int]:
+        """Return the index of the first record with key as its subject or alias."""
+        if not self.slot_count:
+            return None
+        key_hash = store_key_hash(key)
+        mask = self.slot_count - 1
+        slot = key_hash & mask
+        while True:
+            slot_hash, index = STORE_SLOT.unpack_from(
+                self.mmap, self.index_table + slot * STORE_SLOT.size
+            )
+            if slot_hash == 0:
+                return None
+            if slot_hash == key_hash:
+                table, ints = read_record(self.record(index))
+                aliases = ints[4 : 4 + ints[3]]
+                if table[ints[1]] == key or key in (table[ref] for ref in aliases):
+                    return index
+            slot = (slot + 1) & mask
+
+    def get(self, key: str) -> Optional[XRD]:
+        """Return the XRD with key as its subject or alias."""
+        index = self.lookup(key)
+        return None if index is None else from_binary(self.record(index))
+
+    def find_link(
+        self, key: str, rels: Union[str, Iterable[str]], attr: Optional[str] = None
+    ) -> Optional[Union[Link, str, Iterable, Mapping]]:
+        """Find a link of the XRD with key as its subject or alias,
+        decoding only the matching link.
+        """
+        index = self.lookup(key)
+        if index is None:
+            return None
+        return find_record_link(self.record(index), rels, attr)
+
+
+# resource index
+
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_resource(resource: str) -> str:
+    """Normalize an acct: URI or URL so that equivalent forms compare equal.
+    Bare user@host identifiers are treated as acct: URIs. Schemes and hosts are
+    lowercased, default ports and fragments are dropped. Other resources
+    without a scheme are returned as they are.
+    """
+    resource = resource.strip()
+    scheme, sep, rest = resource.partition(":")
+    if not sep or (scheme.lower() not in ("acct", "mailto") and "@" in scheme):
+        if "@" not in resource.lstrip("@"):
+            return resource
+        # bare user@host, optionally with a leading @
+        scheme, rest = "acct", resource.lstrip("@")
+    scheme = scheme.lower()
+
+    if scheme in ("acct", "mailto"):
+        user, at, host = rest.rpartition("@")
+        return f"{scheme}:{user}{at}{host.lower()}"
+
+    try:
+        parts = urlsplit(resource)
+        port = parts.port
+    except ValueError:
+        return resource
+    if not parts.netloc:
+        return f"{scheme}:{rest}"
+    netloc = (parts.hostname or "").lower()
+    if ":" in netloc:
+        netloc = f"[{netloc}]"  # IPv6 address
+    if parts.username is not None:
+        userinfo = parts.netloc.rpartition("@")[0]
+        netloc = f"{userinfo}@{netloc}"
+    if port is not None and port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or "/", parts.query, ""))
+
+
+class XRDIndex:
+    """Collection of XRDs with constant time lookup by subject or alias.
+    Keys are normalized with normalize_resource(). When several XRDs share
+    a key, the most recently added one is returned, and removing it returns
+    the one added before it.
+    """
+
+    def __init__(self, xrds: Iterable[XRD] = ()):
+        self.by_key: dict[str, XRD] = {}
+        # XRDs indexed under each key, in the order they were added
+        self.owners: dict[str, List[XRD]] = {}
+        self.entries: dict[int, tuple] = {}
+        self.update(xrds)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        for xrd, _ in self.entries.values():
+            yield xrd
+
+    def __contains__(self, resource: str) -> bool:
+        return self.get(resource) is not None
+
+    def __getitem__(self, resource: str) -> XRD:
+        xrd = self.get(resource)
+        if xrd is None:
+            raise KeyError(resource)
+        return xrd
+
+    def add(self, xrd: XRD):
+        """Add an XRD, indexed by its subject and aliases."""
+        if id(xrd) in self.entries:
+            self.remove(xrd)
+        keys = tuple(
+            {
+                sys.intern(normalize_resource(key)): None
+                for key in [xrd.subject, *xrd.aliases]
+                if key
+            }
+        )
+        for key in keys:
+            self.by_key[key] = xrd
+            self.owners.setdefault(key, []).append(xrd)
+        self.entries[id(xrd)] = (xrd, keys)
+
+    def update(self, xrds: Iterable[XRD]):
+        """Add many XRDs."""
+        for xrd in xrds:
+            self.add(xrd)
+
+    def remove(self, xrd: XRD):
+        """Remove an XRD using the keys it was indexed with."""
+        _, keys = self.entries.pop(id(xrd))
+        for key in keys:
+            owners = [owner for owner in self.owners[key] if owner is not xrd]
+            if owners:
+                self.owners[key] = owners
+                self.by_key[key] = owners[-1]
+            else:
+                del self.owners[key]
+                del self.by_key[key]
+
+    def replace(self, xrd: XRD) -> Optional[XRD]:
+        """Replace the XRD indexed under the subject of the given XRD.
+        Returns the XRD that was replaced, if any.
+        """
+        old = self.get(xrd.subject) if xrd.subject else None
+        if old is not None:
+            self.remove(old)
+        self.add(xrd)
+        return old
+
+    def get(self, resource: str) -> Optional[XRD]:
+        """Return the XRD with resource as its subject or alias."""
+        if TRACER is None:
+            return self.by_key.get(normalize_resource(resource))
+        with TRACER.start_as_current_span(
+            "xrd.index.get", attributes={"xrd.resource": resource}
+        ) as span:
+            xrd = self.by_key.get(normalize_resource(resource))
+            span.set_attribute("xrd.found", xrd is not None)
+            return xrd
+
+    def links(
+        self, resource: str, rels: Optional[Union[str, Iterable[str]]] = None
+    ) -> List[Link]:
+        """Return the links of the XRD for resource, optionally filtered by relation.
+        The returned links are the XRD's own objects, not copies.
+        """
+        xrd = self.get(resource)
+        if xrd is None:
+            return []
+        selected = rel_filter(rels)
+        if selected is None:
+            return list(xrd.links)
+        return [link for link in xrd.links if link.rel in selected]
+
+
+# deduplication
+
+
+class Deduplication(NamedTuple):
+    unique: List[XRD]
+    exact: Dict[int, int]
+    equivalent: Dict[int, int]
+
+
+def equivalence_key(xrd: XRD) -> tuple:
+    """Hashable key of the resources an XRD describes and what it says about them.
+    The subject and aliases are normalized and unordered; the XML id,
+    attributes and signature are ignored.
+    """
+    resources = frozenset(
+        normalize_resource(resource)
+        for resource in (xrd.subject, *xrd.aliases)
+        if resource
+    )
+    return (
+        resources,
+        xrd.expires,
+        properties_key(xrd.properties),
+        tuple(link.structural_key() for link in xrd.links),
+    )
+
+
+def dedupe(xrds: Iterable[XRD]) -> Deduplication:
+    """Find duplicate XRDs in linear time, using structural keys.
+
+    unique      the XRDs without duplicates, in order of first occurrence
+    exact       maps the index of each XRD equal to an earlier one to the
+                index of the XRD that was kept
+    equivalent  the same for XRDs that differ from an earlier one only in how
+                the same resources are named by the subject and aliases
+    """
+    unique: List[XRD] = []
+    exact: dict[int, int] = {}
+    equivalent: dict[int, int] = {}
+    seen: dict[tuple, int] = {}
+    seen_keys: dict[tuple, int] = {}
+
+    for index, xrd in enumerate(xrds):
+        first = seen.setdefault(xrd.structural_key(), index)
+        if first != index:
+            exact[index] = equivalent.get(first, first)
+            continue
+        first = seen_keys.setdefault(equivalence_key(xrd), index)
+        if first != index:
+            equivalent[index] = first
+            continue
+        unique.append(xrd)
+
+    return Deduplication(unique, exact, equivalent)
+
+
+# host-meta and WebFinger app
+
+JRD_CONTENT_TYPE = "application/jrd+json"
+XRD_CONTENT_TYPE = "application/xrd+xml"
+
+
+def accept_quality(accept: str, content_type: str) -> float:
+    """Return the quality an Accept header assigns to a content type."""
+    best, best_specificity = 0.0, -1
+    main_type = content_type.split("/")[0]
+    for item in accept.split(","):
+        media_range, *params = [part.strip() for part in item.split(";")]
+        if media_range == content_type:
+            specificity = 2
+        elif media_range == f"{main_type}/*":
+            specificity = 1
+        elif media_range == "*/*":
+            specificity = 0
+        else:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if specificity > best_specificity:
+            best, best_specificity = quality, specificity
+    return best
+
+
+def negotiate(accept: str, content_types: List[str]) -> Optional[str]:
+    """Choose a content type for an Accept header, preferring earlier types on ties.
+    Returns None if none of the content types is acceptable.
+    """
+    if not accept:
+        return content_types[0]
+    best, best_quality = None, 0.0
+    for content_type in content_types:
+        quality = accept_quality(accept, content_type)
+        if quality > best_quality:
+            best, best_quality = content_type, quality
+    return best
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+class Representation(NamedTuple):
+    content_type: str
+    body: bytes
+    etag: str
+
+
+class XRDApp:
+    """ASGI application serving host-meta and WebFinger documents.
+
+    /.well-known/host-meta        XRD, or JRD if the client prefers JSON
+    /.well-known/host-meta.json   JRD
+    /.well-known/webfinger        JRD of the XRD for ?resource=, filtered by ?rel=
+
+    Representations are rendered once and reused until the XRD is replaced.
+    Served XRDs must not be modified in place; use replace() instead.
+    Call wsgi() to serve the same documents from a WSGI server.
+    """
+
+    def __init__(
+        self,
+        host_meta: Optional[XRD] = None,
+        xrds: Iterable[XRD] = (),
+        max_age: int = 3600,
+    ):
+        self.max_age = max_age
+        self.index = XRDIndex(xrds)
+        self.prerendered: dict[int, tuple] = {}
+        self.host_meta = host_meta
+        self.host_meta_representations: dict[str, Representation] = {}
+        if host_meta is not None:
+            self.set_host_meta(host_meta)
+
+    def set_host_meta(self, xrd: XRD, prerendered: Optional[Prerendered] = None):
+        """Serve xrd as host-meta. If given, prerendered is served instead of
+        rendering xrd, and must be XRDBuilder.prerendered() of the builder
+        that built xrd.
+        """
+        self.host_meta = xrd
+        if prerendered is not None:
+            # documents from XRDBuilder are served as rendered, tagged by body hash
+            hashlib = lazy_import("hashlib")
+
+            xml = prerendered.xml.replace(XML_DECLARATION, XML_DECLARATION_UTF8, 1)
+            bodies = {
+                XRD_CONTENT_TYPE: xml.encode("utf-8"),
+                "application/json": prerendered.jrd.full,
+            }
+            self.host_meta_representations = {
+                content_type: Representation(
+                    content_type, body, f'"{hashlib.sha256(body).hexdigest()}"'
+                )
+                for content_type, body in bodies.items()
+            }
+            return
+        self.host_meta_representations = {
+            XRD_CONTENT_TYPE: Representation(
+                XRD_CONTENT_TYPE,
+                render_xml(xrd).toxml(encoding="UTF-8"),
+                f'"{xrd.digest("xml")}"',
+            ),
+            "application/json": Representation(
+                "application/json",
+                render_json(xrd).encode("utf-8"),
+                f'"{xrd.digest("json")}"',
+            ),
+        }
+
+    def replace(self, xrd: XRD, prerendered: Optional[Prerendered] = None):
+        """Add or replace a WebFinger XRD, discarding its cached representation.
+        If given, prerendered is served as in set_host_meta().
+        """
+        old = self.index.replace(xrd)
+        if old is not None:
+            self.prerendered.pop(id(old), None)
+        if prerendered is not None:
+            hashlib = lazy_import("hashlib")
+
+            etag = f'"{hashlib.sha256(prerendered.jrd.full).hexdigest()}"'
+            self.prerendered[id(xrd)] = (xrd, prerendered.jrd, etag)
+
+    def remove(self, xrd: XRD):
+        self.index.remove(xrd)
+        self.prerendered.pop(id(xrd), None)
+
+    def cache_control(self, xrd: XRD) -> str:
+        max_age = self.max_age
+        if xrd.expires:
+            now = datetime.now(xrd.expires.tzinfo)
+            max_age = max(0, int((xrd.expires - now).total_seconds()))
+        return f"max-age={max_age}"
+
+    def webfinger(self, xrd: XRD, rels: List[str]) -> Representation:
+        hashlib = lazy_import("hashlib")
+
+        cached = self.prerendered.get(id(xrd))
+        if cached is None or cached[0] is not xrd:
+            cached = (xrd, PrerenderedJRD(xrd), f'"{xrd.digest()}"')
+            self.prerendered[id(xrd)] = cached
+        _, prerendered, etag = cached
+        if not rels:
+            return Representation(JRD_CONTENT_TYPE, prerendered.full, etag)
+
+        body = prerendered.render(rels)
+        return Representation(
+            JRD_CONTENT_TYPE, body, f'"{hashlib.sha256(body).hexdigest()}"'
+        )
+
+    def respond(self, method: str, path: str, query_string: str, headers: Mapping):
+        """Build a response for a request.
+        headers maps lowercase header names to values.
+        Returns a tuple of status code, list of header tuples and body bytes.
+        """
+        if method not in ("GET", "HEAD"):
+            return 405, [("Allow", "GET, HEAD")], b""
+
+        xrd: Optional[XRD]
+        if path == "/.well-known/host-meta" or path == "/.well-known/host-meta.json":
+            xrd = self.host_meta
+            if xrd is None:
+                return 404, [], b""
+            if path.endswith(".json"):
+                content_type: Optional[str] = "application/json"
+            else:
+                accept = headers.get("accept", "")
+                content_type = negotiate(
+                    accept, [XRD_CONTENT_TYPE, "application/json", JRD_CONTENT_TYPE]
+                )
+                if content_type == JRD_CONTENT_TYPE:
+                    content_type = "application/json"
+            if content_type is None:
+                return 406, [], b""
+            representation = self.host_meta_representations[content_type]
+        elif path == "/.well-known/webfinger":
+            query = parse_qs(query_string)
+            resources = query.get("resource")
+            if not resources:
+                return 400, [], b""
+            xrd = self.index.get(resources[0])
+            if xrd is None:
+                return 404, [], b""
+            representation = self.webfinger(xrd, query.get("rel", []))
+        else:
+            return 404, [], b""
+
+        response_headers = [
+            ("Content-Type", representation.content_type),
+            ("ETag", representation.etag),
+            ("Cache-Control", self.cache_control(xrd)),
+            ("Access-Control-Allow-Origin", "*"),
+        ]
+        if path == "/.well-known/host-meta":
+            response_headers.append(("Vary", "Accept"))
+
+        if etag_matches(headers.get("if-none-match", ""), representation.etag):
+            return 304, response_headers, b""
+
+        response_headers.append(("Content-Length", str(len(representation.body))))
+        body = b"" if method == "HEAD" else representation.body
+        return 200, response_headers, body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        headers = {
+            name.decode("latin-1").lower(): value.decode("latin-1")
+            for name, value in scope.get("headers", [])
+        }
+        status, response_headers, body = self.respond(
+            scope["method"],
+            scope["path"],
+            scope.get("query_string", b"").decode("latin-1"),
+            headers,
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (name.lower().encode("latin-1"), value.encode("latin-1"))
+                    for name, value in response_headers
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def wsgi(self, environ, start_response):
+        """WSGI adapter."""
+        headers = {
+            key[5:].replace("_", "-").lower(): value
+            for key, value in environ.items()
+            if key.startswith("HTTP_")
+        }
+        status, response_headers, body = self.respond(
+            environ["REQUEST_METHOD"],
+            environ.get("PATH_INFO", ""),
+            environ.get("QUERY_STRING", ""),
+            headers,
+        )
+        phrase = lazy_import("http").HTTPStatus(status).phrase
+        start_response(f"{status} {phrase}", response_headers)
+        return [body]
+
+
+# shared references
+
+
+class XRDRef:
+    """Reference to an XRD shared between threads, updated by copy-on-write.
+
+    Readers call get() and must treat the returned XRD as immutable; they never
+    take a lock and always see a complete, validated document. Writers never
+    modify the published XRD: update() applies changes to a copy and publishes
+    it by swapping the reference, which is atomic. Writers are serialized
+    with a lock so that concurrent updates are not lost.
+    """
+
+    def __init__(self, xrd: XRD):
+        self._xrd = xrd
+        self._lock = threading.Lock()
+
+    def get(self) -> XRD:
+        return self._xrd
+
+    def set(self, xrd: XRD):
+        """Publish a new XRD. It must not be modified afterwards."""
+        xrd.validate()
+        with self._lock:
+            self._xrd = xrd
+
+    def update(self, func: Callable[[XRD], Optional[XRD]]) -> XRD:
+        """Apply func to a copy of the current XRD and publish the result.
+        func may modify the copy in place or return a new XRD.
+        """
+        copy = lazy_import("copy")
+
+        with self._lock:
+            xrd = copy.deepcopy(self._xrd)
+            result = func(xrd)
+            if result is not None:
+                xrd = result
+            xrd.validate()
+            self._xrd = xrd
+        return xrd
+
+    def apply_patch(self, patch: Mapping) -> XRD:
+        """Apply a patch created by diff() and publish the result."""
+        return self.update(lambda xrd: apply_patch(xrd, patch))
+
+    def find_link(
+        self, rels: Union[str, Iterable[str]], attr: Optional[str] = None
+    ) -> Optional[Union[Link, str, Iterable, Mapping]]:
+        return self._xrd.find_link(rels, attr)
+
+
+# refreshing remote documents
+
+REFRESH_ACCEPT = f"{XRD_CONTENT_TYPE}, {JRD_CONTENT_TYPE};q=0.9, application/json;q=0.9"
+
+
+def parse_response(content_type: Optional[str], body: bytes) -> XRD:
+    """Parse an HTTP response body as XRD or JRD according to its content type.
+    The format is detected from the body if the content type is not XML or JSON.
+    """
+    media_type = (content_type or "").split(";")[0].strip().lower()
+    if media_type.endswith("json"):
+        return parse_json(body)
+    if media_type.endswith("xml"):
+        return parse_xml(body)
+    return parse_any(body.decode("utf-8"))
+
+
+def expires_in(xrd: XRD, now: float) -> Optional[float]:
+    """Return the number of seconds until xrd expires, or None if it does not."""
+    if xrd.expires is None:
+        return None
+    expires = xrd.expires
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires.timestamp() - now
+
+
+class HostLimits:
+    """Bounded semaphores limiting the number of requests run at once
+    against each host. Hosts are any hashable key.
+    """
+
+    def __init__(self, per_host: int):
+        self.per_host = per_host
+        self.semaphores: dict[Hashable, threading.BoundedSemaphore] = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, host: Hashable) -> threading.BoundedSemaphore:
+        with self.lock:
+            semaphore = self.semaphores.get(host)
+            if semaphore is None:
+                semaphore = self.semaphores[host] = threading.BoundedSemaphore(
+                    self.per_host
+                )
+        return semaphore
+
+
+@dataclass
+class RefreshEntry:
+    """A remote document kept by an XRDRefresher, with the HTTP validators
+    of the response it was parsed from.
+    """
+
+    url: str
+    xrd: Optional[XRD] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    digest: Optional[bytes] = None  # sha256 of the last body that was parsed
+    next_refresh: float = 0.0
+    error: Optional[Exception] = None
+    parsed: int = 0  # responses that were parsed
+    reused: int = 0  # responses that reused the cached XRD
+
+
+class XRDRefresher:
+    """Keeps parsed copies of remote XRD and JRD documents up to date.
+
+    Documents are refreshed with conditional requests using the ETag and
+    Last-Modified of the last response. A 304 response, or a body identical to
+    the last one, reuses the cached XRD without parsing it again.
+
+    The next refresh of a document is scheduled from XRD.expires, bounded by
+    min_interval and max_interval, or after default_interval if it does not
+    expire. Failed refreshes are retried after min_interval. Requests are made
+    by an XRDFetcher, which reuses keep-alive connections and runs at most
+    per_host requests at once against each host.
+    """
+
+    def __init__(
+        self,
+        urls: Iterable[str] = (),
+        default_interval: float = 3600.0,
+        min_interval: float = 60.0,
+        max_interval: float = 86400.0,
+        per_host: int = 2,
+        max_workers: int = 8,
+        timeout: float = 10.0,
+        clock: Callable[[], float] = time.time,
+        fetcher: Optional[XRDFetcher] = None,
+    ):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.per_host = per_host
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.clock = clock
+        self.entries: dict[str, RefreshEntry] = {}
+        self.queue: List[tuple] = []  # heap of (next_refresh, url)
+        self.fetcher = fetcher or XRDFetcher(per_host=per_host, timeout=timeout)
+        self.lock = threading.Lock()
+        for url in urls:
+            self.add(url)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, url: str) -> bool:
+        return url in self.entries
+
+    def add(self, url: str, when: Optional[float] = None):
+        """Start refreshing a document, first at when or immediately."""
+        with self.lock:
+            if url not in self.entries:
+                entry = self.entries[url] = RefreshEntry(url)
+                self.schedule(entry, self.clock() if when is None else when)
+
+    def remove(self, url: str):
+        with self.lock:
+            self.entries.pop(url, None)
+
+    def get(self, url: str) -> Optional[XRD]:
+        """Return the last XRD fetched from url, or None."""
+        entry = self.entries.get(url)
+        return entry.xrd if entry is not None else None
+
+    def schedule(self, entry: RefreshEntry, when: float):
+        # superseded queue items are skipped because next_refresh no longer matches
+        if self.entries.get(entry.url) is not entry:
+            return  # removed while it was being refreshed
+        entry.next_refresh = when
+        heapq.heappush(self.queue, (when, entry.url))
+
+    def interval(self, xrd: Optional[XRD], now: float) -> float:
+        """Return the number of seconds until xrd should be refreshed."""
+        remaining = None if xrd is None else expires_in(xrd, now)
+        if remaining is None:
+            return self.default_interval
+        return min(max(remaining, self.min_interval), self.max_interval)
+
+    def next_refresh(self) -> Optional[float]:
+        """Return the time of the next scheduled refresh, or None."""
+        with self.lock:
+            while self.queue:
+                when, url = self.queue[0]
+                entry = self.entries.get(url)
+                if entry is not None and entry.next_refresh == when:
+                    return when
+                heapq.heappop(self.queue)
+        return None
+
+    def due(self, now: Optional[float] = None) -> List[str]:
+        """Remove and return the URLs whose refresh is due.
+        They are scheduled again when they are refreshed.
+        """
+        if now is None:
+            now = self.clock()
+        urls = []
+        with self.lock:
+            while self.queue and self.queue[0][0] <= now:
+                when, url = heapq.heappop(self.queue)
+                entry = self.entries.get(url)
+                if entry is not None and entry.next_refresh == when:
+                    urls.append(url)
+        return urls
+
+    def fetch(self, entry: RefreshEntry) -> tuple:
+        """Make a conditional request for a document.
+        Returns the status, headers and body of the response.
+        """
+        headers = {"Accept": REFRESH_ACCEPT}
+        if entry.xrd is not None:
+            if entry.etag:
+                headers["If-None-Match"] = entry.etag
+            if entry.last_modified:
+                headers["If-Modified-Since"] = entry.last_modified
+        _, status, response_headers, body = self.fetcher.request(
+            entry.url, self.timeout, headers
+        )
+        return status, response_headers, body
+
+    def refresh(self, url: str) -> XRD:
+        """Refresh a document now and schedule its next refresh.
+        Returns the new XRD, or the cached one if the document has not changed.
+        Raises KeyError if url is not being refreshed.
+        """
+        return self.refresh_entry(self.entries[url])
+
+    def refresh_entry(self, entry: RefreshEntry) -> XRD:
+        hashlib = lazy_import("hashlib")
+
+        url = entry.url
+        try:
+            status, headers, body = self.fetch(entry)
+            if status == 304:
+                if entry.xrd is None:
+                    raise ValueError(
+                        f"304 Not Modified without a cached document: {url}"
+                    )
+                entry.reused += 1
+            else:
+                digest = hashlib.sha256(body).digest()
+                if entry.xrd is not None and digest == entry.digest:
+                    entry.reused += 1
+                else:
+                    entry.xrd = parse_response(headers.get("Content-Type"), body)
+                    entry.digest = digest
+                    entry.parsed += 1
+            entry.etag = headers.get("ETag") or (entry.etag if status == 304 else None)
+            entry.last_modified = headers.get("Last-Modified") or (
+                entry.last_modified if status == 304 else None
+            )
+            entry.error = None
+        except Exception as exc:
+            entry.error = exc
+            with self.lock:
+                self.schedule(entry, self.clock() + self.min_interval)
+            raise
+        now = self.clock()
+        with self.lock:
+            self.schedule(entry, now + self.interval(entry.xrd, now))
+        return entry.xrd
+
+    def refresh_due(
+        self, now: Optional[float] = None
+    ) -> dict[str, Union[XRD, Exception]]:
+        """Refresh every document that is due, using a thread pool.
+        Returns the new XRD or the exception raised for each refreshed URL.
+        """
+        concurrent_futures = lazy_import("concurrent.futures")
+
+        urls = self.due(now)
+        results: dict[str, Union[XRD, Exception]] = {}
+        with self.lock:
+            # documents removed since they became due are skipped
+            entries = [self.entries[url] for url in urls if url in self.entries]
+        if not entries:
+            return results
+        with concurrent_futures.ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            futures = [
+                (entry.url, executor.submit(self.refresh_entry, entry))
+                for entry in entries
+            ]
+            for url, future in futures:
+                try:
+                    results[url] = future.result()
+                except Exception as exc:
+                    results[url] = exc
+        return results
+
+    def run(self, stop):
+        """Refresh documents as they become due until the stop event is set.
+        Documents added while waiting are picked up within min_interval.
+        """
+        while not stop.is_set():
+            self.refresh_due()
+            when = self.next_refresh()
+            delay = self.min_interval if when is None else when - self.clock()
+            stop.wait(max(0.0, min(delay, self.min_interval)))
+
+
+# fetching documents
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class XRDFetcher:
+    """Fetches and parses XRD and JRD documents for synchronous callers.
+
+    Requests reuse keep-alive connections, with at most per_host connections,
+    and so requests, open to each host at once. Parsed documents are cached
+    for the max-age of the response, until XRD.expires, or for cache_ttl
+    seconds, and are shared by every thread using the fetcher.
+    Cached XRDs are shared and must not be modified in place.
+    """
+
+    def __init__(
+        self,
+        per_host: int = 4,
+        timeout: float = 10.0,
+        cache_ttl: float = 300.0,
+        cache_size: int = 1024,
+        max_redirects: int = 5,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.max_redirects = max_redirects
+        self.clock = clock
+        self.cache: dict[str, tuple] = {}  # url -> (XRD, time it expires)
+        self.idle: dict[tuple, List[Any]] = {}  # (scheme, netloc) -> connections
+        self.host_limit = HostLimits(per_host)
+        self.lock = threading.Lock()
+
+    def __enter__(self) -> "XRDFetcher":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close idle connections. The fetcher remains usable."""
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+    def connect(self, host: tuple, timeout: float) -> tuple:
+        """Return an idle connection to host, or a new one, and whether it was idle."""
+        with self.lock:
+            connections = self.idle.get(host)
+            connection = connections.pop() if connections else None
+        if connection is not None:
+            connection.timeout = timeout
+            if connection.sock is not None:
+                connection.sock.settimeout(timeout)
+            return connection, True
+        http_client = lazy_import("http.client")
+
+        scheme, netloc = host
+        if scheme == "https":
+            return http_client.HTTPSConnection(netloc, timeout=timeout), False
+        if scheme == "http":
+            return http_client.HTTPConnection(netloc, timeout=timeout), False
+        raise ValueError(f"unsupported URL scheme: {scheme}")
+
+    def release(self, host: tuple, connection: Any):
+        with self.lock:
+            self.idle.setdefault(host, []).append(connection)
+
+    def request(
+        self,
+        url: str,
+        timeout: Optional[float] = None,
+        headers: Optional[Mapping] = None,
+    ) -> tuple:
+        """GET url with the given request headers, following redirects.
+        Returns the final URL, and the status, headers and body of the response.
+        Raises HTTPError for error statuses; 304 Not Modified is returned.
+        """
+        urllib_error = lazy_import("urllib.error")
+
+        timeout = self.timeout if timeout is None else timeout
+        headers = {"Accept": REFRESH_ACCEPT, **(headers or {})}
+        for _ in range(self.max_redirects + 1):
+            parts = urlsplit(url)
+            host = (parts.scheme.lower(), parts.netloc.lower())
+            target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+            with self.host_limit(host):
+                while True:
+                    connection, reused = self.connect(host, timeout)
+                    try:
+                        connection.request("GET", target, headers=headers)
+                        response = connection.getresponse()
+                        body = response.read()
+                    except ConnectionError:
+                        connection.close()
+                        # the server closed an idle connection; retry on a new one
+                        if reused:
+                            continue
+                        raise
+                    except BaseException:
+                        connection.close()
+                        raise
+                    break
+                if response.will_close:
+                    connection.close()
+                else:
+                    self.release(host, connection)
+            if response.status in REDIRECT_STATUSES and response.getheader("Location"):
+                url = urljoin(url, response.getheader("Location"))
+                continue
+            if not 200 <= response.status < 300 and response.status != 304:
+                raise urllib_error.HTTPError(
+                    url, response.status, response.reason, response.headers, None
+                )
+            return url, response.status, response.headers, body
+        raise ValueError(f"too many redirects: {url}")
+
+    def ttl(self, headers: Mapping, xrd: XRD, now: float) -> float:
+        """Return the number of seconds a response may be cached for."""
+        directives = [
+            directive.strip().lower()
+            for directive in (headers.get("Cache-Control") or "").split(",")
+        ]
+        if "no-store" in directives or "no-cache" in directives:
+            return 0.0
+        for directive in directives:
+            if directive.startswith("max-age="):
+                try:
+                    return float(directive[len("max-age=") :])
+                except ValueError:
+                    break
+        remaining = expires_in(xrd, now)
+        return self.cache_ttl if remaining is None else remaining
+
+    def cached(self, url: str) -> Optional[XRD]:
+        """Return the cached XRD of url, or None if it is not cached or expired."""
+        with self.lock:
+            cached = self.cache.get(url)
+        if cached is None or cached[1] <= self.clock():
+            return None
+        return cached[0]
+
+    def fetch(self, url: str, timeout: Optional[float] = None) -> XRD:
+        """Return the XRD at url, from the cache if possible."""
+        if TRACER is None:
+            return self.load(url, timeout)[0]
+        with TRACER.start_as_current_span(
+            "xrd.fetch", attributes={"xrd.url": url}
+        ) as span:
+            xrd, body = self.load(url, timeout)
+            span.set_attribute("xrd.cached", body is None)
+            if body is not None:
+                span.set_attribute("xrd.size", len(body))
+            return xrd
+
+    def load(self, url: str, timeout: Optional[float] = None) -> tuple:
+        """Return the XRD at url and the body it was parsed from, or None
+        instead of the body if the XRD was cached.
+        """
+        xrd = self.cached(url)
+        if xrd is not None:
+            return xrd, None
+        _, _, headers, body = self.request(url, timeout)
+        xrd = parse_response(headers.get("Content-Type"), body)
+        xrd.validate()
+        now = self.clock()
+        ttl = self.ttl(headers, xrd, now)
+        if ttl > 0:
+            with self.lock:
+                self.cache.pop(url, None)
+                self.cache[url] = (xrd, now + ttl)
+                while len(self.cache) > self.cache_size:
+                    del self.cache[next(iter(self.cache))]
+        return xrd, body
+
+    def fetch_in(
+        self, context: contextvars.Context, url: str, timeout: Optional[float] = None
+    ) -> XRD:
+        """Fetch url in context, so that spans are children of the caller's span."""
+        return context.run(self.fetch, url, timeout)
+
+    def fetch_many(
+        self, urls: Iterable[str], max_workers: int = 8, timeout: Optional[float] = None
+    ) -> dict[str, Union[XRD, Exception]]:
+        """Fetch documents using a thread pool.
+        Returns the XRD or the exception raised for each URL, in the order given.
+        """
+        concurrent_futures = lazy_import("concurrent.futures")
+        contextvars = lazy_import("contextvars")
+
+        unique = list(dict.fromkeys(urls))
+        results: dict[str, Union[XRD, Exception]] = {}
+        pending = []
+        for url in unique:
+            xrd = self.cached(url)
+            if xrd is not None:
+                results[url] = xrd
+            else:
+                pending.append(url)
+        if not pending:
+            return results
+        with concurrent_futures.ThreadPoolExecutor(
+            max_workers=min(max_workers, len(pending))
+        ) as executor:
+            if TRACER is None:
+                futures = [
+                    (url, executor.submit(self.fetch, url, timeout)) for url in pending
+                ]
+            else:
+                # spans made by the workers are children of the caller's span
+                futures = [
+                    (
+                        url,
+                        executor.submit(
+                            self.fetch_in, contextvars.copy_context(), url, timeout
+                        ),
+                    )
+                    for url in pending
+                ]
+            for url, future in futures:
+                try:
+                    results[url] = future.result()
+                except Exception as exc:
+                    results[url] = exc
+        return {url: results[url] for url in unique}
+
+
+@functools.lru_cache(maxsize=None)
+def default_fetcher() -> XRDFetcher:
+    """The XRDFetcher shared by calls to fetch_many() without a fetcher."""
+    return XRDFetcher()
+
+
+def fetch_many(
+    urls: Iterable[str],
+    max_workers: int = 8,
+    timeout: float = 10.0,
+    fetcher: Optional[XRDFetcher] = None,
+) -> dict[str, Union[XRD, Exception]]:
+    """Fetch and parse host-meta and WebFinger documents concurrently.
+    Returns the XRD or the exception raised for each URL. Connections and
+    parsed documents are shared with other calls through default_fetcher().
+    """
+    if fetcher is None:
+        fetcher = default_fetcher()
+    return fetcher.fetch_many(urls, max_workers=max_workers, timeout=timeout)
+
+
+def expand_template(template: str, uri: str) -> str:
+    """Expand an LRDD link template with the URI of a resource (RFC 6415, 4.2)."""
+    if TRACER is None:
+        return template.replace("{uri}", quote(uri, safe=""))
+    with TRACER.start_as_current_span(
+        "xrd.template.expand", attributes={"xrd.uri": uri}
+    ):
+        return template.replace("{uri}", quote(uri, safe=""))
+
+
+def discover(
+    resource: str, fetcher: Optional[XRDFetcher] = None, scheme: str = "https"
+) -> XRD:
+    """Find the XRD of a resource through the host-meta of its host and the
+    host-meta's LRDD template, as described in RFC 6415.
+    """
+    if fetcher is None:
+        fetcher = default_fetcher()
+    if TRACER is None:
+        return discover_with(fetcher, resource, scheme)
+    with TRACER.start_as_current_span(
+        "xrd.discover", attributes={"xrd.resource": resource}
+    ):
+        return discover_with(fetcher, resource, scheme)
+
+
+def discover_with(fetcher: XRDFetcher, resource: str, scheme: str) -> XRD:
+    resource = normalize_resource(resource)
+    if resource.startswith(("acct:", "mailto:")):
+        host = resource.rpartition("@")[2]
+    else:
+        host = urlsplit(resource).netloc.rpartition("@")[2]
+    if not host:
+        raise ValueError(f"resource has no host: {resource}")
+    host_meta = fetcher.fetch(f"{scheme}://{host}/.well-known/host-meta")
+    template = host_meta.find_link("lrdd", attr="template")
+    if not template or not isinstance(template, str):
+        raise LookupError(f"host-meta of {host} has no lrdd template")
+    return fetcher.fetch(expand_template(template, resource))
+
+
+# tracing
+
+# The tracer receiving spans, or None when tracing is off. It is an OpenTelemetry
+# tracer or a SpanCollector; instrumented functions only check it for None.
+TRACER: Any = None
+
+
+class RecordedSpan:
+    """A span recorded by a SpanCollector. Times are from time.perf_counter()."""
+
+    __slots__ = ("name", "attributes", "parent", "start", "end", "collector", "token")
+
+    def __init__(
+        self, name: str, attributes: dict, parent: Optional["RecordedSpan"], collector
+    ):
+        self.name = name
+        self.attributes = attributes
+        self.parent = parent
+        self.collector = collector
+        self.start = self.end = 0.0
+
+    def __repr__(self) -> str:
+        duration = f"{self.duration * 1e3:.3f} ms"
+        return f"RecordedSpan({self.name!r}, {duration}, {self.attributes!r})"
+
+    @property
+    def duration(self) -> float:
+        return self.end - self.start
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def __enter__(self) -> "RecordedSpan":
+        self.token = self.collector.current.set(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.end = time.perf_counter()
+        if exc_type is not None:
+            self.attributes["exception.type"] = exc_type.__name__
+        self.collector.current.reset(self.token)
+        self.collector.spans.append(self)
+
+
+class SpanCollector:
+    """Records spans in memory, for use when OpenTelemetry is not installed.
+    It implements the part of the OpenTelemetry tracer interface used here,
+    start_as_current_span(), and keeps the last max_spans finished spans.
+    """
+
+    def __init__(self, max_spans: int = 10000):
+        contextvars = lazy_import("contextvars")
+
+        self.spans: deque = deque(maxlen=max_spans)
+        self.current: Any = contextvars.ContextVar("xrd_span", default=None)
+
+    def start_as_current_span(self, name: str, attributes: Optional[Mapping] = None):
+        return RecordedSpan(name, dict(attributes or {}), self.current.get(), self)
+
+    def clear(self):
+        self.spans.clear()
+
+    def children(self, span: Optional[RecordedSpan]) -> List[RecordedSpan]:
+        """Return the finished spans directly below span, or the root spans if None."""
+        return sorted(
+            (child for child in self.spans if child.parent is span),
+            key=lambda child: child.start,
+        )
+
+    def summary(self) -> dict[str, tuple]:
+        """Return (count, total seconds) of the finished spans by name."""
+        totals: dict[str, tuple] = {}
+        for span in self.spans:
+            count, total = totals.get(span.name, (0, 0.0))
+            totals[span.name] = (count + 1, total + span.duration)
+        return totals
+
+    def format(self, span: Optional[RecordedSpan] = None, depth: int = 0) -> str:
+        """Format the spans below span, or all of them, as an indented tree."""
+        lines = []
+        for child in self.children(span):
+            attributes = " ".join(
+                f"{key}={value}" for key, value in child.attributes.items()
+            )
+            duration = f"{child.duration * 1e3:.3f} ms"
+            lines.append(f"{'  ' * depth}{child.name} {duration} {attributes}".rstrip())
+            nested = self.format(child, depth + 1)
+            if nested:
+                lines.append(nested)
+        return "\n".join(lines)
+
+
+def traced_parse(
+    format: str, content: Union[str, bytes], parse: Callable[[], XRD]
+) -> XRD:
+    with TRACER.start_as_current_span(
+        "xrd.parse", attributes={"xrd.format": format, "xrd.size": len(content)}
+    ) as span:
+        xrd = parse()
+        span.set_attribute("xrd.links", len(xrd.links))
+        return xrd
+
+
+def enable_tracing(tracer: Any = None) -> Any:
+    """Record spans for fetching, parsing, validation, index lookups, template
+    expansion and find_link() with tracer, and return it.
+    By default this is an OpenTelemetry tracer from the global tracer provider
+    when opentelemetry is installed, and a new SpanCollector otherwise.
+    """
+    global TRACER
+
+    if tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            tracer = SpanCollector()
+        else:
+            tracer = trace.get_tracer("xrd", __version__)
+    TRACER = tracer
+    return tracer
+
+
+def disable_tracing():
+    global TRACER
+
+    TRACER = None
+
+
+# validation
+
+# patterns are compiled, and cached by re, on first use
+URI_PATTERN = (
+    r"^[A-Za-z][A-Za-z0-9+.\-]*:"
+    r"(?:[A-Za-z0-9\-._~:/?#\[\]@!$&'()*+,;=]|%[0-9A-Fa-f]{2})*$"
+)
+TEMPLATE_VARIABLE_PATTERN = r"\{[^{}]*\}"
+REL_TOKEN_PATTERN = r"^[a-z][a-z0-9.\-]*$"
+MEDIA_TYPE_PATTERN = r"^[\w!#$&^.+\-]+/[\w!#$&^.+\-]+(\s*;.*)?$"
+LANGUAGE_TAG_PATTERN = r"^[A-Za-z]{1,8}(-[A-Za-z0-9]{1,8})*$"
+NCNAME_PATTERN = r"^[A-Za-z_][\w.\-]*$"
+
+
+@dataclass
+class ValidationError:
+    path: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.path}: {self.message}"
+
+
+def is_uri(value: str) -> bool:
+    return bool(re.match(URI_PATTERN, value))
+
+
+def validation_errors(xrd: XRD) -> List[ValidationError]:
+    """Check an XRD against the constraints of XRD 1.0 and RFC 6415.
+    Returns every error found, with the path of the offending value.
+    """
+    errors: List[ValidationError] = []
+
+    def error(path, message):
+        errors.append(ValidationError(path, message))
+
+    def check_string(path, value, check=None, message=""):
+        if not isinstance(value, str):
+            error(path, "must be a string")
+        elif value and check and not check(value):
+            error(path, message)
+
+    def check_properties(path, properties):
+        for type_, values in property_items(properties):
+            item_path = f"{path}[{type_!r}]"
+            check_string(item_path, type_, is_uri, "property type must be a URI")
+            for val in values:
+                # None is rendered as xsi:nil, which only properties may use
+                if val is not None and not isinstance(val, str):
+                    error(item_path, "property value must be a string or nil")
+
+    check_string(
+        "xml_id",
+        xrd.xml_id,
+        lambda xml_id: re.match(NCNAME_PATTERN, xml_id),
+        "must be an NCName",
+    )
+    if xrd.expires is not None and not isinstance(xrd.expires, datetime):
+        error("expires", "must be a datetime")
+    check_string("subject", xrd.subject, is_uri, "must be a URI")
+    for i, alias in enumerate(xrd.aliases):
+        check_string(f"aliases[{i}]", alias, is_uri, "must be a URI")
+        if not alias:
+            error(f"aliases[{i}]", "must not be empty")
+    check_properties("properties", xrd.properties)
+
+    for i, link in enumerate(xrd.links):
+        path = f"links[{i}]"
+        check_string(
+            f"{path}.rel",
+            link.rel,
+            lambda rel: is_uri(rel) or re.match(REL_TOKEN_PATTERN, rel),
+            "must be a URI or a registered relation type",
+        )
+        check_string(
+            f"{path}.type",
+            link.type,
+            lambda type_: re.match(MEDIA_TYPE_PATTERN, type_),
+            "must be a media type",
+        )
+        check_string(f"{path}.href", link.href, is_uri, "must be a URI")
+        check_string(
+            f"{path}.template",
+            link.template,
+            lambda template: is_uri(re.sub(TEMPLATE_VARIABLE_PATTERN, "x", template)),
+            "must be a URI template",
+        )
+        if link.href and link.template:
+            error(path, "only one of href or template may be specified")
+        for j, title in enumerate(link.titles):
+            if title.value is None:
+                error(f"{path}.titles[{j}].value", "title must not be nil")
+            else:
+                check_string(f"{path}.titles[{j}].value", title.value)
+            check_string(
+                f"{path}.titles[{j}].lang",
+                title.lang,
+                lambda lang: re.match(LANGUAGE_TAG_PATTERN, lang),
+                "must be a language tag",
+            )
+        check_properties(f"{path}.properties", link.properties)
+
+    return errors
+
+
+def validate_many(xrds: Iterable[XRD]) -> dict[int, List[ValidationError]]:
+    """Check many XRDs with validation_errors().
+    Returns the errors of the invalid XRDs, keyed by their position in xrds.
+    """
+    results = {}
+    for index, xrd in enumerate(xrds):
+        errors = validation_errors(xrd)
+        if errors:
+            results[index] = errors
+    return results
+
+
+# JSON lines
+
+
+def open_jrd_lines(path: str, mode: str = "rt"):
+    """Open a JSON lines file, transparently (de)compressing .gz and .zst files."""
+    if path.endswith(".gz"):
+        gzip = lazy_import("gzip")
+        return gzip.open(path, mode, encoding="utf-8" if "t" in mode else None)
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError as exc:
+            raise ImportError(
+                "the zstandard package is required for .zst files"
+            ) from exc
+        return zstandard.open(path, mode, encoding="utf-8" if "t" in mode else None)
+    return open(path, mode, encoding="utf-8" if "t" in mode else None)
+
+
+def parse_jrd_batch(lines: List[Union[str, bytes]]) -> List[XRD]:
+    return [parse_json(line) for line in lines]
+
+
+def iter_jrd_lines(fp, jobs: int = 1, batch_size: int = 1000):
+    """Parse a stream of JRDs, one per line, from a text or binary file object.
+    Lines are read lazily, so memory use does not depend on the size of the stream.
+    If jobs is greater than 1, batches of lines are parsed in worker processes,
+    and XRDs are still yielded in order.
+    """
+    lines = (line for line in fp if line.strip())
+    if jobs == 1:
+        for line in lines:
+            yield parse_json(line)
+        return
+
+    def batches():
+        batch = list(islice(lines, batch_size))
+        while batch:
+            yield batch
+            batch = list(islice(lines, batch_size))
+
+    for xrds in bounded_map(parse_jrd_batch, batches(), jobs, jobs * 2):
+        yield from xrds
+
+
+def write_jrd_lines(fp, xrds: Iterable[XRD]) -> int:
+    """Write XRDs as JRD, one per line, to a text or binary file object.
+    Returns the number of XRDs written.
+    """
+    binary = not isinstance(fp, io.TextIOBase)
+    count = 0
+    for xrd in xrds:
+        line = render_json(xrd) + "\n"
+        fp.write(line.encode("utf-8") if binary else line)
+        count += 1
+    return count
+
+
+# columnar export
+
+LINK_COLUMNS = ("subject", "rel", "type", "href", "template", "title", "lang")
+
+
+class StringColumn:
+    """Dictionary encoded column of strings: each row holds the code of its
+    value in values. Code 0 is reserved for None.
+    """
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self.codes = array("I")
+        self.index: dict[Optional[str], int] = {None: 0}
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def __getitem__(self, row: int) -> Optional[str]:
+        return self.values[self.codes[row]]
+
+    def encode(self, value: Optional[str]) -> int:
+        code = self.index.get(value)
+        if code is None:
+            code = self.index[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def append(self, value: Optional[str]):
+        self.codes.append(self.encode(value))
+
+    def decode(self, rows: Optional[Iterable[int]] = None) -> List[Optional[str]]:
+        """Return the values of all rows, or of the given rows."""
+        codes = self.codes if rows is None else map(self.codes.__getitem__, rows)
+        return list(map(self.values.__getitem__, codes))
+
+    def matching(self, predicate: Callable[[Optional[str]], Any]) -> bytearray:
+        """Return a mask of the codes whose value satisfies predicate.
+        The predicate is called once per distinct value, not once per row.
+        """
+        return bytearray(1 if predicate(value) else 0 for value in self.values)
+
+
+class LinkColumns:
+    """Links of many XRDs as columns, one row per link title, or one row for
+    a link without titles (with title and lang None).
+
+    xrd and link hold the index of the XRD and of the link within it for each
+    row, and titled is 1 for rows of a title and 0 for rows of a link without
+    titles. subjects holds the subject of every XRD, including those without links.
+    """
+
+    def __init__(self):
+        self.xrd = array("I")
+        self.link = array("I")
+        self.titled = array("B")
+        self.columns: dict[str, StringColumn] = {
+            name: StringColumn() for name in LINK_COLUMNS
+        }
+        self.subjects = StringColumn()
+
+    def __len__(self) -> int:
+        return len(self.xrd)
+
+    def __getitem__(self, name: str) -> StringColumn:
+        return self.columns[name]
+
+    def rows_where(self, **predicates: Callable[[Optional[str]], Any]) -> array:
+        """Return the rows whose values satisfy every predicate, keyed by column name.
+
+            columns.rows_where(
+                rel=lambda rel: rel == "lrdd",
+                template=lambda template: template and "{uri}" in template,
+            )
+
+        Predicates are evaluated once per distinct value; rows are then selected
+        by code, with NumPy if it is installed.
+        """
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        rows = len(self)
+        if numpy is not None:
+            mask = numpy.ones(rows, dtype=bool)
+            for name, predicate in predicates.items():
+                column = self.columns[name]
+                lookup = numpy.frombuffer(column.matching(predicate), dtype=numpy.uint8)
+                mask &= lookup[numpy_codes(numpy, column.codes)].astype(bool)
+            return array("I", numpy.flatnonzero(mask).tolist())
+
+        # one byte per row, 1 if selected; masks are combined as big integers
+        selected = int.from_bytes(b"\x01" * rows, "little")
+        for name, predicate in predicates.items():
+            column = self.columns[name]
+            row_mask = bytes(map(column.matching(predicate).__getitem__, column.codes))
+            selected &= int.from_bytes(row_mask, "little")
+        return array("I", compress(range(rows), selected.to_bytes(rows, "little")))
+
+    def to_numpy(self) -> dict:
+        """Return the xrd and link indexes, the titled flags and the codes of each
+        column as NumPy arrays. The arrays share memory with the columns.
+        Values are in columns[name].values.
+        """
+        import numpy
+
+        arrays = {
+            "xrd": numpy_codes(numpy, self.xrd),
+            "link": numpy_codes(numpy, self.link),
+            "titled": numpy_codes(numpy, self.titled),
+        }
+        for name, column in self.columns.items():
+            arrays[name] = numpy_codes(numpy, column.codes)
+        return arrays
+
+    def to_arrow(self):
+        """Return the rows as a pyarrow Table with dictionary encoded string columns.
+        Codes are passed to Arrow without copying.
+        """
+        import pyarrow
+
+        def indexes(codes, type_=pyarrow.uint32()):
+            return pyarrow.Array.from_buffers(
+                type_, len(codes), [None, pyarrow.py_buffer(codes)]
+            )
+
+        arrays = {
+            "xrd": indexes(self.xrd),
+            "link": indexes(self.link),
+            "titled": indexes(self.titled, pyarrow.uint8()),
+        }
+        for name, column in self.columns.items():
+            arrays[name] = pyarrow.DictionaryArray.from_arrays(
+                indexes(column.codes),
+                pyarrow.array(column.values, type=pyarrow.string()),
+            )
+        return pyarrow.table(arrays)
+
+
+def numpy_codes(numpy, codes: array):
+    return numpy.frombuffer(codes, dtype=numpy.dtype(f"u{codes.itemsize}"))
+
+
+def to_columns(xrds: Iterable[XRD]) -> LinkColumns:
+    """Flatten the links of many XRDs into dictionary encoded columns of
+    (subject, rel, type, href, template, title, lang).
+    """
+    result = LinkColumns()
+    xrd_indexes, link_indexes = result.xrd.append, result.link.append
+    titled = result.titled.append
+    columns = [result.columns[name] for name in LINK_COLUMNS]
+    subject, rel, type_, href, template, title, lang = [
+        column.codes.append for column in columns
+    ]
+    encoders = [column.encode for column in columns]
+    no_titles: List[tuple] = [(None, None, 0)]  # a row for a link without titles
+
+    for i, xrd in enumerate(xrds):
+        result.subjects.append(xrd.subject)
+        subject_code = encoders[0](xrd.subject)
+        for j, link in enumerate(xrd.links):
+            codes = (
+                encoders[1](link.rel),
+                encoders[2](link.type),
+                encoders[3](link.href),
+                encoders[4](link.template),
+            )
+            for value, lang_, flag in [
+                (t.value, t.lang, 1) for t in link.titles
+            ] or no_titles:
+                xrd_indexes(i)
+                link_indexes(j)
+                titled(flag)
+                subject(subject_code)
+                rel(codes[0])
+                type_(codes[1])
+                href(codes[2])
+                template(codes[3])
+                title(encoders[5](value))
+                lang(encoders[6](lang_))
+    return result
+
+
+def from_columns(columns: LinkColumns) -> List[XRD]:
+    """Rebuild XRDs from columns created by to_columns().
+    The XRDs have their subject and links; other fields are not stored in columns.
+    """
+    xrds = [XRD(subject=subject) for subject in columns.subjects.decode()]
+    rel, type_, href, template, title, lang = (
+        columns[name].decode() for name in LINK_COLUMNS[1:]
+    )
+    link = Link()
+    last = None
+    for row, key in enumerate(zip(columns.xrd, columns.link)):
+        if key != last:
+            link = Link(
+                rel[row] or "", type_[row] or "", href[row] or "", template[row] or ""
+            )
+            xrds[key[0]].links.append(link)
+            last = key
+        # titles are stored as given, including a None value or lang
+        if columns.titled[row]:
+            link.titles.append(Title(cast(str, title[row]), cast(str, lang[row])))
+    return xrds
+
+
+# profiling
+
+
+class StageProfile(NamedTuple):
+    name: str
+    seconds: float  # per iteration
+    allocated: int  # peak bytes allocated by one run
+    stats: pstats.Stats
+
+
+def profile_stages_of(content: str) -> List[tuple]:
+    """Return the (name, function) stages that parsing and rendering
+    a document goes through. Each stage is fed by the output of the previous one.
+    """
+    json = lazy_import("json")
+    minidom = lazy_import("xml.dom.minidom")
+
+    stages: List[tuple] = []
+    if content.lstrip().startswith("<"):
+        dom = minidom.parseString(content)
+        stages.append(("parseString", lambda: minidom.parseString(content)))
+        stages.append(("xrd_from_dom", lambda: xrd_from_dom(dom)))
+        xrd = xrd_from_dom(dom)
+    else:
+        jrd = json.loads(content)
+        stages.append(("json.loads", lambda: json.loads(content)))
+        stages.append(("xrd_from_jrd", lambda: xrd_from_jrd(jrd)))
+        xrd = xrd_from_jrd(jrd)
+    doc = jrd_dict(xrd)
+    xml_doc = render_xml(xrd)
+    stages.extend(
+        [
+            ("validate", xrd.validate),
+            ("validation_errors", lambda: validation_errors(xrd)),
+            ("jrd_dict", lambda: jrd_dict(xrd)),
+            ("json.dumps", lambda: json.dumps(doc)),
+            ("render_xml", lambda: render_xml(xrd)),
+            ("toxml", xml_doc.toxml),
+        ]
+    )
+    return stages
+
+
+def profile_stages(content: str, iterations: int = 100) -> List[StageProfile]:
+    """Run a document through each parse and render stage, measuring the
+    time per iteration, the memory allocated and a cProfile of each stage.
+    """
+    cProfile = lazy_import("cProfile")
+    pstats = lazy_import("pstats")
+    tracemalloc = lazy_import("tracemalloc")
+
+    results = []
+    for name, func in profile_stages_of(content):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            func()
+        seconds = (time.perf_counter() - start) / iterations
+
+        tracemalloc.start()
+        try:
+            baseline, _ = tracemalloc.get_traced_memory()
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        for _ in range(iterations):
+            func()
+        profiler.disable()
+
+        results.append(
+            StageProfile(name, seconds, peak - baseline, pstats.Stats(profiler))
+        )
+    return results
+
+
+def collapsed_stacks(content: str, iterations: int = 100) -> dict[str, float]:
+    """Trace every stage and return the time spent in each call stack,
+    in microseconds, keyed by collapsed stack (stage;caller;callee).
+    """
+    totals: dict[str, float] = {}
+
+    for name, func in profile_stages_of(content):
+        stack = [name]
+        last = time.perf_counter()
+
+        def tracer(frame, event, arg):
+            nonlocal last
+            now = time.perf_counter()
+            key = ";".join(stack)
+            totals[key] = totals.get(key, 0.0) + (now - last) * 1e6
+            if event == "call":
+                code = frame.f_code
+                filename = os.path.basename(code.co_filename)
+                stack.append(f"{code.co_name} ({filename}:{code.co_firstlineno})")
+            elif event == "c_call":
+                stack.append(getattr(arg, "__qualname__", None) or str(arg))
+            elif len(stack) > 1:
+                stack.pop()
+            last = time.perf_counter()
+
+        sys.setprofile(tracer)
+        try:
+            for _ in range(iterations):
+                func()
+        finally:
+            sys.setprofile(None)
+
+    return totals
+
+
+def format_collapsed(stacks: Mapping[str, float]) -> str:
+    """Format collapsed stacks for flamegraph.pl, speedscope and similar tools."""
+    return "".join(
+        f"{stack} {round(micros)}\n"
+        for stack, micros in stacks.items()
+        if round(micros)
+    )
+
+
+def profile_main(args) -> int:
+    with open(args.path, encoding="utf-8") as fp:
+        content = fp.read()
+
+    results = profile_stages(content, args.iterations)
+    total = sum(result.seconds for result in results) or 1.0
+    print(f"{'stage':<20}{'time/iter':>12}{'share':>8}{'allocated':>12}")
+    for result in results:
+        print(
+            f"{result.name:<20}{result.seconds * 1e6:>10.1f}us"
+            f"{result.seconds / total:>8.1%}{result.allocated / 1024:>9.1f}KiB"
+        )
+    if args.top:
+        for result in results:
+            print(f"\n{result.name}")
+            result.stats.stream = sys.stdout  # type: ignore[attr-defined]
+            result.stats.sort_stats("tottime").print_stats(args.top)
+
+    if args.collapsed:
+        with open(args.collapsed, "w") as fp:
+            fp.write(format_collapsed(collapsed_stacks(content, args.iterations)))
+    return 0
+
+
+# command line interface
+
+NDJSON_SUFFIXES = tuple(
+    ext + compression
+    for ext in (".ndjson", ".jsonl")
+    for compression in ("", ".gz", ".zst")
+)
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz", ".zip")
+
+
+def iter_sources(paths: Iterable[str], ndjson: bool = False):
+    """Yield (name, content) for every document in files, directories,
+    tar and zip archives, NDJSON files or stdin (-).
+    Files and archive members are yielded as undecoded bytes, so that a
+    document that is not UTF-8 fails on its own in cli_process().
+    """
+    for path in paths:
+        if path == "-":
+            if ndjson:
+                for number, line in enumerate(sys.stdin, 1):
+                    if line.strip():
+                        yield f"<stdin>:{number}", line
+            else:
+                yield "<stdin>", sys.stdin.read()
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for filename in sorted(files):
+                    yield from iter_sources([os.path.join(root, filename)], ndjson)
+        elif path.endswith(".zip"):
+            zipfile = lazy_import("zipfile")
+            with zipfile.ZipFile(path) as archive:
+                for info in archive.infolist():
+                    if not info.is_dir():
+                        yield f"{path}:{info.filename}", archive.read(info)
+        elif path.endswith(ARCHIVE_SUFFIXES):
+            tarfile = lazy_import("tarfile")
+            with tarfile.open(path) as archive:
+                for member in archive:
+                    member_file = (
+                        archive.extractfile(member) if member.isfile() else None
+                    )
+                    if member_file is not None:
+                        yield f"{path}:{member.name}", member_file.read()
+        elif ndjson or path.endswith(NDJSON_SUFFIXES):
+            with open_jrd_lines(path) as lines:
+                for number, line in enumerate(lines, 1):
+                    if line.strip():
+                        yield f"{path}:{number}", line
+        else:
+            with open(path, "rb") as fp:
+                yield path, fp.read()
+
+
+def parse_any(content: str) -> XRD:
+    """Parse an XRD or JRD document, detecting the format from its content."""
+    if content.lstrip().startswith("<"):
+        return parse_xml(content)
+    return parse_json(content)
+
+
+class CLIResult(NamedTuple):
+    name: str
+    output: Optional[str]
+    error: Optional[str]
+    elapsed: float
+    size: int
+    links: int
+
+
+def cli_process(task: tuple) -> CLIResult:
+    """Run one document through a CLI command. Runs in worker processes."""
+    command, name, content, to = task
+    start = time.perf_counter()
+    output = error = None
+    links = 0
+    try:
+        if isinstance(content, bytes):
+            content = content.decode("utf-8")
+        xrd = parse_any(content)
+        links = len(xrd.links)
+        if command == "convert":
+            output = render_json(xrd) if to == "json" else render_xml(xrd).toxml()
+        elif command == "validate":
+            errors = validation_errors(xrd)
+            if errors:
+                error = "; ".join(str(e) for e in errors)
+    except Exception as exc:
+        error = f"{type(exc).__name__}: {exc}"
+    elapsed = time.perf_counter() - start
+    return CLIResult(name, output, error, elapsed, len(content), links)
+
+
+def bounded_map(func: Callable, items: Iterable, jobs: int, window: int):
+    """Map func over items in order using a process pool, with at most
+    window items in flight so that memory stays bounded.
+    """
+    if jobs == 1:
+        yield from map(func, items)
+        return
+    concurrent_futures = lazy_import("concurrent.futures")
+    with concurrent_futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending: deque = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    argparse = lazy_import("argparse")
+
+    parser = argparse.ArgumentParser(
+        prog="python -m xrd", description="Convert, validate and inspect XRD documents."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in (
+        ("convert", "convert documents to JRD or XRD, one per line"),
+        ("validate", "validate documents and report every error"),
+        ("stats", "parse documents and report statistics"),
+    ):
+        sub = commands.add_parser(command, help=help_text)
+        sub.add_argument(
+            "paths",
+            nargs="*",
+            default=["-"],
+            help="files, directories, archives or - for stdin",
+        )
+        sub.add_argument(
+            "--ndjson",
+            action="store_true",
+            help="treat input files and stdin as one JRD per line",
+        )
+        sub.add_argument(
+            "-j",
+            "--jobs",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="worker processes",
+        )
+        sub.add_argument(
+            "--slowest",
+            type=int,
+            default=5,
+            help="number of slowest documents to report",
+        )
+        if command == "convert":
+            sub.add_argument("--to", choices=("json", "xml"), default="json")
+            sub.add_argument("-o", "--output", help="output file, defaults to stdout")
+    sub = commands.add_parser(
+        "profile", help="profile each parse and render stage of a document"
+    )
+    sub.add_argument("path", help="XRD or JRD document")
+    sub.add_argument("-n", "--iterations", type=int, default=100)
+    sub.add_argument(
+        "--top", type=int, default=0, help="print the top functions of each stage"
+    )
+    sub.add_argument(
+        "--collapsed", help="write collapsed stacks for flame graphs to this file"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command == "profile":
+        return profile_main(args)
+
+    to = getattr(args, "to", None)
+    tasks = (
+        (args.command, name, content, to)
+        for name, content in iter_sources(args.paths, args.ndjson)
+    )
+
+    out = sys.stdout
+    if getattr(args, "output", None):
+        out = open(args.output, "w", encoding="utf-8")
+
+    count = errors = size = links = 0
+    slowest: List[tuple] = []
+    start = time.perf_counter()
+    try:
+        for result in bounded_map(cli_process, tasks, args.jobs, args.jobs * 16):
+            count += 1
+            size += result.size
+            links += result.links
+            if result.error:
+                errors += 1
+                print(f"{result.name}: {result.error}", file=sys.stderr)
+            if result.output is not None:
+                out.write(result.output + "\n")
+            item = (result.elapsed, result.name)
+            if len(slowest) < args.slowest:
+                heapq.heappush(slowest, item)
+            elif args.slowest:
+                heapq.heappushpop(slowest, item)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    elapsed = time.perf_counter() - start
+
+    report = (
+        sys.stderr if args.command == "convert" and out is sys.stdout else sys.stdout
+    )
+    print(f"documents:   {count}", file=report)
+    print(f"errors:      {errors}", file=report)
+    print(f"links:       {links}", file=report)
+    print(f"bytes:       {size}", file=report)
+    print(f"elapsed:     {elapsed:.3f}s", file=report)
+    if elapsed:
+        throughput = f"{count / elapsed:.0f} docs/s, {size / elapsed / 1e6:.2f} MB/s"
+        print(f"throughput:  {throughput}", file=report)
+    if slowest:
+        print("slowest:", file=report)
+        for seconds, name in sorted(slowest, reverse=True):
+            print(f"  {seconds * 1000:.2f}ms  {name}", file=report)
+
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())